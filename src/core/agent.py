@@ -1,13 +1,35 @@
 import openai
-from openai import OpenAI
 import streamlit as st
 import json
+import re
+import threading
+import time
+from typing import Callable, List
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from .state import AppState
+from dataclasses import replace
 from .strategies.default import SubjectPredicateStrategy
-from . import bq_client
+from .strategies.semantic import SemanticStrategy
+from . import bq_client, mirror, llm_cache, openai_client, ranking, ann_index, pipeline, result_store, tracing, translation
+from .embeddings import SIMILARITY_SECTIONS, build_section_texts, get_embeddings, get_embeddings_with_stats
+
+# BigQueryはクエリごとに最低10MBを課金するため、課金上限はこれを下回らないようにする
+MIN_BILLED_BYTES = 10 * 1024 ** 2
+
+# ストリーミング取得中に暫定表示する上位件数
+PROVISIONAL_ROWS = 10
+
+# 処理時間の内訳パネルに残す検索の回数
+RECENT_TRACES = 5
+
+LLM_MODEL = "gpt-4-turbo"
+
+# 検索方式 (AppState.search_strategy の値と表示名)
+SEARCH_STRATEGIES = {
+    "keyword": "キーワード・IPC",
+    "semantic": "意味検索 (Embeddingインデックス)",
+}
 
 # --- Prompt Templates ---
 
@@ -61,32 +83,122 @@ JSON形式で、元の日本語をキー、英語リストをバリューとす
 }}
 """
 
-def get_llm_response(prompt: str, json_mode: bool = False) -> str:
-    """LLMからの応答を生成する共通関数"""
+def _record_llm_cache(app_state: AppState, hit: bool, saved_seconds: float = 0.0) -> None:
+    if app_state is None:
+        return
+    stats = app_state.llm_cache_stats
+    stats["hits" if hit else "misses"] = stats.get("hits" if hit else "misses", 0) + 1
+    stats["saved_seconds"] = stats.get("saved_seconds", 0.0) + saved_seconds
+
+def _is_cacheable(content: str, finish_reason: str, json_mode: bool) -> bool:
+    """正常に終了し、json_mode の場合はJSONとして読める応答だけをキャッシュする"""
+    if finish_reason != "stop" or not content:
+        return False
+    if json_mode:
+        try:
+            json.loads(content)
+        except json.JSONDecodeError:
+            return False
+    return True
+
+def get_llm_response(prompt: str, json_mode: bool = False, force_refresh: bool = False,
+                     app_state: AppState = None, on_text: Callable[[str], None] = None) -> str:
+    """
+    LLMからの応答を生成する共通関数。
+    同じ (モデル, プロンプト, 応答形式) の応答はディスクキャッシュから返す。force_refresh=True なら必ず再生成する。
+    app_state を渡すと、キャッシュのヒット数と省けた待ち時間をセッションの統計に加える。
+    応答はストリーミングで受け取り、on_text にはそれまでに受け取ったテキスト全体を、断片を受け取るたびに渡す。
+    最初の断片が届くまでの時間 (TTFT) はトレースに記録する。
+    途中で打ち切られた応答や、json_mode=True でJSONとして読めない応答はキャッシュしない。
+    """
     if not st.session_state.get("openai_api_key_configured"):
         return json.dumps({"error": "OpenAI APIキーが設定されていません。"})
+    response_format = {"type": "json_object"} if json_mode else {"type": "text"}
+    cache = llm_cache.get_llm_cache()
     try:
-        client = OpenAI(api_key=st.session_state.get("openai_api_key"))
-        messages = [{"role": "user", "content": prompt}]
-        
-        response_format = {"type": "json_object"} if json_mode else {"type": "text"}
-        
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=messages,
-            response_format=response_format
-        )
-        return response.choices[0].message.content
+        with tracing.span("get_llm_response", model=LLM_MODEL, json_mode=json_mode) as span:
+            cached = None if force_refresh else cache.get(LLM_MODEL, prompt, response_format)
+            span.set_attributes(cache_hit=cached is not None)
+            if cached is not None:
+                _record_llm_cache(app_state, hit=True, saved_seconds=cached["latency"])
+                if on_text:
+                    on_text(cached["response"])
+                return cached["response"]
+
+            started = time.perf_counter()
+            client = openai_client.get_client(st.session_state.get("openai_api_key"))
+            messages = [{"role": "user", "content": prompt}]
+
+            stream = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                response_format=response_format,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            parts = []
+            finish_reason = None
+            for chunk in stream:
+                # 使用量は choices が空の最後のチャンクで届く
+                if chunk.usage:
+                    span.set_attributes(
+                        prompt_tokens=chunk.usage.prompt_tokens,
+                        completion_tokens=chunk.usage.completion_tokens,
+                    )
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if not parts:
+                    span.set_attributes(ttft_ms=round((time.perf_counter() - started) * 1000, 1))
+                parts.append(chunk.choices[0].delta.content)
+                if on_text:
+                    on_text("".join(parts))
+            content = "".join(parts)
+            span.set_attributes(finish_reason=finish_reason or "")
+            if _is_cacheable(content, finish_reason, json_mode):
+                cache.put(LLM_MODEL, prompt, response_format, content, time.perf_counter() - started)
+            _record_llm_cache(app_state, hit=False)
+            return content
     except Exception as e:
         return json.dumps({"error": f"LLMエラー: {e}"})
 
-def run_initial_interaction(app_state: AppState) -> AppState:
-    """ユーザーの最初の入力から、具体的な調査テーマの候補を複数生成する"""
-    user_query = app_state.chat_history[-1][1]
+_JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)')
+
+def _partial_string_list(text: str, key: str) -> List[str]:
+    """
+    受信途中のJSONから、key に対応する文字列の配列を読み取る。
+    最後の要素は閉じていなくてもよい（ストリーミング中の暫定表示用）。
+    """
+    start = text.find(f'"{key}"')
+    start = text.find("[", start) if start >= 0 else -1
+    if start < 0:
+        return []
+    end = text.find("]", start)
+    items = []
+    for m in _JSON_STRING.finditer(text[start + 1:] if end < 0 else text[start + 1:end]):
+        try:
+            items.append(json.loads(f'"{m.group(1)}"'))
+        except json.JSONDecodeError:
+            items.append(m.group(1))  # 途中で切れたエスケープはそのまま表示する
+    return items
+
+def run_initial_interaction(app_state: AppState, force_refresh: bool = False) -> AppState:
+    """ユーザーの最後の入力から、具体的な調査テーマの候補を複数生成する（force_refresh=True ならキャッシュを使わない）"""
+    user_query = next(message for author, message in reversed(app_state.chat_history) if author == "user")
     
     with st.spinner("調査テーマの具体的な選択肢を生成中..."):
         prompt = REFINE_THEME_PROMPT.format(user_query=user_query)
-        response_str = get_llm_response(prompt, json_mode=True)
+        placeholder = st.empty()
+
+        def show_plans(text: str) -> None:
+            plans = _partial_string_list(text, "proposed_plans")
+            if plans:
+                placeholder.markdown("\n".join(f"- {plan}" for plan in plans))
+
+        response_str = get_llm_response(prompt, json_mode=True, force_refresh=force_refresh, app_state=app_state,
+                                        on_text=show_plans)
+        placeholder.empty()
         
         try:
             response_data = json.loads(response_str)
@@ -105,11 +217,14 @@ def run_initial_interaction(app_state: AppState) -> AppState:
 
     return app_state
 
-def suggest_search_terms(app_state: AppState) -> AppState:
-    """確定したテーマに基づき、検索タームを提案する"""
+def suggest_search_terms(app_state: AppState, force_refresh: bool = False) -> AppState:
+    """確定したテーマに基づき、検索タームを提案する（force_refresh=True ならキャッシュを使わない）"""
     with st.spinner("具体的な検索キーワードとIPC分類を提案中..."):
         prompt = SUGGEST_TERMS_PROMPT.format(plan_text=app_state.plan_text)
-        response_str = get_llm_response(prompt, json_mode=True)
+        placeholder = st.empty()
+        response_str = get_llm_response(prompt, json_mode=True, force_refresh=force_refresh, app_state=app_state,
+                                        on_text=lambda text: placeholder.code(text, language="json"))
+        placeholder.empty()
         
         try:
             response_data = json.loads(response_str)
@@ -132,60 +247,262 @@ def suggest_search_terms(app_state: AppState) -> AppState:
             
     return app_state
 
-def get_embeddings(texts: list, model="text-embedding-3-small") -> list:
-    client = OpenAI(api_key=st.session_state.get("openai_api_key"))
-    response = client.embeddings.create(input=texts, model=model)
-    return [embedding.embedding for embedding in response.data]
+def request_translations(keywords: list, app_state: AppState = None, force_refresh: bool = False) -> dict:
+    """
+    日本語キーワードのリストを1回のLLM呼び出しでまとめて翻訳し、{日本語: [英語, ...]} を返す。
+    翻訳に失敗した場合は空の辞書を返す（キーワードは日本語のまま検索される）。
+    force_refresh=True ならLLM応答のキャッシュを使わない。
+    """
+    prompt = TRANSLATE_KEYWORDS_PROMPT.format(keywords_jp=json.dumps(keywords, ensure_ascii=False))
+    try:
+        response_data = json.loads(get_llm_response(prompt, json_mode=True, force_refresh=force_refresh, app_state=app_state))
+    except json.JSONDecodeError as e:
+        tracing.set_attributes(translation_error=f"JSONDecodeError: {e}")
+        st.warning(f"キーワードの翻訳結果を読み取れませんでした: {e}")
+        return {}
+    if "error" in response_data:
+        tracing.set_attributes(translation_error=response_data["error"])
+        st.warning(f"キーワードの翻訳に失敗しました: {response_data['error']}")
+        return {}
+    translations = response_data.get("翻訳結果", {})
+    return translations if isinstance(translations, dict) else {}
+
+def rescore_results(app_state: AppState) -> AppState:
+    """
+    similarity_weights の変更を検索結果に反映する。
+    保存済みのセクション別類似度の重み付き和で並べ替えるだけで、EmbeddingやBigQueryの呼び出しはしない。
+    """
+    handle = app_state.result_handle
+    if handle is None or not all(ranking.section_column(s) in handle.columns for s in SIMILARITY_SECTIONS):
+        return app_state
+    store = result_store.get_result_store()
+    with tracing.span("rescore", rows=len(handle)):
+        table = ranking.rescore_table(store.read_table(handle), app_state.similarity_weights)
+        app_state.result_handle = store.put_table(table)
+    store.delete(handle)
+    return app_state
+
+def _format_cache_stats(app_state: AppState) -> str:
+    stats = app_state.search_stats
+    return f"Embeddingキャッシュ: ヒット{stats.get('embedding_cache_hits', 0)}件 / ミス{stats.get('embedding_cache_misses', 0)}件"
+
+def check_query_budget(app_state: AppState, estimated_bytes: int, confirmed_bytes: int = 0) -> int:
+    """
+    推定スキャン量を1回あたり・セッション全体の予算と照合し、本実行に設定する課金上限を返す。
+    予算を超えていてユーザーの確認が済んでいない場合は、確認メッセージを設定してNoneを返す。
+
+    :param confirmed_bytes: ユーザーが実行を確認したときの推定スキャン量。
+        今回の見積もりがこれを上回る場合（確認後にデータが増えた場合など）は、改めて確認を求める。
+    """
+    app_state.estimated_bytes = estimated_bytes
+    session_remaining = max(app_state.session_budget_bytes - app_state.session_bytes_billed, 0)
+
+    reasons = []
+    if estimated_bytes > app_state.query_budget_bytes:
+        reasons.append(f"1回あたりの上限 ({bq_client.format_bytes(app_state.query_budget_bytes)})")
+    if estimated_bytes > session_remaining:
+        reasons.append(f"セッションの残り予算 ({bq_client.format_bytes(session_remaining)})")
+
+    if not reasons:
+        return max(min(app_state.query_budget_bytes, session_remaining), MIN_BILLED_BYTES)
+    if estimated_bytes > confirmed_bytes:
+        changed = (f"確認時の推定 ({bq_client.format_bytes(confirmed_bytes)}) から増えています。"
+                   if confirmed_bytes else "")
+        app_state.cost_confirmation_message = (
+            f"この検索の推定スキャン量は {bq_client.format_bytes(estimated_bytes)} で、"
+            f"{'と'.join(reasons)}を超えています。{changed}実行しますか？"
+        )
+        return None
+    # 確認済みの場合も、確認した見積もりを上回るスキャンはBigQuery側の課金上限で止める
+    return max(confirmed_bytes, MIN_BILLED_BYTES)
 
 def run_search(app_state: AppState) -> AppState:
-    """検索を実行し、結果を状態に保存する"""
+    """検索を実行し、結果を状態に保存する。各段階の所要時間はトレースとして記録する。"""
+    with tracing.span("run_search", strategy=app_state.search_strategy, limit=app_state.search_conditions.limit) as root:
+        app_state = _run_search(app_state, root)
+        if app_state.error_message:
+            root.status, root.status_message = tracing.STATUS_ERROR, app_state.error_message
+    app_state.recent_traces = (app_state.recent_traces + [root.trace])[-RECENT_TRACES:]
+    return app_state
+
+def _run_search(app_state: AppState, root: tracing.Span) -> AppState:
     app_state.error_message = "" # 実行前にエラーメッセージをクリア
+    app_state.cost_confirmation_message = ""
+    app_state.search_timings = {}
+    app_state.search_stats = {}
+    # 上限超過の承認と訳語の作り直しは1回の実行に限り有効
+    confirmed_bytes, app_state.confirmed_bytes = app_state.confirmed_bytes, 0
+    refresh_translations, app_state.refresh_translations = app_state.refresh_translations, False
     with st.status("特許検索を実行中...", expanded=True) as status:
         try:
             # 0. 事前検証
             status.update(label="検索条件を検証中...")
             cond = app_state.search_conditions
-            if not (cond.subject_keywords or cond.subject_ipc or cond.predicate_keywords or cond.predicate_ipc):
+            semantic = app_state.search_strategy == "semantic"
+            if semantic:
+                if not app_state.plan_text:
+                    app_state.error_message = "意味検索には調査テーマが必要です。"
+                    status.update(label="調査テーマがありません。", state="error")
+                    return app_state
+                if not len(ann_index.get_index()):
+                    app_state.error_message = "Embeddingインデックスが空です。先にキーワード・IPC検索を実行して特許を登録してください。"
+                    status.update(label="Embeddingインデックスが空です。", state="error")
+                    return app_state
+            elif not (cond.subject_keywords or cond.subject_ipc or cond.predicate_keywords or cond.predicate_ipc):
                 app_state.error_message = "キーワードまたはIPCを少なくとも1つは指定してください。"
                 status.update(label="検索条件がありません。", state="error")
                 return app_state
 
-            # 1. キーワード翻訳 (一時的に無効化)
-            # status.update(label="日本語キーワードを英語に翻訳中...")
-            # (翻訳ロジックはここにありますが、今回は呼び出しません)
+            # 1. キーワード翻訳 (用語集にない語だけをLLMで翻訳し、訳語を加えた検索条件のコピーで検索する)
+            if not semantic and (cond.subject_keywords or cond.predicate_keywords):
+                status.update(label="日本語キーワードを英語に翻訳中...")
+                with tracing.span("translate_keywords") as translate_span:
+                    cond, translated = translation.translate_conditions(
+                        cond, lambda keywords: request_translations(keywords, app_state, force_refresh=refresh_translations),
+                        refresh=refresh_translations
+                    )
+                    translate_span.set_attributes(
+                        glossary_hits=translated.glossary_hits,
+                        llm_terms=len(translated.requested),
+                        failed=len(translated.failed),
+                    )
+                if translated.failed:
+                    st.warning(f"次のキーワードは翻訳できなかったため、日本語のまま検索します: {', '.join(translated.failed)}")
 
-            # 2. SQL生成
+            # 2. SQL生成 (条件を満たすローカルミラーがあれば、DuckDB向けのSQLを生成する)
             status.update(label="SQLクエリを生成中...")
-            strategy = SubjectPredicateStrategy()
-            sql, params = strategy.generate_sql(app_state.search_conditions)
-            app_state.generated_sql = sql
+            query_vectors = None
+            with tracing.span("generate_sql") as sql_span:
+                if semantic:
+                    # 意味検索ではキーワード・IPCを使わないため、国・期間だけでミラーを選ぶ
+                    local_mirror = mirror.find_mirror(replace(cond, subject_keywords=[], subject_ipc=[], predicate_keywords=[], predicate_ipc=[]))
+                    query_vectors = get_embeddings([app_state.plan_text], api_key=st.session_state.get("openai_api_key"))
+                    strategy = SemanticStrategy(
+                        ann_index.get_index(), query_vectors[0],
+                        dialect="duckdb" if local_mirror else "bigquery",
+                        search_table=st.session_state.get("search_table") or None
+                    )
+                else:
+                    local_mirror = mirror.find_mirror(cond)
+                    strategy = SubjectPredicateStrategy(
+                        dialect="duckdb" if local_mirror else "bigquery",
+                        search_table=st.session_state.get("search_table") or None
+                    )
+                # 翻訳した訳語を加えた検索条件 (cond) からSQLを生成する（キャッシュの照合・ドライランも同じSQLで行う）
+                sql, params = strategy.generate_sql(cond)
+                app_state.generated_sql = sql
+                app_state.sql_explanation = strategy.explain()
+                sql_span.set_attributes(dialect=strategy.dialect, source=local_mirror.name if local_mirror else "bigquery")
             
-            # 3. BigQuery検索
-            status.update(label=f"BigQueryで最大{app_state.search_conditions.limit}件の特許を検索中...")
-            results_df = bq_client.execute_query(sql, params)
-            
-            if results_df.empty:
+            # 3. 検索 (ローカルミラー or BigQuery)
+            # 取得とEmbeddingはワーカースレッドで進めるため、セッション状態の認証情報・APIキーはここで取り出して渡す
+            search_started = time.perf_counter()
+            if local_mirror:
+                status.update(label=f"ローカルミラー「{local_mirror.name}」({local_mirror.manifest.created_at}作成)で最大{app_state.search_conditions.limit}件の特許を検索中...")
+                def mirror_pages():
+                    # キーワード検索は、可能であれば全文検索用インデックスで評価する
+                    df = None if semantic else local_mirror.keyword_search(cond)
+                    yield df if df is not None else local_mirror.execute_query(sql, params)
+                pages = mirror_pages()
+            elif (cached_df := bq_client.read_cached_result(sql, params)) is not None:
+                # 同じ条件の検索結果がキャッシュにあれば、BigQueryを使わずに返す
+                status.update(label="キャッシュ済みの検索結果を読み込み中...")
+                pages = iter([cached_df])
+            else:
+                # 3-1. ドライランによるスキャン量の事前見積もりと予算チェック
+                status.update(label="BigQueryのスキャン量を見積もり中 (ドライラン)...")
+                with tracing.span("dry_run") as dry_run_span:
+                    estimated_bytes = bq_client.estimate_query_bytes(sql, params)
+                    dry_run_span.set_attributes(estimated_bytes=estimated_bytes)
+                maximum_bytes_billed = check_query_budget(app_state, estimated_bytes, confirmed_bytes)
+                st.write(f"推定スキャン量: {bq_client.format_bytes(app_state.estimated_bytes)}")
+                if maximum_bytes_billed is None:
+                    status.update(label="スキャン量が上限を超えるため、実行の確認待ちです。", state="error")
+                    return app_state
+
+                # 3-2. 課金上限を付けて本実行し、結果をページ単位で受け取る
+                status.update(label=f"BigQueryで最大{app_state.search_conditions.limit}件の特許を検索中...")
+                pages = bq_client.iter_query_pages(
+                    sql, params, credentials_info=bq_client.resolve_credentials_info(),
+                    maximum_bytes_billed=maximum_bytes_billed
+                )
+
+            # 4. 類似度計算 (調査テーマのEmbeddingはクエリと並行して計算し、ページが届くたびに文献のEmbeddingとランキングを進める)
+            api_key = st.session_state.get("openai_api_key")
+            app_state.search_stats.update(embedding_cache_hits=0, embedding_cache_misses=0)
+            stats_lock = threading.Lock()
+
+            def embed(texts: list) -> list:
+                """この検索で取得したEmbeddingのキャッシュのヒット数・ミス数を数える（ワーカースレッドから呼ばれる）"""
+                vectors, hits, misses = get_embeddings_with_stats(texts, api_key=api_key)
+                with stats_lock:
+                    app_state.search_stats["embedding_cache_hits"] += hits
+                    app_state.search_stats["embedding_cache_misses"] += misses
+                return vectors
+            provisional_view = st.empty()
+
+            def count_billed_bytes(bq_stats: dict) -> None:
+                app_state.session_bytes_billed += bq_stats["total_bytes_billed"]
+                root.set_attributes(
+                    bytes_processed=bq_stats["total_bytes_processed"],
+                    bytes_billed=bq_stats["total_bytes_billed"],
+                    slot_ms=bq_stats["slot_millis"],
+                    cache_hit=bq_stats["cache_hit"],
+                )
+
+            def show_progress(result: pipeline.PipelineResult) -> None:
+                with tracing.span("render_progress", rows=result.row_count):
+                    status.update(label=f"{result.row_count}件の文献の類似度を計算済み (取得を継続中, {_format_cache_stats(app_state)})...")
+                    top = ranking.top_k_indices(np.concatenate(result.scores), PROVISIONAL_ROWS)
+                    provisional_df = pd.concat(result.pages, ignore_index=True).take(top)
+                    provisional_view.dataframe(provisional_df[['publication_number', 'title', 'similarity']], hide_index=True)
+
+            result = pipeline.run(
+                pages, app_state.plan_text, embed, build_section_texts,
+                query_vectors=query_vectors, weights=app_state.similarity_weights, on_page=show_progress, on_stats=count_billed_bytes, started_at=search_started
+            )
+            app_state.search_timings.update(result.timings)
+
+            if not result.pages:
                 status.update(label="検索結果が0件でした。", state="complete")
-                app_state.search_results = pd.DataFrame()
+                result_store.get_result_store().delete(app_state.result_handle)
+                app_state.result_handle = None
                 ai_response = "検索条件に一致する特許は見つかりませんでした。"
                 app_state.chat_history.append(("assistant", ai_response))
                 return app_state
-            
-            # 4. 類似度計算
-            status.update(label=f"{len(results_df)}件の文献の類似度を計算中...")
-            plan_embedding = get_embeddings([app_state.plan_text])[0]
-            
-            results_df['text_for_embedding'] = results_df['title'].fillna('') + ' ' + results_df['abstract'].fillna('')
-            document_embeddings = get_embeddings(results_df['text_for_embedding'].tolist())
-            
-            similarities = cosine_similarity([plan_embedding], document_embeddings)[0]
-            results_df['similarity'] = similarities
-            
+
             # 5. 結果のソートと保存
-            results_df = results_df.sort_values(by='similarity', ascending=False).drop(columns=['text_for_embedding'])
-            app_state.search_results = results_df
-            
-            status.update(label="検索完了！", state="complete")
+            with tracing.span("finalize", rows=result.row_count):
+                scores = np.concatenate(result.scores)
+                results_df = pd.concat(result.pages, ignore_index=True)
+                # 計算済みのEmbeddingは、次回以降の意味検索のためにインデックスへ登録する
+                app_state.search_stats["ann_index_added"] = ann_index.get_index().insert(
+                    results_df['publication_number'].tolist(), np.concatenate(result.matrices)
+                )
+                results_df = results_df.take(ranking.top_k_indices(scores, len(scores)))
+            root.set_attributes(
+                rows=len(results_df),
+                embedding_cache_hits=app_state.search_stats.get("embedding_cache_hits", 0),
+                embedding_cache_misses=app_state.search_stats.get("embedding_cache_misses", 0),
+            )
+            store = result_store.get_result_store()
+            store.delete(app_state.result_handle)
+            app_state.result_handle = store.put(results_df)
+            app_state.search_timings["total"] = time.perf_counter() - search_started
+            provisional_view.empty()
+
+            # ステージごとの所要時間 (クリティカルパスは「取得の完了 + 最後のページのEmbedding」になるのが理想)
+            st.dataframe(result.stage_table(), hide_index=True)
+            if "fetch_end" in result.timings:
+                st.write(
+                    f"取得完了 {result.timings['fetch_end']:.1f}秒 + 最後のEmbedding {result.timings['last_embedding']:.1f}秒"
+                    f" / 全体 {app_state.search_timings['total']:.1f}秒"
+                )
+
+            status.update(
+                label=f"検索完了！ (最初の結果まで {app_state.search_timings['first_result']:.1f}秒 / 全体 {app_state.search_timings['total']:.1f}秒, {_format_cache_stats(app_state)})",
+                state="complete"
+            )
             ai_response = f"検索が完了し、調査方針との類似度が高い順に{len(results_df)}件の特許をランキングしました。"
             app_state.chat_history.append(("assistant", ai_response))
 
@@ -0,0 +1,380 @@
+"""
+特許のEmbeddingに対する近似最近傍（ANN）インデックス。
+
+NumPyだけで実装したIVF（転置ファイル）方式のインデックスで、ベクトルを球面k-meansのクラスタ（リスト）に分け、
+検索時はクエリに近いリストだけを走査する。ベクトル・公開番号・所属リストは固定長のバイナリファイルとして保存し、
+メモリマップで読み込むため、件数が多くてもプロセスのメモリはほとんど使わない。
+
+ファイル上の行は、先頭の sorted_count 件がリスト順に整列済みで、残りは追記された未整列の行になる。
+追記分が増えたら整列し直し（compact）、件数が大きく増えたらクラスタを学習し直す（train）。
+insert から必要になった整列・学習はバックグラウンドのスレッドで行い、検索の応答を待たせない。
+整列・学習の間に追加された行は、置き換えの際に未整列の行として末尾に残す。
+件数が MIN_TRAIN_SIZE 未満の間は、全件を厳密に検索する。
+
+インデックスは Embeddingモデルと文書ベクトルの定義 (ranking.DOC_VECTOR_VERSION) の組ごとに作成し、
+異なる定義のベクトルが同じインデックスに混ざらないようにする。
+
+数百万件規模のインデックスを学習し直す場合は、アプリの外で実行する:
+    cd src
+    python -m core.ann_index --train
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .ranking import DOC_VECTOR_VERSION, normalize_rows, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+INDEX_ROOT = Path(__file__).resolve().parents[2] / "outputs" / "ann_index"
+DEFAULT_MODEL = "text-embedding-3-small"
+
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.bin"
+LISTS_FILE = "lists.i32"
+CENTROIDS_FILE = "centroids.npy"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+
+ID_WIDTH = 32                   # 公開番号を保存する固定長のバイト数
+MIN_TRAIN_SIZE = 10_000         # この件数に達したらクラスタを学習する
+AUTO_TRAIN_MAX_SIZE = 200_000   # 追加時に自動で学習し直す件数の上限（これを超えたらCLIで学習する）
+RETRAIN_GROWTH = 4              # 学習時の何倍に増えたら学習し直すか
+COMPACT_TAIL_RATIO = 0.2        # 未整列の行が整列済みの行のこの割合を超えたら整列し直す
+DEFAULT_N_PROBE = 16            # 検索時に走査するリスト数
+KMEANS_ITERATIONS = 10
+TRAIN_SAMPLES_PER_LIST = 40
+CHUNK_ROWS = 65_536
+
+@dataclass
+class IndexMeta:
+    """インデックスの件数と構成。ファイルへの追記が終わってから書き換えるため、これを正とする。"""
+    dim: int
+    count: int = 0
+    sorted_count: int = 0
+    n_lists: int = 0        # 0なら未学習
+    trained_count: int = 0  # 学習時の件数
+    doc_vector: str = ""    # 文書ベクトルの定義 (ranking.DOC_VECTOR_VERSION)
+
+def default_n_lists(count: int) -> int:
+    """1リストあたりおよそ sqrt(件数)/2 件になるリスト数"""
+    return int(np.clip(2 * np.sqrt(count), 16, 65_536))
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """各ベクトルを、内積が最大のセントロイドのリストに割り当てる"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + CHUNK_ROWS])
+        lists[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return lists
+
+def _spherical_kmeans(sample: np.ndarray, n_lists: int, rng: np.random.Generator) -> np.ndarray:
+    """正規化済みのベクトルを球面k-meansでクラスタリングし、正規化済みのセントロイドを返す"""
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        lists = _assign(sample, centroids)
+        counts = np.bincount(lists, minlength=n_lists)
+        order = np.argsort(lists, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        # 空になったリストは、ランダムなサンプルで置き直す
+        empty = np.flatnonzero(~nonempty)
+        sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+class AnnIndex:
+    """
+    ディスク上のIVFインデックス。insert で公開番号とベクトルを追加し、search で近い公開番号を返す。
+    同じ公開番号は一度しか登録しない。プロセス内ではスレッドセーフ。
+    整列・学習は _reorganize_lock で1つずつ実行し、時間のかかる計算とファイルの書き出しの間は _lock を保持しない。
+    """
+
+    def __init__(self, path: Path, doc_vector: str = ""):
+        self.path = Path(path)
+        self.doc_vector = doc_vector
+        self._lock = threading.RLock()
+        self.meta: Optional[IndexMeta] = None
+        meta_path = self.path / META_FILE
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.meta = IndexMeta(**json.load(f))
+            if self.meta.doc_vector != doc_vector:
+                raise ValueError(
+                    f"インデックスの文書ベクトルの定義が一致しません: {self.meta.doc_vector or '(未記録)'} != {doc_vector or '(未記録)'}"
+                )
+        self._maps = None
+        self._centroids = None
+        self._offsets = None
+        self._sorted_ids = None  # 登録済みの公開番号を整列した配列（重複の判定用）
+        self._reorganize_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self.meta.count if self.meta else 0
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.meta and self.meta.n_lists)
+
+    # --- ファイル入出力 ---
+
+    def _save_meta(self) -> None:
+        tmp_path = self.path / f"{META_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self.meta), f)
+        os.replace(tmp_path, self.path / META_FILE)
+
+    def _open_maps(self, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """先頭 n 行の (ベクトル, 公開番号, 所属リスト) のメモリマップを新たに開く"""
+        return (
+            np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode='r', shape=(n, self.meta.dim)),
+            np.memmap(self.path / IDS_FILE, dtype=f"S{ID_WIDTH}", mode='r', shape=(n,)),
+            np.memmap(self.path / LISTS_FILE, dtype=np.int32, mode='r', shape=(n,)),
+        )
+
+    def _get_maps(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(ベクトル, 公開番号, 所属リスト) のメモリマップを返す"""
+        if self._maps is None:
+            self._maps = self._open_maps(self.meta.count)
+        if self.trained and self._centroids is None:
+            self._centroids = np.load(self.path / CENTROIDS_FILE)
+            self._offsets = np.load(self.path / OFFSETS_FILE)
+        return self._maps
+
+    def _close_maps(self) -> None:
+        self._maps = None
+        self._centroids = None
+        self._offsets = None
+
+    def _append(self, vectors: np.ndarray, ids: np.ndarray, lists: np.ndarray) -> None:
+        """各ファイルの末尾に追記する。前回の書き込みが中断していた場合に備え、metaの件数で切り詰めてから書く。"""
+        self._close_maps()
+        count = self.meta.count
+        for name, array in ((VECTORS_FILE, vectors), (IDS_FILE, ids), (LISTS_FILE, lists)):
+            row_bytes = array.itemsize * (array.shape[1] if array.ndim == 2 else 1)
+            with open(self.path / name, 'ab') as f:
+                f.truncate(count * row_bytes)
+                f.write(np.ascontiguousarray(array).tobytes())
+
+    def _known_ids(self) -> np.ndarray:
+        if self._sorted_ids is None:
+            self._sorted_ids = np.sort(self._get_maps()[1]) if len(self) else np.empty(0, dtype=f"S{ID_WIDTH}")
+        return self._sorted_ids
+
+    def _is_known(self, keys: np.ndarray) -> np.ndarray:
+        """各公開番号が登録済みかを、整列済みの配列の二分探索で判定する"""
+        known = self._known_ids()
+        if not len(known):
+            return np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(known, keys), len(known) - 1)
+        return known[positions] == keys
+
+    # --- 追加・学習 ---
+
+    def insert(self, ids: List[str], vectors) -> int:
+        """
+        公開番号とベクトルを追加し、追加した件数を返す。登録済みの公開番号は無視する。
+        整列・学習が必要になった場合は、バックグラウンドのスレッドで開始する。
+        """
+        if not len(ids):
+            return 0
+        matrix = normalize_rows(vectors)
+        with self._lock:
+            if self.meta is None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                self.meta = IndexMeta(dim=matrix.shape[1], doc_vector=self.doc_vector)
+            elif matrix.shape[1] != self.meta.dim:
+                raise ValueError(f"ベクトルの次元が一致しません: {matrix.shape[1]} != {self.meta.dim}")
+
+            keys = np.array([str(pid).encode("ascii") if str(pid).isascii() else b"" for pid in ids], dtype=object)
+            valid = np.array([0 < len(k) <= ID_WIDTH for k in keys], dtype=bool)
+            keys = keys.astype(f"S{ID_WIDTH}")
+            # 入力内で重複する公開番号は最初の1件だけを残す
+            first = np.zeros(len(keys), dtype=bool)
+            first[np.unique(keys, return_index=True)[1]] = True
+            keep = np.flatnonzero(valid & first & ~self._is_known(keys))
+            if not len(keep):
+                return 0
+
+            matrix, new_ids = matrix[keep], keys[keep]
+            if self.trained:
+                self._get_maps()
+                lists = _assign(matrix, self._centroids)
+            else:
+                lists = np.full(len(keep), -1, dtype=np.int32)
+            self._append(matrix, new_ids, lists)
+            self.meta.count += len(keep)
+            self._save_meta()
+            known = self._known_ids()
+            new_sorted = np.sort(new_ids)
+            self._sorted_ids = np.insert(known, np.searchsorted(known, new_sorted), new_sorted)
+            self._schedule_reorganize()
+            return len(keep)
+
+    def _pending_reorganization(self) -> Optional[str]:
+        """必要な再編成 ("train" / "compact") を返す。不要ならNone。"""
+        m = self.meta
+        if not m.n_lists:
+            return "train" if m.count >= MIN_TRAIN_SIZE else None
+        if m.count <= AUTO_TRAIN_MAX_SIZE and m.count >= RETRAIN_GROWTH * m.trained_count:
+            return "train"
+        if m.count - m.sorted_count > COMPACT_TAIL_RATIO * m.sorted_count:
+            return "compact"
+        return None
+
+    def _schedule_reorganize(self) -> None:
+        """再編成が必要で、実行中でなければバックグラウンドのスレッドで開始する（_lock を保持して呼ぶ）"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        action = self._pending_reorganization()
+        if action is None:
+            return
+        self._worker = threading.Thread(target=self._reorganize, args=(action,), name="ann-index-reorganize", daemon=True)
+        self._worker.start()
+
+    def _reorganize(self, action: str) -> None:
+        try:
+            self.train() if action == "train" else self.compact()
+        except Exception:
+            logger.exception("ANNインデックスの再編成 (%s) に失敗しました: %s", action, self.path)
+
+    def wait_for_reorganization(self, timeout: float = None) -> None:
+        """バックグラウンドで実行中の整列・学習の完了を待つ"""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def train(self, n_lists: int = None, seed: int = 0) -> None:
+        """
+        全件からサンプルした球面k-meansでリストを学習し直し、全件を割り当てて整列する。
+        開始時点の行だけを対象とし、計算の間は検索・追加を妨げない。
+        """
+        with self._reorganize_lock:
+            with self._lock:
+                if not len(self):
+                    return
+                count = self.meta.count
+                vectors = self._open_maps(count)[0]
+            n_lists = min(n_lists or default_n_lists(count), count)
+            rng = np.random.default_rng(seed)
+            sample_size = min(count, n_lists * TRAIN_SAMPLES_PER_LIST)
+            sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))])
+            centroids = _spherical_kmeans(sample, n_lists, rng)
+            lists = _assign(vectors, centroids)
+            del vectors  # 置き換えの前にメモリマップを閉じる（Windowsではマップ中のファイルを置き換えられない）
+            self._rewrite_sorted(count, lists, centroids)
+
+    def compact(self) -> None:
+        """現在の割り当てのまま、全件をリスト順に整列し直す"""
+        with self._reorganize_lock:
+            with self._lock:
+                if not self.trained:
+                    return
+                count = self.meta.count
+                lists = np.array(self._open_maps(count)[2])
+            self._rewrite_sorted(count, lists)
+
+    def _rewrite_sorted(self, count: int, lists: np.ndarray, centroids: np.ndarray = None) -> None:
+        """
+        先頭 count 行をリスト順に並べ替えたファイルを一時ファイルに書き出してから置き換える。
+        書き出しは _lock を保持せずに行い、その間に追加された行は置き換えの直前に未整列の行として末尾に付ける。
+        centroids を渡した場合は、学習し直したセントロイドとして同時に保存し、追加された行も割り当て直す。
+        """
+        n_lists = len(centroids) if centroids is not None else self.meta.n_lists
+        order = np.argsort(lists, kind="stable")
+        vectors, ids, _ = self._open_maps(count)
+        for name, source in ((VECTORS_FILE, vectors), (IDS_FILE, ids)):
+            with open(self.path / f"{name}.tmp", 'wb') as f:
+                for start in range(0, len(order), CHUNK_ROWS):
+                    f.write(np.ascontiguousarray(source[order[start:start + CHUNK_ROWS]]).tobytes())
+        del vectors, ids, source
+        sorted_lists = lists[order]
+        sorted_lists.tofile(self.path / f"{LISTS_FILE}.tmp")
+        offsets = np.searchsorted(sorted_lists, np.arange(n_lists + 1))
+
+        with self._lock:
+            if self.meta.count > count:
+                tail_vectors, tail_ids, tail_lists = (np.array(m[count:]) for m in self._open_maps(self.meta.count))
+                if centroids is not None:
+                    tail_lists = _assign(tail_vectors, centroids)
+                for name, array in ((VECTORS_FILE, tail_vectors), (IDS_FILE, tail_ids), (LISTS_FILE, tail_lists)):
+                    with open(self.path / f"{name}.tmp", 'ab') as f:
+                        f.write(np.ascontiguousarray(array).tobytes())
+            self._close_maps()
+            for name in (VECTORS_FILE, IDS_FILE, LISTS_FILE):
+                os.replace(self.path / f"{name}.tmp", self.path / name)
+            np.save(self.path / OFFSETS_FILE, offsets)
+            if centroids is not None:
+                np.save(self.path / CENTROIDS_FILE, centroids)
+                self.meta.n_lists = n_lists
+                self.meta.trained_count = count
+            self.meta.sorted_count = count
+            self._save_meta()
+
+    # --- 検索 ---
+
+    def search(self, query_vector, k: int = 100, n_probe: int = DEFAULT_N_PROBE) -> Tuple[List[str], np.ndarray]:
+        """
+        クエリベクトルとのコサイン類似度が高い順に、最大k件の (公開番号のリスト, 類似度) を返す。
+        学習済みの場合は、クエリに近い n_probe 個のリストと、未整列の行のうち同じリストに属するものだけを走査する。
+        """
+        with self._lock:
+            if not len(self):
+                return [], np.empty(0, dtype=np.float32)
+            q = normalize_rows(query_vector)[0]
+            vectors, ids, lists = self._get_maps()
+            m = self.meta
+
+            if not self.trained:
+                rows = np.arange(m.count)
+                scores = np.concatenate([vectors[s:s + CHUNK_ROWS] @ q for s in range(0, m.count, CHUNK_ROWS)])
+            else:
+                probe = top_k_indices(self._centroids @ q, n_probe)
+                ranges = [(self._offsets[l], self._offsets[l + 1]) for l in probe]
+                tail_rows = m.sorted_count + np.flatnonzero(np.isin(lists[m.sorted_count:], probe))
+                rows = np.concatenate([np.arange(s, e) for s, e in ranges] + [tail_rows])
+                scores = np.concatenate([vectors[s:e] @ q for s, e in ranges] + [vectors[tail_rows] @ q])
+
+            top = top_k_indices(scores, k)
+            return [pid.decode("ascii") for pid in ids[rows[top]]], scores[top]
+
+_indexes: Dict[str, AnnIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_index(model: str = DEFAULT_MODEL, root: Path = INDEX_ROOT, doc_vector: str = DOC_VECTOR_VERSION) -> AnnIndex:
+    """プロセス内で共有する、Embeddingモデルと文書ベクトルの定義ごとのインデックスを返す"""
+    path = Path(root) / f"{model}-{doc_vector}"
+    with _indexes_lock:
+        if str(path) not in _indexes:
+            _indexes[str(path)] = AnnIndex(path, doc_vector)
+        return _indexes[str(path)]
+
+def main():
+    parser = argparse.ArgumentParser(description="特許のEmbeddingの近似最近傍インデックスを管理する")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Embeddingモデル名")
+    parser.add_argument("--train", action="store_true", help="クラスタを学習し直して整列する")
+    parser.add_argument("--n-lists", type=int, help="学習するリスト数（省略時は件数から決める）")
+    args = parser.parse_args()
+
+    index = get_index(args.model)
+    if args.train:
+        index.wait_for_reorganization()
+        index.train(args.n_lists)
+    m = index.meta
+    if m is None:
+        print("インデックスはまだ作成されていません。")
+        return
+    print(f"{index.path}: {m.count}件 (次元 {m.dim}, リスト数 {m.n_lists}, 未整列 {m.count - m.sorted_count}件)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+多数の調査テーマ・検索条件をまとめて実行するバッチ検索エンジン。
+
+ジョブ定義（JSON）の各ジョブについて、SubjectPredicateStrategy でSQLを生成し、ローカルミラーまたはBigQueryで検索する。
+BigQueryで検索するジョブは、最大 fanout_size 件ずつ core.fanout で1つのクエリにまとめ、公開特許テーブルを1回のスキャンで評価する
+（課金バイト数はまとめたジョブで等分して記録する）。
+調査テーマがあり、OpenAIのAPIキーが設定されていれば、アプリと同じセクション別類似度（既定の重み）で結果をランキングする。
+ジョブは上限付きのスレッドプールで並列に実行し、完了したジョブはチェックポイント（JSONL）に1行ずつ記録する。
+途中で停止しても、同じ出力先で再実行すれば未完了・失敗したジョブだけを実行する。
+結果はジョブごとのParquetファイルに保存し、最後にスループット（ジョブ/分・課金バイト数・トークン数）を表示する。
+
+ジョブ定義の例:
+    {
+      "defaults": {"countries": ["JP", "US"], "start_date": "2015-01-01", "limit": 200},
+      "jobs": [
+        {"id": "ro-ml", "topic": "逆浸透膜における機械学習を用いた運転最適化",
+         "conditions": {"subject_keywords": ["逆浸透膜", "RO膜"], "predicate_ipc": ["G05B"]}}
+      ]
+    }
+
+実行:
+    cd src
+    OPENAI_API_KEY=... python -m core.batch jobs.json --credentials path/to/sa.json --workers 4
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict, field, fields
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from . import bq_client, fanout, mirror, pipeline, ranking, embedding_cache, embedding_executor
+from .embeddings import build_section_texts, get_embeddings
+from .state import SearchConditions
+from .strategies.default import SubjectPredicateStrategy
+
+BATCH_ROOT = Path(__file__).resolve().parents[2] / "outputs" / "batch"
+CHECKPOINT_FILE = "checkpoint.jsonl"
+RESULTS_DIR = "results"
+
+DEFAULT_WORKERS = 4
+DEFAULT_FANOUT_SIZE = 20  # 1回のスキャンにまとめるジョブ数の上限（多すぎるとクエリが長くなり、1件の失敗の影響も広がる）
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+_DATE_FIELDS = ("start_date", "end_date")
+
+@dataclass
+class BatchJob:
+    """1件の検索ジョブ"""
+    job_id: str
+    conditions: SearchConditions
+    topic: str = ""
+
+@dataclass
+class JobRecord:
+    """チェックポイントに記録する、1件のジョブの実行結果"""
+    job_id: str
+    status: str
+    rows: int = 0
+    bytes_billed: int = 0
+    embedding_tokens: int = 0
+    seconds: float = 0.0
+    source: str = ""         # "bigquery" / "cache" / ミラー名
+    result_file: str = ""
+    error: str = ""
+
+@dataclass
+class BatchReport:
+    """バッチ全体の集計"""
+    total_jobs: int = 0
+    skipped: int = 0  # チェックポイントにより実行しなかったジョブ
+    records: List[JobRecord] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def completed(self) -> List[JobRecord]:
+        return [r for r in self.records if r.status == STATUS_OK]
+
+    @property
+    def failed(self) -> List[JobRecord]:
+        return [r for r in self.records if r.status == STATUS_FAILED]
+
+    def format(self) -> str:
+        completed = self.completed
+        jobs_per_min = len(completed) / self.elapsed * 60 if self.elapsed else 0.0
+        lines = [
+            f"ジョブ: {self.total_jobs}件 (完了 {len(completed)} / 失敗 {len(self.failed)} / 再開によりスキップ {self.skipped})",
+            f"経過時間: {self.elapsed:.1f}秒 ({jobs_per_min:.1f}ジョブ/分)",
+            f"取得件数: {sum(r.rows for r in completed)}件",
+            f"課金バイト数: {bq_client.format_bytes(sum(r.bytes_billed for r in completed))}",
+            f"Embeddingの推定トークン数: {sum(r.embedding_tokens for r in completed):,}",
+        ]
+        for r in self.failed:
+            lines.append(f"  失敗: {r.job_id}: {r.error}")
+        return "\n".join(lines)
+
+def _parse_conditions(values: dict) -> SearchConditions:
+    names = {f.name for f in fields(SearchConditions)}
+    unknown = set(values) - names
+    if unknown:
+        raise ValueError(f"未知の検索条件です: {', '.join(sorted(unknown))}")
+    values = dict(values)
+    for name in _DATE_FIELDS:
+        if isinstance(values.get(name), str):
+            values[name] = date.fromisoformat(values[name])
+    return SearchConditions(**values)
+
+def load_job_spec(path: Path) -> List[BatchJob]:
+    """ジョブ定義のJSONを読み込む。defaults の検索条件は、各ジョブの conditions で上書きされる。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    defaults = spec.get("defaults", {})
+    jobs = []
+    for i, job in enumerate(spec.get("jobs", [])):
+        job_id = str(job.get("id") or f"job-{i + 1:04d}")
+        conditions = _parse_conditions({**defaults, **job.get("conditions", {})})
+        jobs.append(BatchJob(job_id, conditions, job.get("topic", "")))
+    duplicated = {j.job_id for j in jobs if sum(k.job_id == j.job_id for k in jobs) > 1}
+    if duplicated:
+        raise ValueError(f"ジョブIDが重複しています: {', '.join(sorted(duplicated))}")
+    return jobs
+
+class Checkpoint:
+    """完了したジョブを1行ずつ追記するJSONLファイル。同じジョブが複数回あれば最後の記録が有効。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, JobRecord]:
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = JobRecord(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    continue  # 書き込み途中で停止した行は無視する
+                records[record.job_id] = record
+        return records
+
+    def append(self, record: JobRecord) -> None:
+        line = json.dumps(asdict(record), ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a+b') as f:
+                # 停止により改行のない書き込み途中の行が残っていれば、その行と連結しないよう改行を補う
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+
+def _write_parquet(df: pd.DataFrame, path: Path) -> None:
+    """一時ファイルに書き込んでから置き換え、途中で停止しても壊れたファイルを残さない"""
+    tmp_path = path.with_suffix(".tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def _rank(df: pd.DataFrame, topic: str, api_key: str) -> tuple:
+    """
+    調査テーマとの類似度で並べ替え、(DataFrame, 推定トークン数) を返す。トークン数はキャッシュにないテキストのみ数える。
+    類似度はアプリの検索と同じく、タイトル・要約のセクション別類似度の重み付き和とする。
+    """
+    texts, present = pipeline.flatten_sections(build_section_texts(df))
+    cached = embedding_cache.get_embedding_cache().get_many(EMBEDDING_MODEL, [topic] + texts)
+    tokens = sum(embedding_executor.estimate_tokens(t) for t, v in zip([topic] + texts, cached) if v is None)
+    query_vectors = get_embeddings([topic], EMBEDDING_MODEL, api_key=api_key)
+    vectors = get_embeddings(texts, EMBEDDING_MODEL, api_key=api_key) if texts else []
+    scores, section_scores, _ = ranking.score_sections(
+        query_vectors, pipeline.split_section_vectors(vectors, present), present, ranking.DEFAULT_SECTION_WEIGHTS
+    )
+    df = df.assign(similarity=scores, **{ranking.section_column(name): values for name, values in section_scores.items()})
+    return df.take(ranking.top_k_indices(scores, len(scores))).reset_index(drop=True), tokens
+
+def _record_bigquery_stats(record: JobRecord, df: pd.DataFrame, share: int = 1) -> None:
+    stats = df.attrs.get("bq_stats", {})
+    record.bytes_billed = (stats.get("total_bytes_billed") or 0) // share
+    record.source = "cache" if stats.get("cache_hit") else "bigquery"
+
+def _finish_job(job: BatchJob, record: JobRecord, df: pd.DataFrame, results_dir: Path, api_key: str = None) -> None:
+    """検索結果をランキングしてParquetに保存し、記録を更新する"""
+    if job.topic and api_key and not df.empty:
+        df, record.embedding_tokens = _rank(df, job.topic, api_key)
+
+    result_path = results_dir / f"{job.job_id}.parquet"
+    _write_parquet(df, result_path)
+    record.rows = len(df)
+    record.result_file = str(result_path)
+
+def run_job(job: BatchJob, results_dir: Path, credentials_info: dict = None, api_key: str = None,
+            search_table: str = None, maximum_bytes_billed: int = None) -> JobRecord:
+    """1件のジョブを実行し、結果をParquetに保存する。失敗した場合も例外は送出せず、記録に残す。"""
+    started = time.perf_counter()
+    record = JobRecord(job.job_id, STATUS_OK)
+    try:
+        local_mirror = mirror.find_mirror(job.conditions)
+        strategy = SubjectPredicateStrategy(
+            dialect="duckdb" if local_mirror else "bigquery",
+            search_table=None if local_mirror else search_table
+        )
+        sql, params = strategy.generate_sql(job.conditions)
+        if local_mirror:
+            df = local_mirror.execute_query(sql, params)
+            record.source = local_mirror.name
+        else:
+            df = bq_client.execute_query(sql, params, credentials_info=credentials_info,
+                                         maximum_bytes_billed=maximum_bytes_billed)
+            _record_bigquery_stats(record, df)
+        _finish_job(job, record, df, results_dir, api_key)
+    except Exception as e:
+        record.status = STATUS_FAILED
+        record.error = str(e)
+    record.seconds = time.perf_counter() - started
+    return record
+
+def run_fanout_jobs(jobs: List[BatchJob], results_dir: Path, credentials_info: dict = None, api_key: str = None,
+                    search_table: str = None, maximum_bytes_billed: int = None) -> List[JobRecord]:
+    """
+    BigQueryで検索する複数のジョブを、1回のスキャン（core.fanout）で実行する。
+    まとめたクエリが失敗した場合は、全てのジョブを失敗として記録する。課金バイト数はジョブ数で等分する。
+    """
+    started = time.perf_counter()
+    records = {job.job_id: JobRecord(job.job_id, STATUS_OK) for job in jobs}
+    try:
+        results = fanout.run_fanout(
+            {job.job_id: job.conditions for job in jobs}, credentials_info=credentials_info,
+            search_table=search_table, maximum_bytes_billed=maximum_bytes_billed, use_mirror=False
+        )
+    except Exception as e:
+        results = {}
+        for record in records.values():
+            record.status, record.error = STATUS_FAILED, str(e)
+    for job in jobs:
+        record = records[job.job_id]
+        if job.job_id not in results:
+            continue
+        try:
+            _record_bigquery_stats(record, results[job.job_id], share=len(jobs))
+            _finish_job(job, record, results[job.job_id], results_dir, api_key)
+        except Exception as e:
+            record.status, record.error = STATUS_FAILED, str(e)
+    elapsed = (time.perf_counter() - started) / len(jobs)
+    for record in records.values():
+        record.seconds = elapsed
+    return list(records.values())
+
+def run_batch(jobs: List[BatchJob], output_dir: Path, credentials_info: dict = None, api_key: str = None,
+              max_workers: int = DEFAULT_WORKERS, search_table: str = None, maximum_bytes_billed: int = None,
+              on_record=None, fanout_size: int = DEFAULT_FANOUT_SIZE) -> BatchReport:
+    """
+    ジョブを上限付きのスレッドプールで並列に実行する。
+    output_dir のチェックポイントで完了済みのジョブは実行しない（失敗したジョブは再実行する）。
+    ローカルミラーで完結しないジョブは、fanout_size 件ずつ1回のBigQueryのスキャンにまとめる（1以下ならまとめない）。
+
+    :param on_record: ジョブが完了するたびに JobRecord を受け取る関数
+    :param maximum_bytes_billed: BigQueryの1回のスキャンあたりの課金バイト数の上限
+    """
+    output_dir = Path(output_dir)
+    results_dir = output_dir / RESULTS_DIR
+    results_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = Checkpoint(output_dir / CHECKPOINT_FILE)
+    done = {job_id for job_id, r in checkpoint.load().items()
+            if r.status == STATUS_OK and Path(r.result_file).exists()}
+
+    pending = [job for job in jobs if job.job_id not in done]
+    report = BatchReport(total_jobs=len(jobs), skipped=len(jobs) - len(pending))
+    started = time.perf_counter()
+    bigquery_jobs = [job for job in pending if mirror.find_mirror(job.conditions) is None] if fanout_size > 1 else []
+    fanout_ids = {job.job_id for job in bigquery_jobs}
+    single_jobs = [job for job in pending if job.job_id not in fanout_ids]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run_job, job, results_dir, credentials_info, api_key, search_table, maximum_bytes_billed)
+            for job in single_jobs
+        ] + [
+            executor.submit(run_fanout_jobs, bigquery_jobs[i:i + fanout_size], results_dir, credentials_info, api_key,
+                            search_table, maximum_bytes_billed)
+            for i in range(0, len(bigquery_jobs), fanout_size)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            for record in result if isinstance(result, list) else [result]:
+                checkpoint.append(record)
+                report.records.append(record)
+                if on_record:
+                    on_record(record)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="ジョブ定義(JSON)の検索をまとめて実行する")
+    parser.add_argument("spec", type=Path, help="ジョブ定義のJSONファイル")
+    parser.add_argument("--credentials", help="GCPサービスアカウントのJSONキーファイル (ローカルミラーのみで完結する場合は不要)")
+    parser.add_argument("--output", type=Path, help="出力先 (既定: outputs/batch/<ジョブ定義のファイル名>)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同時に実行するジョブ数")
+    parser.add_argument("--search-table", help="検索用テーブル (core.search_table で作成したもの)")
+    parser.add_argument("--max-bytes", type=int, help="BigQueryの1回のスキャンあたりの課金バイト数の上限")
+    parser.add_argument("--fanout-size", type=int, default=DEFAULT_FANOUT_SIZE,
+                        help="BigQueryの1回のスキャンにまとめるジョブ数 (1ならジョブごとにスキャンする)")
+    args = parser.parse_args()
+
+    credentials_info = None
+    if args.credentials:
+        with open(args.credentials, 'r', encoding='utf-8') as f:
+            credentials_info = json.load(f)
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("OPENAI_API_KEY が設定されていないため、調査テーマによるランキングは行いません。")
+
+    jobs = load_job_spec(args.spec)
+    output_dir = args.output or BATCH_ROOT / args.spec.stem
+
+    def print_record(record: JobRecord) -> None:
+        if record.status == STATUS_OK:
+            print(f"[完了] {record.job_id}: {record.rows}件 ({record.source}, {record.seconds:.1f}秒)")
+        else:
+            print(f"[失敗] {record.job_id}: {record.error}")
+
+    report = run_batch(jobs, output_dir, credentials_info, api_key, args.workers,
+                       args.search_table, args.max_bytes, on_record=print_record, fanout_size=args.fanout_size)
+    print(report.format())
+    print(f"結果: {output_dir / RESULTS_DIR}")
+
+if __name__ == "__main__":
+    main()
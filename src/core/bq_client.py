@@ -1,52 +1,393 @@
 from google.cloud import bigquery
+from google.cloud import bigquery_storage
 from google.oauth2 import service_account
 from google.cloud.bigquery import QueryJobConfig
 from google.api_core import exceptions
+from google.auth.transport.requests import Request
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional, Tuple
+import atexit
+import hashlib
+import json
+import queue
+import threading
 import pandas as pd
+import pyarrow as pa
+from . import result_cache
+
+# トークンの有効期限がこの時間内に迫っていれば、クエリ前に更新する
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# ストリーミング取得時の1ページあたりの行数と、先読みしておくページ数
+DEFAULT_PAGE_SIZE = 100
+PREFETCH_PAGES = 2
 
 class BQClientError(Exception):
     """BigQueryクライアントで発生したエラーのためのカスタム例外"""
     pass
 
-def execute_query(sql: str, params: list, credentials_info: dict = None) -> pd.DataFrame:
+@dataclass
+class _ClientEntry:
+    """認証情報ごとに再利用するCredentialsとClientの組"""
+    credentials: service_account.Credentials
+    client: bigquery.Client
+    bqstorage_client: bigquery_storage.BigQueryReadClient = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def close(self) -> None:
+        self.client.close()
+        if self.bqstorage_client is not None:
+            self.bqstorage_client.transport.close()
+
+_client_registry: dict = {}
+_registry_lock = threading.Lock()
+
+def credential_fingerprint(credentials_info: dict) -> str:
+    """
+    サービスアカウント情報から、クライアントを識別するためのフィンガープリントを計算する。
+    秘密鍵そのものではなく、鍵IDとアカウントを識別する項目のみを用いる。
+    """
+    key_fields = {k: credentials_info.get(k) for k in ("project_id", "client_email", "private_key_id")}
+    payload = json.dumps(key_fields, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def resolve_credentials_info(credentials_info: dict = None) -> dict:
+    """
+    認証情報が引数で渡されなかった場合、Streamlitのセッション状態から取得を試みる。
+    セッション状態はスクリプトのスレッドからしか参照できないため、ワーカースレッドで検索する場合は
+    事前にこの関数で取得した認証情報を渡すこと。
+    """
+    if credentials_info is not None:
+        return credentials_info
+    try:
+        import streamlit as st
+        if not st.session_state.get("gcp_sa_key_configured"):
+            raise BQClientError("GCPの認証情報が設定されていません。")
+        return st.session_state.get("gcp_sa_credentials")
+    except ImportError:
+        raise BQClientError("Streamlit環境外で実行する場合、credentials_info引数に認証情報を渡す必要があります。")
+
+def _refresh_if_needed(entry: _ClientEntry) -> None:
+    """アクセストークンが未取得、または期限切れ間近であれば更新する"""
+    credentials = entry.credentials
+    with entry.lock:
+        expiry = credentials.expiry  # google-authはnaiveなUTC日時を保持する
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if credentials.token is None or expiry is None or expiry - now < TOKEN_REFRESH_MARGIN:
+            credentials.refresh(Request())
+
+def _get_entry(credentials_info: dict = None) -> _ClientEntry:
+    """レジストリから認証情報に対応するエントリを取得する。なければ作成する。"""
+    credentials_info = resolve_credentials_info(credentials_info)
+    fingerprint = credential_fingerprint(credentials_info)
+
+    with _registry_lock:
+        entry = _client_registry.get(fingerprint)
+        if entry is None:
+            # スコープを明示しておくと、Client内部で別のCredentialsが複製されず、同じオブジェクトを更新できる
+            credentials = service_account.Credentials.from_service_account_info(
+                credentials_info, scopes=bigquery.Client.SCOPE
+            )
+            client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+            entry = _ClientEntry(credentials=credentials, client=client)
+            _client_registry[fingerprint] = entry
+
+    _refresh_if_needed(entry)
+    return entry
+
+def get_client(credentials_info: dict = None) -> bigquery.Client:
+    """
+    認証情報に対応するBigQueryクライアントを返す。
+    同じサービスアカウントに対しては、CredentialsとHTTPセッション（コネクションプール）を使い回す。
+
+    Args:
+        credentials_info (dict, optional): GCPサービスアカウントの認証情報。
+                                            Noneの場合、Streamlitのセッション状態から取得を試みる。
+
+    Returns:
+        bigquery.Client: 再利用可能なBigQueryクライアント。
+    """
+    return _get_entry(credentials_info).client
+
+def _get_clients(credentials_info: dict = None) -> tuple:
+    """
+    BigQueryクライアントと、結果の読み出しに用いるBigQuery Storage Readクライアントの組を返す。
+    Storage Readクライアントは初回の利用時に作成し、以降は使い回す。
+    """
+    entry = _get_entry(credentials_info)
+    with entry.lock:
+        if entry.bqstorage_client is None:
+            entry.bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=entry.credentials)
+    return entry.client, entry.bqstorage_client
+
+def close_client(credentials_info: dict = None) -> None:
+    """指定した認証情報のクライアントを閉じ、レジストリから取り除く"""
+    credentials_info = resolve_credentials_info(credentials_info)
+    with _registry_lock:
+        entry = _client_registry.pop(credential_fingerprint(credentials_info), None)
+    if entry is not None:
+        entry.close()
+
+def close_all_clients() -> None:
+    """レジストリ内のすべてのクライアントを閉じる"""
+    with _registry_lock:
+        entries = list(_client_registry.values())
+        _client_registry.clear()
+    for entry in entries:
+        entry.close()
+
+atexit.register(close_all_clients)
+
+def format_bytes(num_bytes: int) -> str:
+    """バイト数を人が読みやすい単位に整形する"""
+    size = float(num_bytes or 0)
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+def _job_stats(query_job) -> dict:
+    """クエリジョブの統計情報を辞書にまとめる"""
+    return {
+        "total_bytes_processed": query_job.total_bytes_processed or 0,
+        "total_bytes_billed": query_job.total_bytes_billed or 0,
+        "slot_millis": query_job.slot_millis or 0,
+        "cache_hit": bool(query_job.cache_hit),
+    }
+
+# 検索結果キャッシュから返した場合の統計情報（BigQueryでのスキャン・課金は発生しない）
+CACHED_RESULT_STATS = {
+    "total_bytes_processed": 0,
+    "total_bytes_billed": 0,
+    "slot_millis": 0,
+    "cache_hit": True,
+    "result_cache_hit": True,
+}
+
+def read_cached_result(sql: str, params: list) -> Optional[pd.DataFrame]:
+    """
+    同じSQLとパラメータの検索結果を、結果キャッシュだけから読み込む（BigQueryは実行しない）。
+    有効期限内の結果がなければNone。確認と読み込みを1回で行うため、その間に削除された場合もクエリは実行されない。
+    """
+    cached = result_cache.get_query_cache().get(result_cache.make_key(sql, params))
+    if cached is None:
+        return None
+    df = arrow_to_frame(cached)
+    df.attrs["bq_stats"] = dict(CACHED_RESULT_STATS)
+    return df
+
+def _raise_bad_request(e: exceptions.BadRequest, maximum_bytes_billed: int = None):
+    """BadRequestを、原因に応じたメッセージのBQClientErrorに変換する"""
+    if any(err.get('reason') == 'bytesBilledLimitExceeded' for err in e.errors):
+        raise BQClientError(f"スキャン量が課金上限 ({format_bytes(maximum_bytes_billed)}) を超えるため、クエリを中止しました。") from e
+    error_details = "\n".join([err['message'] for err in e.errors])
+    raise BQClientError(f"BigQueryのクエリエラーが発生しました。SQLの構文を確認してください。\n--- Details---\n{error_details}") from e
+
+def estimate_query_bytes(sql: str, params: list, credentials_info: dict = None) -> int:
+    """
+    クエリをドライランし、スキャンされる推定バイト数を返す（課金は発生しない）。
+
+    Args:
+        sql (str): 見積もるSQLクエリ。
+        params (list): SQLクエリのパラメータ。
+        credentials_info (dict, optional): GCPサービスアカウントの認証情報。
+
+    Returns:
+        int: 推定スキャンバイト数。
+
+    Raises:
+        BQClientError: 認証情報の不足、クエリエラー、その他の実行時エラーが発生した場合。
+    """
+    try:
+        client = get_client(credentials_info)
+        job_config = QueryJobConfig(query_parameters=params, dry_run=True, use_query_cache=False)
+        query_job = client.query(sql, job_config=job_config)
+        return query_job.total_bytes_processed or 0
+
+    except BQClientError:
+        raise
+    except exceptions.BadRequest as e:
+        _raise_bad_request(e)
+    except Exception as e:
+        raise BQClientError(f"BigQueryのドライラン中に予期せぬエラーが発生しました: {e}") from e
+
+def arrow_to_frame(data) -> pd.DataFrame:
+    """
+    ArrowのTable/RecordBatchを、Arrowのバッファをそのまま参照するDataFrame（pd.ArrowDtype列）に変換する。
+    長い要約などの文字列列がPythonオブジェクトへコピーされないため、メモリと変換時間を節約できる。
+    """
+    return data.to_pandas(types_mapper=pd.ArrowDtype)
+
+def execute_query_arrow(sql: str, params: list, credentials_info: dict = None, maximum_bytes_billed: int = None,
+                        use_cache: bool = True) -> Tuple[pa.Table, dict]:
+    """
+    クエリをBigQueryで実行し、結果をBigQuery Storage Read API経由でArrowのTableとして受け取る。
+    use_cache=True の場合、同じSQLとパラメータの結果をディスクキャッシュから返し、実行結果も保存する。
+
+    Args:
+        sql (str): 実行するSQLクエリ。
+        params (list): SQLクエリのパラメータ。
+        credentials_info (dict, optional): GCPサービスアカウントの認証情報。
+                                            Noneの場合、Streamlitのセッション状態から取得を試みる。
+        maximum_bytes_billed (int, optional): 課金バイト数の上限。超える場合、ジョブは実行されずエラーになる。
+        use_cache (bool, optional): 検索結果キャッシュを使うかどうか。
+
+    Returns:
+        tuple[pa.Table, dict]: クエリの実行結果と、ジョブの統計情報。
+
+    Raises:
+        BQClientError: 認証情報の不足、クエリエラー、課金上限超過、その他の実行時エラーが発生した場合。
+    """
+    cache_key = result_cache.make_key(sql, params) if use_cache else None
+    if cache_key:
+        cached = result_cache.get_query_cache().get(cache_key)
+        if cached is not None:
+            return cached, dict(CACHED_RESULT_STATS)
+
+    try:
+        client, bqstorage_client = _get_clients(credentials_info)
+
+        job_config = QueryJobConfig(query_parameters=params, maximum_bytes_billed=maximum_bytes_billed)
+        query_job = client.query(sql, job_config=job_config)
+        results = query_job.result()
+        table = results.to_arrow(bqstorage_client=bqstorage_client)
+        if cache_key:
+            result_cache.get_query_cache().put(cache_key, table)
+        return table, _job_stats(query_job)
+
+    except BQClientError:
+        raise
+    except exceptions.BadRequest as e:
+        _raise_bad_request(e, maximum_bytes_billed)
+    except Exception as e:
+        raise BQClientError(f"BigQueryの実行中に予期せぬエラーが発生しました: {e}") from e
+
+def execute_query(sql: str, params: list, credentials_info: dict = None, maximum_bytes_billed: int = None,
+                  use_cache: bool = True) -> pd.DataFrame:
     """
     クエリをBigQueryで実行する。
     成功した場合はDataFrameを、失敗した場合はBQClientErrorをraiseする。
-    
+    DataFrameの各列はArrowのバッファを参照する (pd.ArrowDtype)。
+    ジョブの統計情報（処理・課金バイト数、スロット時間、キャッシュヒット）は
+    戻り値の `attrs["bq_stats"]` に格納される。
+
     Args:
         sql (str): 実行するSQLクエリ。
         params (list): SQLクエリのパラメータ。
         credentials_info (dict, optional): GCPサービスアカウントの認証情報。
                                             Noneの場合、Streamlitのセッション状態から取得を試みる。
+        maximum_bytes_billed (int, optional): 課金バイト数の上限。超える場合、ジョブは実行されずエラーになる。
+        use_cache (bool, optional): 検索結果キャッシュを使うかどうか。
 
     Returns:
         pd.DataFrame: クエリの実行結果。
 
     Raises:
-        BQClientError: 認証情報の不足、クエリエラー、その他の実行時エラーが発生した場合。
+        BQClientError: 認証情報の不足、クエリエラー、課金上限超過、その他の実行時エラーが発生した場合。
+    """
+    table, stats = execute_query_arrow(sql, params, credentials_info, maximum_bytes_billed, use_cache)
+    df = arrow_to_frame(table)
+    df.attrs["bq_stats"] = stats
+    return df
+
+def _prefetch(pages: Iterator, max_queue_size: int = PREFETCH_PAGES) -> Iterator:
     """
-    # 認証情報が引数で渡されなかった場合、Streamlitのセッション状態から取得を試みる
-    if credentials_info is None:
+    別スレッドでページを先読みするイテレータ。
+    呼び出し側が現在のページを処理している間に、次のページのダウンロードを進める。
+    """
+    buffer = queue.Queue(maxsize=max_queue_size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
         try:
-            import streamlit as st
-            if not st.session_state.get("gcp_sa_key_configured"):
-                raise BQClientError("GCPの認証情報が設定されていません。")
-            credentials_info = st.session_state.get("gcp_sa_credentials")
-        except ImportError:
-            raise BQClientError("Streamlit環境外で実行する場合、credentials_info引数に認証情報を渡す必要があります。")
+            for page in pages:
+                if not put(("page", page)):
+                    return
+        except Exception as e:
+            put(("error", e))
+            return
+        put(("end", None))
+
+    threading.Thread(target=producer, daemon=True).start()
+    try:
+        while True:
+            kind, item = buffer.get()
+            if kind == "end":
+                return
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        # 途中で読み捨てられた場合も、先読みスレッドを止める
+        stop.set()
+
+def iter_query_pages(sql: str, params: list, credentials_info: dict = None, maximum_bytes_billed: int = None,
+                     page_size: int = DEFAULT_PAGE_SIZE, use_cache: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    クエリをBigQueryで実行し、結果をページ（Arrowのレコードバッチ）単位のDataFrameとして逐次返す。
+    全行のダウンロードを待たずに、最初のページから後続処理（Embedding・ランキング）を始められる。
+    各ページの `attrs["bq_stats"]` には、execute_query と同じジョブの統計情報が格納される。
+    結果キャッシュにヒットした場合は、キャッシュ済みの結果を1ページとして返す。
+
+    Args:
+        sql (str): 実行するSQLクエリ。
+        params (list): SQLクエリのパラメータ。
+        credentials_info (dict, optional): GCPサービスアカウントの認証情報。
+                                            Noneの場合、Streamlitのセッション状態から取得を試みる。
+        maximum_bytes_billed (int, optional): 課金バイト数の上限。
+        page_size (int, optional): 1ページあたりの行数。
+        use_cache (bool, optional): 検索結果キャッシュを使うかどうか。
+
+    Yields:
+        pd.DataFrame: 1ページ分のクエリ結果。
+
+    Raises:
+        BQClientError: 認証情報の不足、クエリエラー、課金上限超過、その他の実行時エラーが発生した場合。
+    """
+    cache_key = result_cache.make_key(sql, params) if use_cache else None
+    if cache_key:
+        cached_df = read_cached_result(sql, params)
+        if cached_df is not None:
+            yield cached_df
+            return
 
     try:
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-        client = bigquery.Client(credentials=credentials, project=credentials.project_id)
-        
-        job_config = QueryJobConfig(query_parameters=params)
+        client, bqstorage_client = _get_clients(credentials_info)
+
+        job_config = QueryJobConfig(query_parameters=params, maximum_bytes_billed=maximum_bytes_billed)
         query_job = client.query(sql, job_config=job_config)
-        results = query_job.result()
-        return results.to_dataframe()
+        rows = query_job.result(page_size=page_size)
+        stats = _job_stats(query_job)
 
+        batches = []
+        for batch in _prefetch(rows.to_arrow_iterable(bqstorage_client=bqstorage_client)):
+            batches.append(batch)
+            page_df = arrow_to_frame(batch)
+            page_df.attrs["bq_stats"] = stats
+            yield page_df
+
+        # 全ページを受け取り終えた場合のみ、結果をキャッシュに保存する
+        if cache_key:
+            result_cache.get_query_cache().put(cache_key, pa.Table.from_batches(batches) if batches else pa.table({}))
+        if not batches:
+            # 0件でも課金は発生するため、統計情報を持つ空のページを返す
+            empty_df = pd.DataFrame()
+            empty_df.attrs["bq_stats"] = stats
+            yield empty_df
+
+    except BQClientError:
+        raise
     except exceptions.BadRequest as e:
-        error_details = "\n".join([err['message'] for err in e.errors])
-        raise BQClientError(f"BigQueryのクエリエラーが発生しました。SQLの構文を確認してください。\n--- Details---\n{error_details}") from e
+        _raise_bad_request(e, maximum_bytes_billed)
     except Exception as e:
         raise BQClientError(f"BigQueryの実行中に予期せぬエラーが発生しました: {e}") from e
-
@@ -0,0 +1,56 @@
+"""
+Embeddingベクトルのディスクキャッシュ。
+(モデル名, テキストのハッシュ) をキーに、float32のベクトルを保存する。
+"""
+import hashlib
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from .disk_cache import CACHE_DIR, DiskCache
+
+EMBEDDING_CACHE_PATH = CACHE_DIR / "embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_BYTES = 1024 ** 3  # 1GB (text-embedding-3-smallで約17万件)
+
+class EmbeddingCache:
+    """テキストのEmbeddingを、内容のハッシュで引けるように保存するキャッシュ"""
+
+    def __init__(self, cache: DiskCache):
+        self._cache = cache
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """テキストごとのベクトルを返す。キャッシュにないものはNone。"""
+        keys = [self.make_key(model, t) for t in texts]
+        found = self._cache.get_many(keys)
+        return [np.frombuffer(found[k], dtype=np.float32) if k in found else None for k in keys]
+
+    def put_many(self, model: str, texts: List[str], vectors: List) -> None:
+        self._cache.put_many({
+            self.make_key(model, t): np.asarray(v, dtype=np.float32).tobytes()
+            for t, v in zip(texts, vectors)
+        })
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """プロセス内で共有するEmbeddingキャッシュを返す"""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(DiskCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES))
+        return _embedding_cache
@@ -0,0 +1,94 @@
+"""
+Embedding APIへのリクエストを、トークン数に応じたバッチに分割して並列に実行するモジュール。
+失敗したバッチのみを指数バックオフで再試行し、結果は入力と同じ順序で返す。
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import openai
+from openai import OpenAI
+
+# OpenAIのEmbedding APIの制限 (1リクエストあたり300,000トークン・2,048件) に余裕を持たせた値
+MAX_TOKENS_PER_BATCH = 100_000
+MAX_INPUTS_PER_BATCH = 2048
+DEFAULT_MAX_WORKERS = 4
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を概算する。
+    英数字はおよそ3〜4文字で1トークン、日本語などの非ASCII文字は1文字1トークン前後になるため、
+    多めに見積もる。
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 3 + (len(text) - ascii_chars) + 1
+
+def split_batches(texts: List[str], max_tokens: int = MAX_TOKENS_PER_BATCH,
+                  max_inputs: int = MAX_INPUTS_PER_BATCH) -> List[List[int]]:
+    """テキストのインデックスを、トークン数と件数の上限を超えないバッチに分割する"""
+    batches = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _embed_batch(client: OpenAI, texts: List[str], model: str) -> List[np.ndarray]:
+    """1バッチ分のEmbeddingを取得する。一時的なエラーは指数バックオフで再試行する。"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = client.embeddings.create(input=texts, model=model)
+            data = sorted(response.data, key=lambda e: e.index)
+            return [np.asarray(e.embedding, dtype=np.float32) for e in data]
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(BACKOFF_BASE_SECONDS * (2 ** attempt) * (1 + random.random()))
+
+def embed_texts(client: OpenAI, texts: List[str], model: str,
+                max_workers: int = DEFAULT_MAX_WORKERS) -> List[np.ndarray]:
+    """
+    テキストのEmbeddingを、バッチに分割して並列に取得する。
+
+    :param client: OpenAIクライアント
+    :param texts: Embeddingを取得するテキスト
+    :param model: Embeddingモデル名
+    :param max_workers: 同時に送信するリクエスト数の上限
+    :return: 入力と同じ順序のベクトルのリスト
+    """
+    batches = split_batches(texts)
+    results = [None] * len(texts)
+    if not batches:
+        return results
+    if len(batches) == 1:
+        # 1バッチで済む場合はスレッドを使わない
+        for i, vector in zip(batches[0], _embed_batch(client, texts, model)):
+            results[i] = vector
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        futures = [
+            (batch, pool.submit(_embed_batch, client, [texts[i] for i in batch], model))
+            for batch in batches
+        ]
+        for batch, future in futures:
+            for i, vector in zip(batch, future.result()):
+                results[i] = vector
+    return results
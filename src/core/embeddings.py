@@ -0,0 +1,63 @@
+"""
+文献・調査テーマのEmbeddingを取得するモジュール（Streamlitに依存しない）。
+アプリ（core.agent）とバッチ検索エンジン（core.batch）で共有する。
+
+ディスクキャッシュ（core.embedding_cache）にないテキストだけを、core.embedding_executor でEmbedding APIに問い合わせる。
+"""
+from typing import Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import embedding_cache, embedding_executor, openai_client, tracing
+
+DEFAULT_MODEL = "text-embedding-3-small"
+
+# 類似度を計算するセクション (AppState.similarity_weights のキーと表示名)
+SIMILARITY_SECTIONS = {
+    "title": "タイトル",
+    "abstract": "要約",
+}
+
+def get_embeddings(texts: list, model: str = DEFAULT_MODEL, api_key: str = None) -> list:
+    """
+    テキストのEmbeddingをfloat32のベクトルとして返す。
+    ディスクキャッシュにないテキストのみを、トークン数に応じたバッチに分けて
+    OpenAIのEmbedding APIへ並列に問い合わせる。
+    api_key を省略した場合は環境変数 OPENAI_API_KEY のキーを用いる。
+    """
+    return get_embeddings_with_stats(texts, model, api_key)[0]
+
+def get_embeddings_with_stats(texts: list, model: str = DEFAULT_MODEL, api_key: str = None) -> Tuple[list, int, int]:
+    """
+    get_embeddings と同じEmbeddingに、この呼び出しでのキャッシュのヒット数・ミス数を添えて (ベクトル, ヒット数, ミス数) を返す。
+    キャッシュの累計値の差分と違い、同時に実行中の他の検索の影響を受けない。
+    """
+    with tracing.span("get_embeddings", model=model, texts=len(texts)) as span:
+        cache = embedding_cache.get_embedding_cache()
+        vectors = cache.get_many(model, texts)
+        misses = sum(v is None for v in vectors)
+
+        missing_texts = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        span.set_attributes(
+            cache_hits=len(texts) - misses,
+            requested=len(missing_texts),
+            estimated_tokens=sum(embedding_executor.estimate_tokens(t) for t in missing_texts),
+        )
+        if missing_texts:
+            client = openai_client.get_client(api_key)
+            fetched = dict(zip(missing_texts, embedding_executor.embed_texts(client, missing_texts, model)))
+            cache.put_many(model, missing_texts, list(fetched.values()))
+            vectors = [fetched[t] if v is None else v for t, v in zip(texts, vectors)]
+        return vectors, len(texts) - misses, misses
+
+def build_section_texts(df: pd.DataFrame) -> dict:
+    """
+    類似度をセクションごとに計算するための、{セクション名: テキストのリスト}。
+    欠けているセクションは空文字列になる（pipeline.flatten_sections により、Embeddingには送られない）。
+    """
+    return {
+        section: pc.fill_null(pa.array(df[section], type=pa.string()), '').to_pylist()
+        for section in SIMILARITY_SECTIONS
+    }
@@ -0,0 +1,127 @@
+"""
+複数の検索条件を1回のスキャンで評価するファンアウト検索。
+
+キーワード拡張・IPC緩和などの比較のために、検索条件ごとにクエリを実行すると公開特許テーブルをN回スキャンすることになる。
+ここでは全ての検索条件を1つのクエリにまとめ、各行がどの条件に一致したかを条件ごとの真偽値の列（一致フラグ）として返す。
+条件ごとの件数上限（LIMIT）は、一致した行に条件ごとに振った ROW_NUMBER で適用する。
+結果はクライアント側で条件ごとに分割し、公開番号で重複を除く。
+
+    results = fanout.run_fanout({"base": base_conditions, "relaxed": relaxed_conditions})
+    results["relaxed"]  # 緩和した条件に一致した特許のDataFrame
+
+バッチ検索エンジン（core.batch）は、BigQueryで検索するジョブをこのモジュールでまとめて実行する。
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import textwrap
+
+import pandas as pd
+from google.cloud.bigquery import ScalarQueryParameter
+
+from . import bq_client, mirror
+from .state import SearchConditions
+from .strategies.default import SubjectPredicateStrategy
+
+RESULT_COLUMNS = ["publication_number", "title", "abstract", "assignee", "publication_date", "ipc_codes"]
+
+@dataclass
+class FanoutQuery:
+    """まとめたクエリと、検索条件の名前から一致フラグの列名への対応"""
+    sql: str
+    params: list
+    flags: Dict[str, str]
+
+def compile_fanout(conditions_by_name: Dict[str, SearchConditions], dialect: str = "bigquery",
+                   search_table: str = None) -> FanoutQuery:
+    """
+    複数の検索条件を、1回のスキャンで評価するクエリにまとめる。
+    一致フラグの列名は条件の順に m_0, m_1, ... となる（名前はBigQueryの列名に使えるとは限らないため）。
+    キーワード・IPCの条件がない検索条件は、国・公開日の条件のみで評価する。
+    """
+    if not conditions_by_name:
+        raise ValueError("検索条件を1つ以上指定してください。")
+    strategy = SubjectPredicateStrategy(dialect=dialect, search_table=search_table)
+    flags, flag_exprs, rank_exprs, limit_exprs, query_params = {}, [], [], [], []
+    for i, (name, conditions) in enumerate(conditions_by_name.items()):
+        flag, rank, limit = f"m_{i}", f"rn_{i}", f"f{i}_limit"
+        where_clauses, params = strategy.build_conditions(conditions, param_prefix=f"f{i}_")
+        flags[name] = flag
+        flag_exprs.append(f"({' AND '.join(where_clauses) if where_clauses else 'TRUE'}) AS {flag}")
+        rank_exprs.append(f"ROW_NUMBER() OVER (PARTITION BY {flag} ORDER BY publication_number) AS {rank}")
+        limit_exprs.append(f"({flag} AND {rank} <= {strategy._param(limit)})")
+        query_params.extend(params)
+        query_params.append(ScalarQueryParameter(limit, "INT64", conditions.limit))
+
+    columns = ", ".join(RESULT_COLUMNS)
+    # 最終的な一致フラグは、その条件の件数上限内に入った行だけを真とする
+    final_flags = ", ".join(f"{expr} AS {flag}" for expr, flag in zip(limit_exprs, flags.values()))
+    sql = f"""{strategy._patent_data_cte()},
+        Tagged AS (
+            SELECT
+                {', '.join(f'p.{c}' for c in RESULT_COLUMNS)},
+                {(',' + chr(10) + '                ').join(flag_exprs)}
+            FROM
+                PatentData p
+        ),
+        Ranked AS (
+            SELECT
+                *,
+                {(',' + chr(10) + '                ').join(rank_exprs)}
+            FROM
+                Tagged
+            WHERE
+                {' OR '.join(flags.values())}
+        )
+        SELECT
+            {columns},
+            {final_flags}
+        FROM
+            Ranked
+        WHERE
+            {' OR '.join(limit_exprs)}
+        """
+    return FanoutQuery(textwrap.dedent(sql.strip()), query_params, flags)
+
+def split_results(df: pd.DataFrame, flags: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+    """まとめたクエリの結果を、一致フラグごとのDataFrameに分割する（公開番号の重複は除く）"""
+    stats = df.attrs.get("bq_stats")
+    results = {}
+    for name, flag in flags.items():
+        if df.empty:
+            part = pd.DataFrame(columns=RESULT_COLUMNS)
+        else:
+            part = (df.loc[df[flag].fillna(False).astype(bool), RESULT_COLUMNS]
+                    .drop_duplicates(subset="publication_number")
+                    .reset_index(drop=True))
+        if stats is not None:
+            part.attrs["bq_stats"] = stats
+        results[name] = part
+    return results
+
+def find_shared_mirror(conditions_list: List[SearchConditions]) -> Optional[mirror.LocalMirror]:
+    """全ての検索条件を満たせるミラーのうち、最も小さいものを返す。該当がなければNone。"""
+    candidates = [m for m in mirror.list_mirrors() if all(m.covers(c) for c in conditions_list)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda m: m.manifest.row_count)
+
+def run_fanout(conditions_by_name: Dict[str, SearchConditions], credentials_info: dict = None,
+               search_table: str = None, maximum_bytes_billed: int = None,
+               use_mirror: bool = True) -> Dict[str, pd.DataFrame]:
+    """
+    複数の検索条件を1回のクエリで実行し、検索条件の名前ごとの結果を返す。
+    全ての条件を満たせるローカルミラーがあればDuckDBで、なければBigQueryで実行する。
+    BigQueryで実行した場合、各結果の attrs["bq_stats"] には共通の1ジョブの統計情報が入る。
+
+    Raises:
+        BQClientError: クエリの実行に失敗した場合。
+    """
+    local_mirror = find_shared_mirror(list(conditions_by_name.values())) if use_mirror else None
+    if local_mirror:
+        query = compile_fanout(conditions_by_name, dialect="duckdb")
+        df = local_mirror.execute_query(query.sql, query.params)
+    else:
+        query = compile_fanout(conditions_by_name, search_table=search_table)
+        df = bq_client.execute_query(query.sql, query.params, credentials_info=credentials_info,
+                                     maximum_bytes_billed=maximum_bytes_billed)
+    return split_results(df, query.flags)
@@ -0,0 +1,75 @@
+"""
+ローカルミラーのIPC分類に対するプレフィックス索引。
+
+全文献のIPCコードを (コード, 文献番号) の組にして、コードの辞書順に並べた固定長の配列として保存する。
+辞書順に並んでいるため、あるプレフィックスで始まるコードは連続した範囲になり、
+その範囲は二分探索で求まる（例: G05B は G05B13/02 や G05B19/418 を含む範囲、G05B13/02 はその一部の範囲）。
+配列はメモリマップで読み込む。
+"""
+from pathlib import Path
+from typing import Iterable, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+CODES_FILE = "ipc_codes.bin"
+DOCS_FILE = "ipc_docs.i32"
+
+CODE_WIDTH = 24  # IPCコードを保存する固定長のバイト数
+
+def build_ipc_index(ipc_column: pa.ChunkedArray, path: Path) -> "IpcIndex":
+    """
+    文献ごとのIPCコードのリスト列から索引を作成して保存する。文献番号は行番号になる。
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    ipc_column = ipc_column.combine_chunks() if isinstance(ipc_column, pa.ChunkedArray) else ipc_column
+    codes = pc.list_flatten(ipc_column)
+    docs = pc.list_parent_indices(ipc_column)
+    valid = pc.is_valid(codes)
+    codes = np.array(pc.filter(codes, valid).to_pylist(), dtype=f"S{CODE_WIDTH}")
+    docs = pc.filter(docs, valid).to_numpy().astype(np.int32)
+
+    order = np.lexsort((docs, codes))
+    codes[order].tofile(path / CODES_FILE)
+    docs[order].tofile(path / DOCS_FILE)
+    return IpcIndex(path)
+
+def _prefix_bounds(prefix: str) -> Tuple[bytes, bytes]:
+    """prefix で始まるコードの範囲 [lower, upper) を返す"""
+    lower = prefix.encode("ascii")
+    upper = lower[:-1] + bytes([lower[-1] + 1])
+    return lower, upper
+
+class IpcIndex:
+    """保存済みのIPCプレフィックス索引"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        size = (self.path / DOCS_FILE).stat().st_size // 4
+        if size:
+            self.codes = np.memmap(self.path / CODES_FILE, dtype=f"S{CODE_WIDTH}", mode='r', shape=(size,))
+            self.docs = np.memmap(self.path / DOCS_FILE, dtype=np.int32, mode='r', shape=(size,))
+        else:
+            self.codes = np.empty(0, dtype=f"S{CODE_WIDTH}")
+            self.docs = np.empty(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """prefix で始まるコードが並ぶ範囲 [start, end) を二分探索で求める"""
+        if not prefix:
+            return 0, len(self.codes)
+        if not prefix.isascii():
+            return 0, 0
+        lower, upper = _prefix_bounds(prefix)
+        return (int(np.searchsorted(self.codes, lower, side="left")),
+                int(np.searchsorted(self.codes, upper, side="left")))
+
+    def prefix_docs(self, prefixes: Iterable[str]) -> np.ndarray:
+        """いずれかのプレフィックスで始まるIPCを持つ文献番号を、重複なく昇順で返す"""
+        ranges = [self.prefix_range(p) for p in dict.fromkeys(prefixes)]
+        parts = [self.docs[start:end] for start, end in ranges if end > start]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
@@ -0,0 +1,63 @@
+"""
+LLM応答のディスクキャッシュ。
+(モデル名, プロンプト, 応答形式) のハッシュをキーに、応答テキストと、その応答の生成にかかった時間を保存する。
+同じテーマの再選択やセッションの再読み込みで同じプロンプトを送る場合に、APIの往復を省く。
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Optional
+
+from .disk_cache import CACHE_DIR, DiskCache
+
+LLM_CACHE_PATH = CACHE_DIR / "llm_responses.sqlite3"
+LLM_CACHE_MAX_BYTES = 64 * 1024 ** 2          # 64MB
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60       # 7日
+
+# キーの計算方法を変更した場合は、この値を更新して古いキャッシュを無効にする
+KEY_VERSION = 1
+
+class LLMResponseCache:
+    """LLMの応答を、リクエストの内容で引けるように保存するキャッシュ"""
+
+    def __init__(self, cache: DiskCache):
+        self._cache = cache
+
+    @staticmethod
+    def make_key(model: str, prompt: str, response_format: dict) -> str:
+        payload = json.dumps([KEY_VERSION, model, prompt, response_format], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str, response_format: dict) -> Optional[dict]:
+        """
+        キャッシュ済みの応答を {"response": 応答テキスト, "latency": 生成にかかった秒数} として返す。
+        キャッシュにない（または期限切れの）場合はNone。
+        """
+        value = self._cache.get(self.make_key(model, prompt, response_format))
+        if value is None:
+            return None
+        return json.loads(value.decode("utf-8"))
+
+    def put(self, model: str, prompt: str, response_format: dict, response: str, latency: float) -> None:
+        entry = {"response": response, "latency": latency, "created_at": time.time()}
+        self._cache.put(self.make_key(model, prompt, response_format), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """プロセス内で共有するLLM応答キャッシュを返す"""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache(DiskCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_SECONDS))
+        return _llm_cache
@@ -0,0 +1,220 @@
+"""
+公開特許データの一部をローカルのParquetファイルへ複製し、DuckDBで検索するためのモジュール。
+
+よく調査する技術分野（IPCプレフィックス・国・期間）をあらかじめミラーしておくと、
+その範囲に収まる検索はBigQueryを使わずにローカルで実行できる（課金バイト数0）。
+ミラーの作成時には全文検索用の転置インデックス（core.text_index）も作成し、キーワード検索はこれで評価する。
+
+ミラーの作成:
+    cd src
+    python -m core.mirror --name membranes --credentials path/to/sa.json \
+        --ipc B01D --countries US JP --start 2015-01-01 --end 2024-12-31
+"""
+import argparse
+import json
+import threading
+from dataclasses import dataclass, asdict, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud.bigquery import ArrayQueryParameter
+
+from . import bq_client
+from .state import SearchConditions
+from .text_index import TEXT_INDEX_DIR, TextIndex, build_text_index
+from .strategies.default import MIRROR_VIEW, flat_projection_sql, slice_filter_sql
+
+MIRROR_ROOT = Path(__file__).resolve().parents[2] / "outputs" / "mirror"
+DATA_FILE = "patents.parquet"
+MANIFEST_FILE = "manifest.json"
+
+@dataclass
+class MirrorManifest:
+    """ミラーに含まれるデータの範囲を記録するメタデータ"""
+    name: str
+    ipc_prefixes: List[str] = field(default_factory=list)
+    countries: List[str] = field(default_factory=list)
+    start_date: Optional[int] = None  # YYYYMMDD
+    end_date: Optional[int] = None    # YYYYMMDD
+    row_count: int = 0
+    created_at: str = ""
+
+def _to_yyyymmdd(d: Optional[date]) -> Optional[int]:
+    return int(d.strftime("%Y%m%d")) if d else None
+
+def _params_to_duckdb(params: list) -> dict:
+    """BigQueryのクエリパラメータを、DuckDBの名前付きパラメータへ変換する"""
+    converted = {}
+    for p in params:
+        if isinstance(p, ArrayQueryParameter):
+            converted[p.name] = list(p.values)
+        else:
+            converted[p.name] = p.value
+    return converted
+
+class LocalMirror:
+    """ローカルに複製した特許データ。SubjectPredicateStrategy(dialect="duckdb") のSQLを実行できる。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            self.manifest = MirrorManifest(**json.load(f))
+        self._connection = None
+        self._text_index = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.manifest.name
+
+    def _get_connection(self) -> duckdb.DuckDBPyConnection:
+        with self._lock:
+            if self._connection is None:
+                con = duckdb.connect()
+                data_path = str(self.path / DATA_FILE).replace("'", "''")
+                con.execute(f"CREATE VIEW {MIRROR_VIEW} AS SELECT * FROM read_parquet('{data_path}')")
+                self._connection = con
+            return self._connection
+
+    def covers(self, conditions: SearchConditions) -> bool:
+        """
+        検索条件に一致する特許が、すべてこのミラーに含まれるかを判定する。
+        ミラー外に該当特許が存在しうる場合はFalseを返す。
+        """
+        m = self.manifest
+        if m.countries and not (conditions.countries and set(conditions.countries) <= set(m.countries)):
+            return False
+
+        # 期間条件は開始日・終了日がそろっている場合のみSQLに反映される
+        has_dates = bool(conditions.start_date and conditions.end_date)
+        if m.start_date and not (has_dates and _to_yyyymmdd(conditions.start_date) >= m.start_date):
+            return False
+        if m.end_date and not (has_dates and _to_yyyymmdd(conditions.end_date) <= m.end_date):
+            return False
+
+        if m.ipc_prefixes:
+            def all_covered(codes: List[str]) -> bool:
+                return bool(codes) and all(any(code.startswith(prefix) for prefix in m.ipc_prefixes) for code in codes)
+            # 主語IPCはANDで必須、述語はキーワードがなければIPCのみで必須となる
+            subject_covered = all_covered(conditions.subject_ipc)
+            predicate_covered = not conditions.predicate_keywords and all_covered(conditions.predicate_ipc)
+            if not (subject_covered or predicate_covered):
+                return False
+        return True
+
+    @property
+    def text_index(self) -> Optional[TextIndex]:
+        """全文検索用の転置インデックス。作成されていなければNone。"""
+        with self._lock:
+            if self._text_index is None and (self.path / TEXT_INDEX_DIR).exists():
+                self._text_index = TextIndex(self.path / TEXT_INDEX_DIR)
+            return self._text_index
+
+    def build_text_index(self) -> TextIndex:
+        """ミラーのデータから全文検索用の転置インデックスを作成する"""
+        index = build_text_index(pq.read_table(self.path / DATA_FILE), self.path / TEXT_INDEX_DIR)
+        with self._lock:
+            self._text_index = index
+        return index
+
+    def keyword_search(self, conditions: SearchConditions) -> Optional[pd.DataFrame]:
+        """
+        転置インデックスで検索条件を評価する。SubjectPredicateStrategy(dialect="duckdb") のSQLと同じ結果になる。
+        インデックスがない場合や、インデックスで評価できないキーワードを含む場合はNone。
+        """
+        index = self.text_index
+        return index.search(conditions) if index else None
+
+    def execute_query(self, sql: str, params: list) -> pd.DataFrame:
+        """
+        DuckDB方言のSQLをミラーに対して実行する。
+        エラー時はBigQuery実行時と同様にBQClientErrorをraiseする。
+        """
+        try:
+            cursor = self._get_connection().cursor()
+            try:
+                return bq_client.arrow_to_frame(pa.table(cursor.execute(sql, _params_to_duckdb(params)).arrow()))
+            finally:
+                cursor.close()
+        except duckdb.Error as e:
+            raise bq_client.BQClientError(f"ローカルミラーでのクエリ実行中にエラーが発生しました: {e}") from e
+
+def list_mirrors(root: Path = MIRROR_ROOT) -> List[LocalMirror]:
+    """作成済みのミラーを一覧する"""
+    if not root.exists():
+        return []
+    return [LocalMirror(p) for p in sorted(root.iterdir()) if (p / MANIFEST_FILE).exists() and (p / DATA_FILE).exists()]
+
+def find_mirror(conditions: SearchConditions, root: Path = MIRROR_ROOT) -> Optional[LocalMirror]:
+    """検索条件を完全に満たせるミラーのうち、最も小さいものを返す。該当がなければNone。"""
+    candidates = [m for m in list_mirrors(root) if m.covers(conditions)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda m: m.manifest.row_count)
+
+def build_mirror(name: str, credentials_info: dict, ipc_prefixes: List[str] = None, countries: List[str] = None,
+                 start_date: date = None, end_date: date = None, root: Path = MIRROR_ROOT) -> LocalMirror:
+    """
+    指定した範囲の公開特許をBigQueryから取得し、ローカルミラーとして保存する。
+
+    Args:
+        name (str): ミラー名（保存先ディレクトリ名）。
+        credentials_info (dict): GCPサービスアカウントの認証情報。
+        ipc_prefixes (list, optional): 対象とするIPCのプレフィックス。
+        countries (list, optional): 対象とする国コード。
+        start_date (date, optional): 公開日の下限。
+        end_date (date, optional): 公開日の上限。
+
+    Returns:
+        LocalMirror: 作成したミラー。
+    """
+    ipc_prefixes = ipc_prefixes or []
+    countries = countries or []
+    where_sql, params = slice_filter_sql(ipc_prefixes, countries, start_date, end_date)
+
+    table, _ = bq_client.execute_query_arrow(flat_projection_sql(where_sql), params, credentials_info=credentials_info, use_cache=False)
+    # 国・公開日順に並べておくと、Parquetの行グループ単位の統計で絞り込みが効きやすい
+    table = table.sort_by([("country", "ascending"), ("publication_date", "ascending")])
+
+    path = root / name
+    path.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path / DATA_FILE)
+    manifest = MirrorManifest(
+        name=name,
+        ipc_prefixes=ipc_prefixes,
+        countries=countries,
+        start_date=_to_yyyymmdd(start_date),
+        end_date=_to_yyyymmdd(end_date),
+        row_count=table.num_rows,
+        created_at=datetime.now().isoformat(timespec="seconds"),
+    )
+    with open(path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(asdict(manifest), f, ensure_ascii=False, indent=2)
+    local_mirror = LocalMirror(path)
+    local_mirror.build_text_index()
+    return local_mirror
+
+def main():
+    parser = argparse.ArgumentParser(description="公開特許データのローカルミラーを作成する")
+    parser.add_argument("--name", required=True, help="ミラー名")
+    parser.add_argument("--credentials", required=True, help="GCPサービスアカウントのJSONキーファイル")
+    parser.add_argument("--ipc", nargs="*", default=[], help="IPCプレフィックス (例: B01D H01L)")
+    parser.add_argument("--countries", nargs="*", default=[], help="国コード (例: US JP)")
+    parser.add_argument("--start", type=date.fromisoformat, help="公開日の下限 (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="公開日の上限 (YYYY-MM-DD)")
+    parser.add_argument("--root", type=Path, default=MIRROR_ROOT, help="ミラーの保存先")
+    args = parser.parse_args()
+
+    with open(args.credentials, 'r', encoding='utf-8') as f:
+        credentials_info = json.load(f)
+
+    mirror = build_mirror(args.name, credentials_info, args.ipc, args.countries, args.start, args.end, root=args.root)
+    print(f"ミラー「{mirror.name}」を作成しました: {mirror.manifest.row_count}件 ({mirror.path})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+OpenAIクライアントを、APIキーごとに1つだけ作成して共有するモジュール。
+クライアントは内部にHTTPの接続プールを持つため、呼び出しのたびに作り直さずに使い回すことで、
+TLSのハンドシェイクとKeep-Aliveの接続を再利用できる。クライアントは複数スレッドから共有できる。
+"""
+import atexit
+import hashlib
+import os
+import threading
+
+from openai import OpenAI
+
+_client_registry: dict = {}
+_registry_lock = threading.Lock()
+
+def _key_fingerprint(api_key: str) -> str:
+    """APIキーそのものをレジストリに残さないよう、ハッシュで識別する"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def get_client(api_key: str = None) -> OpenAI:
+    """
+    APIキーに対応する共有クライアントを返す。なければ作成する。
+    api_key がNoneの場合は、OpenAIのSDKと同じく環境変数 OPENAI_API_KEY のキーを用いる。
+    どちらもなければ、SDKの例外 (openai.OpenAIError) をそのまま送出する。
+    """
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        return OpenAI(api_key=api_key)  # キーがないことを示すSDKの例外を送出する
+    fingerprint = _key_fingerprint(api_key)
+    with _registry_lock:
+        client = _client_registry.get(fingerprint)
+        if client is None:
+            client = OpenAI(api_key=api_key)
+            _client_registry[fingerprint] = client
+        return client
+
+def close_all_clients() -> None:
+    """全ての共有クライアントの接続を閉じる"""
+    with _registry_lock:
+        for client in _client_registry.values():
+            client.close()
+        _client_registry.clear()
+
+atexit.register(close_all_clients)
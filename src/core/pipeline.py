@@ -0,0 +1,230 @@
+"""
+検索結果の取得・Embedding・ランキングを重ねて実行する非同期パイプライン。
+
+調査テーマのEmbeddingはクエリの実行と同時に始め、文献のEmbeddingはページが届くたびに始める。
+BigQuery・DuckDB・OpenAIのクライアントはブロッキングAPIのため、asyncio.to_thread でワーカースレッドに渡し、
+イベントループ（呼び出し元のスレッド）ではランキングと進捗の通知だけを行う。
+ワーカースレッドからは st.session_state を参照できないため、APIキーや認証情報は呼び出し側で束縛しておくこと。
+
+各ステージの所要時間を記録し、クリティカルパスが「結果の取得 + 最後のページのEmbedding」になっているかを確認できる。
+各ステージの呼び出しは core.tracing のスパンとしても記録する。
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from . import ranking, tracing
+
+DEFAULT_EMBED_CONCURRENCY = 2  # 同時にEmbeddingを取得するページ数
+
+STAGE_LABELS = {
+    "plan_embedding": "調査テーマのEmbedding",
+    "fetch": "検索結果の取得",
+    "embed": "文献のEmbedding",
+    "rank": "ランキング",
+}
+
+@dataclass
+class StageTiming:
+    """1つのステージの実行回数・合計時間・パイプライン開始からの開始/終了時刻（秒）"""
+    calls: int = 0
+    busy: float = 0.0
+    start: Optional[float] = None
+    end: float = 0.0
+    last: float = 0.0  # 最後に終了した呼び出しの所要時間
+
+class StageTimer:
+    """ステージごとの所要時間を、パイプライン開始時刻からの相対時刻で記録する"""
+
+    def __init__(self, origin: float = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.stages: Dict[str, StageTiming] = {}
+
+    def _record(self, stage: str, started: float, finished: float) -> None:
+        timing = self.stages.setdefault(stage, StageTiming())
+        timing.calls += 1
+        timing.busy += finished - started
+        timing.start = started - self.origin if timing.start is None else min(timing.start, started - self.origin)
+        if finished - self.origin >= timing.end:
+            timing.end = finished - self.origin
+            timing.last = finished - started
+
+    @contextmanager
+    def measure(self, stage: str, **attributes):
+        started = time.perf_counter()
+        try:
+            with tracing.span(stage, **attributes):
+                yield
+        finally:
+            self._record(stage, started, time.perf_counter())
+
+    async def in_thread(self, stage: str, func: Callable, *args, attributes: dict = None):
+        """func をワーカースレッドで実行し、その時間を stage として記録する"""
+        started = time.perf_counter()
+        try:
+            # to_thread はコンテキストを引き継ぐため、func 内のスパンはこのスパンの子になる
+            with tracing.span(stage, **(attributes or {})):
+                return await asyncio.to_thread(func, *args)
+        finally:
+            self._record(stage, started, time.perf_counter())
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.origin
+
+def flatten_sections(sections: Dict[str, List[str]]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    {セクション名: テキストのリスト} を、Embeddingに送る空でないテキストのリストと、セクションごとのテキストの有無に分ける。
+    EmbeddingのAPIは空文字列を受け付けないため、タイトルや要約が欠けている文献のそのセクションは送らない。
+    """
+    present = {name: np.array([bool(t and t.strip()) for t in texts], dtype=bool) for name, texts in sections.items()}
+    flat = [t for name, texts in sections.items() for t, p in zip(texts, present[name]) if p]
+    return flat, present
+
+def split_section_vectors(vectors, present: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """flatten_sections の順に並んだEmbeddingを、セクションごとの正規化済み行列（テキストのない行はゼロベクトル）に戻す"""
+    flat = ranking.normalize_rows(vectors) if len(vectors) else np.empty((0, 0), dtype=np.float32)
+    matrices, start = {}, 0
+    for name, mask in present.items():
+        matrix = np.zeros((len(mask), flat.shape[1]), dtype=np.float32)
+        count = int(mask.sum())
+        matrix[mask] = flat[start:start + count]
+        matrices[name] = matrix
+        start += count
+    return matrices
+
+def _next_page(page_iter: Iterator[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    page_df = next(page_iter, None)
+    if page_df is not None:
+        tracing.set_attributes(rows=len(page_df))
+    return page_df
+
+@dataclass
+class PipelineResult:
+    """
+    パイプラインの結果。pages・matrices・scores は同じ順序（Embeddingが終わった順）で並ぶ。
+    pages の各DataFrameには similarity 列（セクション別に計算した場合は sim_<セクション> 列も）が追加されている。
+    """
+    pages: List[pd.DataFrame] = field(default_factory=list)
+    matrices: List[np.ndarray] = field(default_factory=list)
+    scores: List[np.ndarray] = field(default_factory=list)
+    query_vectors: Optional[list] = None
+    bq_stats: Optional[dict] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    stages: Dict[str, StageTiming] = field(default_factory=dict)
+
+    @property
+    def row_count(self) -> int:
+        return sum(len(p) for p in self.pages)
+
+    def stage_table(self) -> pd.DataFrame:
+        """ステージごとの所要時間の表"""
+        return pd.DataFrame([
+            {
+                "ステージ": STAGE_LABELS.get(name, name),
+                "回数": t.calls,
+                "開始 (秒)": round(t.start or 0.0, 2),
+                "終了 (秒)": round(t.end, 2),
+                "合計時間 (秒)": round(t.busy, 2),
+            }
+            for name, t in self.stages.items()
+        ])
+
+async def run_pipeline(pages: Iterator[pd.DataFrame], plan_text: str, embed: Callable[[List[str]], list],
+                       texts_for: Callable[[pd.DataFrame], Union[List[str], Dict[str, List[str]]]],
+                       query_vectors: list = None, weights: Dict[str, float] = None,
+                       on_page: Callable[[PipelineResult], None] = None,
+                       on_stats: Callable[[dict], None] = None,
+                       max_concurrent_embeddings: int = DEFAULT_EMBED_CONCURRENCY,
+                       started_at: float = None) -> PipelineResult:
+    """
+    ページのイテレータを取得しながら、各ページのEmbeddingとランキングを並行して進める。
+
+    :param pages: 検索結果のページ（bq_client.iter_query_pages など）。ワーカースレッドで進める
+    :param plan_text: 調査テーマ
+    :param embed: テキストのリストからEmbeddingのリストを返す関数（ワーカースレッドで呼ばれる）
+    :param texts_for: ページからEmbedding用のテキストを作る関数。{セクション名: テキストのリスト} を返す場合は、
+        セクションごとの類似度を sim_<セクション名> 列に保存し、weights による重み付き和を similarity とする。
+        文書ベクトル (matrices) は各セクションの正規化済みベクトルの和を正規化したものになる
+    :param query_vectors: 計算済みの調査テーマのEmbedding。Noneならクエリと同時に計算する
+    :param weights: セクションごとの重み（ranking.weighted_scores を参照）
+    :param on_page: ページのランキングが終わるたびに、イベントループのスレッドで呼ばれる
+    :param on_stats: 最初のページで検索の統計情報（bq_stats）を受け取った時点で呼ばれる。後続の処理が失敗しても課金を記録できる
+    :param max_concurrent_embeddings: 同時にEmbeddingを取得するページ数の上限
+    :param started_at: 所要時間の起点（time.perf_counter() の値）。Noneなら呼び出し時点
+    """
+    timer = StageTimer(started_at)
+    result = PipelineResult(query_vectors=query_vectors, stages=timer.stages)
+    plan_task = None
+    if query_vectors is None:
+        plan_task = asyncio.create_task(timer.in_thread("plan_embedding", embed, [plan_text]))
+    semaphore = asyncio.Semaphore(max_concurrent_embeddings)
+
+    async def process(page_df: pd.DataFrame) -> None:
+        texts = texts_for(page_df)
+        sections = texts if isinstance(texts, dict) else None
+        if sections is not None:
+            # 全セクションの空でないテキストを1回の呼び出しでまとめてEmbeddingする
+            texts, present = flatten_sections(sections)
+        async with semaphore:
+            vectors = await timer.in_thread("embed", embed, texts, attributes={"rows": len(page_df)}) if texts else []
+        if result.query_vectors is None:
+            result.query_vectors = await plan_task
+        with timer.measure("rank", rows=len(page_df)):
+            if sections is None:
+                matrix = ranking.normalize_rows(vectors)
+                scores = ranking.cosine_scores(result.query_vectors, matrix)
+            else:
+                scores, section_scores, matrix = ranking.score_sections(
+                    result.query_vectors, split_section_vectors(vectors, present), present, weights or {}
+                )
+                for name, values in section_scores.items():
+                    page_df[ranking.section_column(name)] = values
+            page_df['similarity'] = scores
+        result.pages.append(page_df)
+        result.matrices.append(matrix)
+        result.scores.append(scores)
+        if len(result.pages) == 1:
+            result.timings["first_result"] = timer.elapsed()
+        if on_page:
+            on_page(result)
+
+    page_iter = iter(pages)
+    tasks = []
+    try:
+        while True:
+            page_df = await timer.in_thread("fetch", _next_page, page_iter)
+            if page_df is None:
+                break
+            if result.bq_stats is None and "bq_stats" in page_df.attrs:
+                result.bq_stats = page_df.attrs["bq_stats"]
+                if on_stats:
+                    on_stats(result.bq_stats)
+            if page_df.empty:
+                continue
+            if not tasks:
+                result.timings["query_first_page"] = timer.elapsed()
+            tasks.append(asyncio.create_task(process(page_df)))
+        await asyncio.gather(*tasks)
+        if plan_task and result.query_vectors is None:
+            result.query_vectors = await plan_task
+    finally:
+        for task in tasks + ([plan_task] if plan_task else []):
+            task.cancel()
+
+    result.timings["total"] = timer.elapsed()
+    fetch, embed_timing = timer.stages.get("fetch"), timer.stages.get("embed")
+    if fetch and embed_timing:
+        # クリティカルパスの目安: 取得の完了 + 最後に終わったページのEmbedding
+        result.timings["fetch_end"] = fetch.end
+        result.timings["last_embedding"] = embed_timing.last
+    return result
+
+def run(pages: Iterator[pd.DataFrame], plan_text: str, embed: Callable[[List[str]], list],
+        texts_for: Callable[[pd.DataFrame], Union[List[str], Dict[str, List[str]]]], **kwargs) -> PipelineResult:
+    """run_pipeline を新しいイベントループで実行する（Streamlitのスクリプトスレッドから呼ぶ）"""
+    return asyncio.run(run_pipeline(pages, plan_text, embed, texts_for, **kwargs))
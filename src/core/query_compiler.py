@@ -0,0 +1,252 @@
+"""
+検索条件（SearchConditions）とSQLの間に置く中間表現と、その最適化パス。
+
+主語・述語の条件を「キーワードのOR」「IPCプレフィックスのOR」という述語の並びとして表し、
+次のパスを順に適用してからSQLを生成する。
+  1. dedupe        : 大文字・小文字や前後の空白だけが異なる値を除く
+  2. ipc_subsume   : より短いプレフィックスに包含されるIPCコードを除く（H01L があれば H01L21 は不要）
+  3. kw_subsume    : ほかのキーワードを部分文字列として含むキーワードを除く（"膜" があれば "逆浸透膜" は不要）
+  4. regex_fusion  : 2つ以上のキーワードのORを、1つの正規表現（REGEXP_CONTAINS）にまとめる
+  5. order         : 安く、絞り込みの効く述語から評価されるように並べ替える
+
+コストは1行あたりの評価コストの概算（LIKE 1回 = 1.0）で、explain() で各書き換えとその削減量を確認できる。
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, List, Optional
+
+from .state import SearchConditions
+
+KEYWORD = "keyword"
+IPC = "ipc"
+
+# --- 1行あたりの評価コストの概算 ---
+LIKE_COST = 1.0           # LIKE '%kw%' 1回
+REGEX_BASE_COST = 1.5     # REGEXP_CONTAINS 1回
+REGEX_ALT_COST = 0.1      # 正規表現の選択肢1つあたりの追加コスト
+IPC_UNNEST_COST = 2.0     # IPCの配列を1回UNNESTするコスト
+IPC_PREFIX_COST = 0.2     # プレフィックス1つあたりの照合コスト
+
+# IPCプレフィックスの長さごとの選択率の概算（セクション・クラス・サブクラス）
+IPC_SELECTIVITY = {1: 1 / 8, 2: 1 / 8, 3: 1 / 120, 4: 1 / 650}
+IPC_GROUP_SELECTIVITY = 1 / 5000
+
+# 正規表現（RE2）で特別な意味を持つ文字
+_REGEX_META = set("\\.^$|?*+()[]{}")
+
+def _has_like_wildcard(value: str) -> bool:
+    return "%" in value or "_" in value
+
+def escape_regex(value: str) -> str:
+    return "".join(f"\\{ch}" if ch in _REGEX_META else ch for ch in value)
+
+def keyword_pattern(keywords: List[str]) -> str:
+    """キーワードのいずれかを含むかを表す正規表現"""
+    return "|".join(escape_regex(kw) for kw in keywords)
+
+def _keyword_selectivity(keyword: str) -> float:
+    return max(0.0005, min(0.5, 2.0 ** -len(keyword)))
+
+def _ipc_selectivity(code: str) -> float:
+    return IPC_SELECTIVITY.get(len(code), IPC_GROUP_SELECTIVITY)
+
+@dataclass
+class Predicate:
+    """値のいずれかに一致すれば真となる条件（キーワードの部分一致、またはIPCのプレフィックス一致）"""
+    kind: str
+    values: List[str]
+    fused: bool = False  # キーワードを1つの正規表現にまとめたか
+
+    @property
+    def label(self) -> str:
+        return "キーワード" if self.kind == KEYWORD else "IPC"
+
+    def cost(self) -> float:
+        if self.kind == IPC:
+            return IPC_UNNEST_COST + IPC_PREFIX_COST * len(self.values)
+        if self.fused:
+            return REGEX_BASE_COST + REGEX_ALT_COST * len(self.values)
+        return LIKE_COST * len(self.values)
+
+    def selectivity(self) -> float:
+        """行がこの条件を満たす確率の概算（値ごとの確率を独立とみなす）"""
+        estimate = _keyword_selectivity if self.kind == KEYWORD else _ipc_selectivity
+        miss = 1.0
+        for value in self.values:
+            miss *= 1.0 - estimate(value)
+        return 1.0 - miss
+
+@dataclass
+class Rewrite:
+    """最適化パスによる1つの書き換え"""
+    pass_name: str
+    description: str
+    cost_saved: float
+
+@dataclass
+class QueryPlan:
+    """検索条件の中間表現。subject はAND、predicate はORで結合する。"""
+    subject: List[Predicate] = field(default_factory=list)
+    predicate: List[Predicate] = field(default_factory=list)
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    countries: List[str] = field(default_factory=list)
+    limit: int = 100
+    rewrites: List[Rewrite] = field(default_factory=list)
+    initial_cost: float = 0.0
+
+    def groups(self):
+        """(グループ名, 述語のリスト, 結合がANDか) の並び"""
+        return (("主語", self.subject, True), ("述語", self.predicate, False))
+
+    def estimated_cost(self) -> float:
+        """
+        短絡評価を考慮した1行あたりの期待コスト。
+        ANDは前の述語が真の行だけ、ORは前の述語が偽の行だけ次の述語を評価するとみなす。
+        述語グループは主語グループを満たした行だけ評価する。
+        """
+        subject_cost, reach = 0.0, 1.0
+        for pred in self.subject:
+            subject_cost += reach * pred.cost()
+            reach *= pred.selectivity()
+        predicate_cost, remaining = 0.0, 1.0
+        for pred in self.predicate:
+            predicate_cost += remaining * pred.cost()
+            remaining *= 1.0 - pred.selectivity()
+        return subject_cost + reach * predicate_cost
+
+def build_plan(conditions: SearchConditions) -> QueryPlan:
+    """検索条件を、最適化前の中間表現にする"""
+    def group(keywords: List[str], codes: List[str]) -> List[Predicate]:
+        preds = []
+        if keywords:
+            preds.append(Predicate(KEYWORD, list(keywords)))
+        if codes:
+            preds.append(Predicate(IPC, list(codes)))
+        return preds
+
+    plan = QueryPlan(
+        subject=group(conditions.subject_keywords, conditions.subject_ipc),
+        predicate=group(conditions.predicate_keywords, conditions.predicate_ipc),
+        start_date=conditions.start_date,
+        end_date=conditions.end_date,
+        countries=list(conditions.countries or []),
+        limit=conditions.limit,
+    )
+    plan.initial_cost = plan.estimated_cost()
+    return plan
+
+def _rewrite(plan: QueryPlan, pass_name: str, description: str, apply: Callable[[], None]) -> None:
+    """書き換えを適用し、推定コストの削減量とともに記録する"""
+    before = plan.estimated_cost()
+    apply()
+    plan.rewrites.append(Rewrite(pass_name, description, before - plan.estimated_cost()))
+
+def _drop_values(plan: QueryPlan, pass_name: str, pred: Predicate, group_name: str,
+                 keep: List[str], reasons: List[tuple]) -> None:
+    for value, reason in reasons:
+        description = f"{group_name}{pred.label}「{value}」は{reason}ため削除"
+        _rewrite(plan, pass_name, description, lambda v=value: pred.values.remove(v))
+    pred.values[:] = keep
+
+def dedupe(plan: QueryPlan) -> None:
+    """キーワードは小文字、IPCは大文字にそろえ、重複と空文字を除く"""
+    for group_name, preds, _ in plan.groups():
+        for pred in preds:
+            normalize = str.lower if pred.kind == KEYWORD else str.upper
+            keep, reasons = [], []
+            for value in pred.values:
+                normalized = normalize(value.strip())
+                if not normalized:
+                    reasons.append((value, "空である"))
+                elif normalized in keep:
+                    reasons.append((value, f"「{normalized}」と重複する"))
+                else:
+                    keep.append(normalized)
+            if reasons:
+                # 正規化後の値に置き換えてから、除く値の分のコストを記録する
+                pred.values[:] = keep + [value for value, _ in reasons]
+                _drop_values(plan, "dedupe", pred, group_name, keep, reasons)
+            else:
+                pred.values[:] = keep
+
+def drop_subsumed_ipc(plan: QueryPlan) -> None:
+    """同じOR内で、より短いプレフィックスで始まるIPCコードを除く"""
+    for group_name, preds, _ in plan.groups():
+        for pred in preds:
+            if pred.kind != IPC:
+                continue
+            keep, reasons = [], []
+            for code in pred.values:
+                broader = next((c for c in pred.values if c != code and code.startswith(c)), None)
+                if broader:
+                    reasons.append((code, f"「{broader}」に包含される"))
+                else:
+                    keep.append(code)
+            _drop_values(plan, "ipc_subsume", pred, group_name, keep, reasons)
+
+def drop_subsumed_keywords(plan: QueryPlan) -> None:
+    """同じOR内で、ほかのキーワードを部分文字列として含むキーワードを除く"""
+    for group_name, preds, _ in plan.groups():
+        for pred in preds:
+            if pred.kind != KEYWORD or any(_has_like_wildcard(kw) for kw in pred.values):
+                continue
+            keep, reasons = [], []
+            for kw in pred.values:
+                shorter = next((k for k in pred.values if k != kw and k in kw), None)
+                if shorter:
+                    reasons.append((kw, f"「{shorter}」の部分一致に包含される"))
+                else:
+                    keep.append(kw)
+            _drop_values(plan, "kw_subsume", pred, group_name, keep, reasons)
+
+def fuse_keywords(plan: QueryPlan) -> None:
+    """2つ以上のキーワードのORを1つの正規表現にまとめる（LIKEのワイルドカードを含む場合を除く）"""
+    for group_name, preds, _ in plan.groups():
+        for pred in preds:
+            if pred.kind != KEYWORD or len(pred.values) < 2 or any(_has_like_wildcard(kw) for kw in pred.values):
+                continue
+            fused = Predicate(KEYWORD, pred.values, fused=True)
+            if fused.cost() >= pred.cost():
+                continue
+            description = f"{group_name}キーワード{len(pred.values)}件のLIKEを1つの正規表現 /{keyword_pattern(pred.values)}/ に融合"
+            _rewrite(plan, "regex_fusion", description, lambda p=pred: setattr(p, "fused", True))
+
+def order_predicates(plan: QueryPlan) -> None:
+    """
+    ANDは cost / (1 - 選択率)、ORは cost / 選択率 の昇順に並べる。
+    短絡評価のもとで期待コストが最小になる順序。
+    """
+    for group_name, preds, is_and in plan.groups():
+        if len(preds) < 2:
+            continue
+        if is_and:
+            rank = lambda p: p.cost() / max(1e-9, 1.0 - p.selectivity())
+        else:
+            rank = lambda p: p.cost() / max(1e-9, p.selectivity())
+        ordered = sorted(preds, key=rank)
+        if ordered != preds:
+            description = f"{group_name}の評価順を {' → '.join(p.label for p in ordered)} に変更"
+            _rewrite(plan, "order", description, lambda ps=preds, o=ordered: ps.__setitem__(slice(None), o))
+
+PASSES = [dedupe, drop_subsumed_ipc, drop_subsumed_keywords, fuse_keywords, order_predicates]
+
+def compile_conditions(conditions: SearchConditions, passes: List[Callable[[QueryPlan], None]] = None) -> QueryPlan:
+    """検索条件を中間表現にし、最適化パスを順に適用する"""
+    plan = build_plan(conditions)
+    for optimization in (PASSES if passes is None else passes):
+        optimization(plan)
+    for _, preds, _ in plan.groups():
+        preds[:] = [p for p in preds if p.values]
+    return plan
+
+def explain(plan: QueryPlan) -> str:
+    """適用した書き換えと、推定コストの変化を説明するテキスト"""
+    lines = []
+    for r in plan.rewrites:
+        lines.append(f"- [{r.pass_name}] {r.description} (推定コスト {-r.cost_saved:+.2f}/行)")
+    if not lines:
+        lines.append("- 書き換えはありません")
+    final_cost = plan.estimated_cost()
+    lines.append(f"推定コスト (1行あたり, LIKE 1回 = 1.0): {plan.initial_cost:.2f} → {final_cost:.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,111 @@
+"""
+Embeddingベクトルによる類似度ランキング。
+
+文書ベクトルは正規化済みのfloat32行列として保持し、類似度は1回の行列積で計算する。
+上位k件の抽出にはargpartitionを用い、全件のソートを避ける。
+タイトル・要約などセクションごとの類似度を保存しておけば、重みを変えたときはEmbeddingを計算し直さずに並べ替えられる。
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+# 文書ベクトルの定義（score_sections を参照）。ANNインデックスはこの定義ごとに作成するため、定義を変えたら値を更新する。
+DOC_VECTOR_VERSION = "sections-v1"
+
+# セクション別の類似度の既定の重み（アプリの AppState.similarity_weights とバッチ検索で共通）
+DEFAULT_SECTION_WEIGHTS = {"title": 0.5, "abstract": 0.5}
+
+def normalize_rows(vectors) -> np.ndarray:
+    """ベクトルの集合を、各行をL2正規化したfloat32の2次元配列にする（ゼロベクトルはそのまま）"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def cosine_scores(query_vectors, doc_matrix: np.ndarray) -> np.ndarray:
+    """
+    調査テーマのベクトルと文書行列のコサイン類似度を計算する。
+
+    :param query_vectors: クエリベクトル（1本。get_embeddings の戻り値をそのまま渡せる）
+    :param doc_matrix: normalize_rows で正規化済みの文書行列 (文書数 x 次元)
+    :return: 文書ごとのスコア (float32)
+    """
+    queries = normalize_rows(query_vectors)
+    if len(queries) != 1:
+        raise ValueError(f"クエリベクトルは1本だけ指定してください: {len(queries)}本")
+    return doc_matrix @ queries[0]
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """スコアの高い順に上位k件のインデックスを返す"""
+    n = len(scores)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def section_column(section: str) -> str:
+    """セクション別の類似度を保存する列名"""
+    return f"sim_{section}"
+
+def weighted_scores(section_scores: Dict[str, np.ndarray], weights: Dict[str, float]) -> np.ndarray:
+    """
+    セクション別の類似度の重み付き和。
+    重みは文書ごとに、その文書に存在するセクション（類似度がNaNでないもの）だけで合計が1になるよう正規化する。
+    重みに含まれないセクションの重みは0とし、重みがすべて0なら均等とする。どのセクションもない文書のスコアは0。
+    """
+    names = list(section_scores)
+    w = np.array([max(float(weights.get(name, 0.0)), 0.0) for name in names], dtype=np.float32)
+    if w.sum() <= 0:
+        w = np.ones(len(names), dtype=np.float32)
+    scores = np.stack([np.asarray(section_scores[name], dtype=np.float32) for name in names])
+    present = ~np.isnan(scores)
+    row_weights = w[:, np.newaxis] * present
+    total = row_weights.sum(axis=0)
+    weighted = (np.where(present, scores, 0.0) * row_weights).sum(axis=0)
+    return np.divide(weighted, total, out=np.zeros_like(weighted), where=total > 0).astype(np.float32)
+
+def score_sections(query_vectors, section_matrices: Dict[str, np.ndarray], present: Dict[str, np.ndarray],
+                   weights: Dict[str, float]) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]:
+    """
+    セクション別の文書行列から、(重み付きスコア, セクション別の類似度, 文書ベクトル) を返す。
+    セクションのない文書（present が False）の類似度はNaNとし、重み付きスコアでは残りのセクションで重みを正規化する。
+
+    文書ベクトルは、存在するセクションの正規化済みベクトルの和を正規化したもの（DOC_VECTOR_VERSION）。
+
+    :param section_matrices: normalize_rows で正規化済みの文書行列。セクションのない行はゼロベクトル
+    :param present: セクションごとの、テキストがある文書のマスク
+    """
+    queries = normalize_rows(query_vectors)
+    section_scores = {}
+    for name, matrix in section_matrices.items():
+        if matrix.shape[1]:
+            scores = cosine_scores(queries, matrix).astype(np.float32)
+        else:
+            scores = np.zeros(len(matrix), dtype=np.float32)  # ページ内にこのセクションのテキストが1件もない
+        scores[~present[name]] = np.nan
+        section_scores[name] = scores
+    n = len(next(iter(section_matrices.values())))
+    doc_matrix = np.zeros((n, queries.shape[1]), dtype=np.float32)
+    for matrix in section_matrices.values():
+        if matrix.shape[1]:
+            doc_matrix += matrix
+    return weighted_scores(section_scores, weights), section_scores, normalize_rows(doc_matrix)
+
+def rescore_table(table: pa.Table, weights: Dict[str, float], score_column: str = "similarity") -> pa.Table:
+    """
+    保存済みのセクション別類似度 (sim_<セクション> 列) から score_column を計算し直し、スコアの高い順に並べ替えたテーブルを返す。
+    """
+    sections = [name for name in weights if section_column(name) in table.column_names]
+    if not sections:
+        raise ValueError("セクション別の類似度の列がありません。")
+    # 欠損値（セクションのない文書）はNaNとして読み込む
+    scores = weighted_scores({name: table[section_column(name)].to_numpy() for name in sections}, weights)
+    column = pa.array(scores, pa.float32())
+    if score_column in table.column_names:
+        table = table.set_column(table.column_names.index(score_column), score_column, column)
+    else:
+        table = table.append_column(score_column, column)
+    return table.take(top_k_indices(scores, len(scores)))
@@ -0,0 +1,120 @@
+"""
+BigQueryの検索結果をParquetファイルとして保存するディスクキャッシュ。
+
+キーは、空白を正規化したSQLと、名前順に並べたクエリパラメータのシリアライズから計算する。
+Streamlitアプリとコマンドラインのスクリプトで同じキャッシュを共有する。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud.bigquery import ArrayQueryParameter, ScalarQueryParameter
+
+from .disk_cache import CACHE_DIR
+
+QUERY_CACHE_DIR = CACHE_DIR / "query_results"
+QUERY_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# キーの計算方法を変更した場合は、この値を更新して古いキャッシュを無効にする
+KEY_VERSION = 1
+
+# 文字列リテラル・引用符付き識別子・それ以外の部分に分割する
+_SQL_TOKEN_PATTERN = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+
+def canonicalize_sql(sql: str) -> str:
+    """文字列リテラルや引用符付き識別子の中身は変えずに、連続する空白を1つにまとめる"""
+    parts = _SQL_TOKEN_PATTERN.split(sql)
+    # splitの結果は、偶数番目が引用符の外、奇数番目が引用符で囲まれた部分
+    normalized = [part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts)]
+    return "".join(normalized).strip()
+
+def serialize_params(params: list) -> str:
+    """クエリパラメータを、名前順に並べた決定的なJSON文字列にする"""
+    serialized = []
+    for p in params:
+        if isinstance(p, ArrayQueryParameter):
+            serialized.append([p.name, f"ARRAY<{p.array_type}>", list(p.values)])
+        elif isinstance(p, ScalarQueryParameter):
+            serialized.append([p.name, p.type_, p.value])
+        else:
+            serialized.append([getattr(p, "name", None), type(p).__name__, repr(p.to_api_repr())])
+    serialized.sort(key=lambda item: item[0] or "")
+    return json.dumps(serialized, ensure_ascii=False, default=str)
+
+def make_key(sql: str, params: list, namespace: str = "bigquery") -> str:
+    payload = f"{KEY_VERSION}\n{namespace}\n{canonicalize_sql(sql)}\n{serialize_params(params)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class QueryResultCache:
+    """検索結果のArrowテーブルを、キーごとのParquetファイルとして有効期限付きで保存する"""
+
+    def __init__(self, directory: Path = QUERY_CACHE_DIR, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.parquet"
+
+    def contains(self, key: str) -> bool:
+        path = self._path(key)
+        try:
+            return time.time() - path.stat().st_mtime <= self.ttl_seconds
+        except FileNotFoundError:
+            return False
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        """有効期限内の結果があれば返す。なければNone。"""
+        if not self.contains(key):
+            self.misses += 1
+            return None
+        try:
+            table = pq.read_table(self._path(key))
+        except (FileNotFoundError, pa.ArrowInvalid):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return table
+
+    def put(self, key: str, table: pa.Table) -> None:
+        """一時ファイルに書き出してから置き換え、読み込み中のプロセスが壊れたファイルを見ないようにする"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f".{key}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self._path(key))
+
+    def purge_expired(self) -> int:
+        """有効期限切れのファイルを削除し、削除した件数を返す"""
+        if not self.directory.exists():
+            return 0
+        removed = 0
+        now = time.time()
+        for path in self.directory.glob("*.parquet"):
+            try:
+                if now - path.stat().st_mtime > self.ttl_seconds:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> QueryResultCache:
+    """プロセス内で共有する検索結果キャッシュを返す"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryResultCache()
+            _query_cache.purge_expired()
+        return _query_cache
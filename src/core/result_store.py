@@ -0,0 +1,131 @@
+"""
+検索結果をセッションの外（ディスク）に保存するストア。
+
+検索結果はArrow IPC形式（非圧縮）のファイルに書き出し、AppStateには ResultHandle（ファイルの識別子と行数・列名）だけを持たせる。
+読み込みはメモリマップで行い、必要な列・行の範囲だけをDataFrameに変換するため、
+サーバーのメモリ使用量は「接続中のユーザー数 × 結果の大きさ」ではなく、表示中のページの大きさに比例する。
+
+読み込むたびにファイルの更新時刻を更新し、一定時間読まれていない（放置されたセッションの）結果は削除する。
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+RESULT_STORE_DIR = Path(__file__).resolve().parents[2] / "outputs" / "results"
+RESULT_TTL_SECONDS = 2 * 60 * 60  # 最後に読まれてから2時間で削除する
+
+@dataclass(frozen=True)
+class ResultHandle:
+    """保存した検索結果への参照（セッションに保存するのはこれだけ）"""
+    result_id: str
+    num_rows: int
+    columns: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+class ResultExpiredError(Exception):
+    """有効期限切れなどで、検索結果のファイルが見つからない"""
+    pass
+
+class ResultStore:
+    """検索結果をArrow IPCファイルとして保存し、メモリマップで読み込む"""
+
+    def __init__(self, directory: Path = RESULT_STORE_DIR, ttl_seconds: float = RESULT_TTL_SECONDS):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, result_id: str) -> Path:
+        return self.directory / f"{result_id}.arrow"
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """更新時刻を現在時刻にする（purge_expired と同じ time.time() を用いる）"""
+        now = time.time()
+        os.utime(path, (now, now))
+
+    def put(self, df: pd.DataFrame) -> ResultHandle:
+        """DataFrameを保存してハンドルを返す"""
+        return self.put_table(pa.Table.from_pandas(df, preserve_index=False))
+
+    def put_table(self, table: pa.Table) -> ResultHandle:
+        """Arrowテーブルを保存してハンドルを返す。一時ファイルに書き出してから置き換える。"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        result_id = uuid.uuid4().hex
+        tmp_path = self.directory / f".{result_id}.tmp"
+        with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        self._touch(tmp_path)
+        os.replace(tmp_path, self._path(result_id))
+        self.purge_expired()  # 放置されたセッションの結果は、次に誰かが検索したときに削除する
+        return ResultHandle(result_id, table.num_rows, table.column_names)
+
+    def exists(self, handle: Optional[ResultHandle]) -> bool:
+        return handle is not None and self._path(handle.result_id).exists()
+
+    def read_table(self, handle: ResultHandle, columns: List[str] = None) -> pa.Table:
+        """
+        保存した結果をメモリマップで読み込む。返すテーブルのバッファはファイルを参照しており、コピーはしない。
+        :raises ResultExpiredError: ファイルが削除されている場合
+        """
+        path = self._path(handle.result_id)
+        try:
+            self._touch(path)  # 読まれたことを記録し、有効期限を延ばす
+            with pa.memory_map(str(path), 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+        except FileNotFoundError:
+            raise ResultExpiredError("検索結果の保存期間が過ぎました。もう一度検索を実行してください。")
+        return table.select(columns) if columns else table
+
+    def read(self, handle: ResultHandle, columns: List[str] = None, offset: int = 0, length: int = None) -> pd.DataFrame:
+        """指定した列・行の範囲だけをDataFrameに変換して返す"""
+        table = self.read_table(handle, columns)
+        return table.slice(offset, length).to_pandas()
+
+    def delete(self, handle: Optional[ResultHandle]) -> None:
+        if handle is None:
+            return
+        try:
+            self._path(handle.result_id).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windowsでは読み込み中のファイルを削除できない。残ったファイルは有効期限切れで削除される。
+            logger.warning("検索結果のファイルを削除できませんでした: %s", e)
+
+    def purge_expired(self) -> int:
+        """最後に読まれてから有効期限を過ぎたファイルを削除し、削除した件数を返す"""
+        if not self.directory.exists():
+            return 0
+        removed = 0
+        now = time.time()
+        for path in self.directory.glob("*.arrow"):
+            try:
+                if now - path.stat().st_mtime > self.ttl_seconds:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+_result_store = None
+_result_store_lock = threading.Lock()
+
+def get_result_store() -> ResultStore:
+    """プロセス内で共有する検索結果ストアを返す"""
+    global _result_store
+    with _result_store_lock:
+        if _result_store is None:
+            _result_store = ResultStore()
+            _result_store.purge_expired()
+        return _result_store
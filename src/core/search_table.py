@@ -0,0 +1,75 @@
+"""
+検索用のスリムなBigQueryテーブルを作成するモジュール。
+
+公開特許テーブルでは、検索のたびにタイトル・要約のUNNESTやLOWER()が全行に対して実行される。
+あらかじめフラットスキーマ（小文字化済みのsearch_text、IPCコードの配列、country列）へ射影し、
+country・publication_dateでクラスタリングしたテーブルを作っておくと、
+SubjectPredicateStrategy(search_table=...) で検索する際のスキャン量とスロット時間を大きく減らせる。
+
+検索用テーブルは、検索条件によらず公開特許テーブルの代わりに使われるため、常に全件から作成する
+（範囲を絞ったデータで検索したい場合は、範囲を確認してから使われるローカルミラー core.mirror を用いる）。
+
+テーブルの作成:
+    cd src
+    python -m core.search_table --credentials path/to/sa.json \
+        --table my-project.patent_finder.publications_search
+"""
+import argparse
+import json
+
+from google.api_core import exceptions
+from google.cloud import bigquery
+from google.cloud.bigquery import QueryJobConfig
+
+from . import bq_client
+from .strategies.default import flat_projection_sql
+
+CLUSTERING_FIELDS = ["country", "publication_date"]
+
+def build_search_table(table_id: str, credentials_info: dict = None) -> bigquery.Table:
+    """
+    公開特許テーブルの全件をフラットスキーマへ射影し、クラスタリングした検索用テーブルとして保存する。
+    既存のテーブルは置き換える。
+
+    Args:
+        table_id (str): 作成するテーブルのID (project.dataset.table)。
+        credentials_info (dict, optional): GCPサービスアカウントの認証情報。
+
+    Returns:
+        bigquery.Table: 作成したテーブル。
+
+    Raises:
+        BQClientError: テーブルの作成に失敗した場合。
+    """
+    try:
+        client = bq_client.get_client(credentials_info)
+        table_ref = bigquery.TableReference.from_string(table_id, default_project=client.project)
+        client.create_dataset(bigquery.DatasetReference(table_ref.project, table_ref.dataset_id), exists_ok=True)
+
+        job_config = QueryJobConfig(
+            destination=table_ref,
+            clustering_fields=CLUSTERING_FIELDS,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        client.query(flat_projection_sql(), job_config=job_config).result()
+        return client.get_table(table_ref)
+
+    except bq_client.BQClientError:
+        raise
+    except exceptions.GoogleAPIError as e:
+        raise bq_client.BQClientError(f"検索用テーブルの作成中にエラーが発生しました: {e}") from e
+
+def main():
+    parser = argparse.ArgumentParser(description="検索用のスリムなBigQueryテーブルを作成する")
+    parser.add_argument("--credentials", required=True, help="GCPサービスアカウントのJSONキーファイル")
+    parser.add_argument("--table", required=True, help="作成するテーブルのID (project.dataset.table)")
+    args = parser.parse_args()
+
+    with open(args.credentials, 'r', encoding='utf-8') as f:
+        credentials_info = json.load(f)
+
+    table = build_search_table(args.table, credentials_info)
+    print(f"検索用テーブルを作成しました: {table.full_table_id} ({table.num_rows}件, {bq_client.format_bytes(table.num_bytes)})")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 from dataclasses import dataclass, field
-from typing import List, Tuple, Dict, Any
-import pandas as pd
+from typing import List, Tuple, Dict, Any, Optional
 from datetime import date
+from .result_store import ResultHandle
+from .ranking import DEFAULT_SECTION_WEIGHTS
 
 @dataclass
 class SearchConditions:
@@ -32,9 +33,24 @@ class AppState:
 
     # --- 検索条件と結果 ---
     search_conditions: SearchConditions = field(default_factory=SearchConditions)
+    search_strategy: str = "keyword"  # "keyword": キーワード・IPC検索, "semantic": Embeddingのインデックスによる意味検索
     generated_sql: str = ""
     sql_explanation: str = ""
-    search_results: pd.DataFrame = field(default_factory=pd.DataFrame)
+    result_handle: Optional[ResultHandle] = None  # 検索結果は core.result_store に保存し、セッションにはハンドルだけを持つ
+    similarity_weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_SECTION_WEIGHTS))  # セクション別の類似度の重み
+    search_timings: Dict[str, float] = field(default_factory=dict)  # 検索の段階別所要時間（秒）
+    search_stats: Dict[str, Any] = field(default_factory=dict)      # キャッシュのヒット数などの統計
+    llm_cache_stats: Dict[str, float] = field(default_factory=dict) # LLM応答キャッシュのヒット数・ミス数・省けた待ち時間（秒）
+    recent_traces: List[Any] = field(default_factory=list)          # 直近の検索のトレース (core.tracing.Trace)
+
+    # --- BigQueryのコスト管理 ---
+    query_budget_bytes: int = 1024 ** 4           # 1回の検索あたりのスキャン量の上限 (1TB)
+    session_budget_bytes: int = 2 * 1024 ** 4     # セッション全体の課金バイト数の上限 (2TB)
+    session_bytes_billed: int = 0
+    estimated_bytes: int = 0
+    cost_confirmation_message: str = ""           # 上限超過時の確認メッセージ（空なら確認待ちではない）
+    confirmed_bytes: int = 0                      # 上限超過を承知で実行を確認した推定スキャン量（0なら未確認）
+    refresh_translations: bool = False            # 次の検索で、用語集とキャッシュを使わずにキーワードを翻訳し直すか
     
     # --- その他 ---
     error_message: str = ""
@@ -1,95 +1,215 @@
-from typing import Tuple
+from typing import List, Tuple
+from datetime import date
 from google.cloud.bigquery import ScalarQueryParameter, ArrayQueryParameter
 import textwrap
 from .base import BaseStrategy
+from .. import query_compiler
 from ..state import SearchConditions
 
+PUBLICATIONS_TABLE = "patents-public-data.patents.publications"
+
+# ローカルミラー（DuckDB）上で、フラットスキーマのデータを参照するビュー名
+MIRROR_VIEW = "patent_mirror"
+
+SUPPORTED_DIALECTS = ("bigquery", "duckdb")
+
+# --- PatentData CTE で用いる列の射影 ---
+TITLE_SQL = "(SELECT text FROM UNNEST(title_localized) WHERE language IN ('en', 'ja') LIMIT 1)"
+ABSTRACT_SQL = "(SELECT text FROM UNNEST(abstract_localized) WHERE language IN ('en', 'ja') LIMIT 1)"
+ASSIGNEE_SQL = "(SELECT STRING_AGG(name) FROM UNNEST(assignee_harmonized))"
+IPC_CODES_SQL = "(SELECT STRING_AGG(code) FROM UNNEST(ipc))"
+
+def flat_projection_sql(where_sql: str = "") -> str:
+    """
+    公開特許テーブルを、PatentData CTE と同じ列を持つフラットなスキーマへ射影するSQLを返す。
+    ローカルミラーや検索用テーブル（常に全件）の作成に用いる。IPCはコードの配列、search_textは小文字化済みで保持する。
+
+    :param where_sql: 公開特許テーブルに対するWHERE句（"WHERE"を含む）。空文字なら全件。
+    """
+    sql = f"""
+    SELECT
+        publication_number,
+        SUBSTR(publication_number, 1, 2) as country,
+        {TITLE_SQL} as title,
+        {ABSTRACT_SQL} as abstract,
+        {ASSIGNEE_SQL} as assignee,
+        publication_date,
+        ARRAY(SELECT code FROM UNNEST(ipc)) as ipc,
+        {IPC_CODES_SQL} as ipc_codes,
+        LOWER(CONCAT({TITLE_SQL}, ' ', {ABSTRACT_SQL})) as search_text
+    FROM
+        `{PUBLICATIONS_TABLE}`
+    {where_sql}
+    """
+    return textwrap.dedent(sql.strip())
+
+def slice_filter_sql(ipc_prefixes: List[str] = None, countries: List[str] = None,
+                     start_date: date = None, end_date: date = None) -> Tuple[str, list]:
+    """
+    公開特許テーブルの一部（IPCプレフィックス・国・公開日）を切り出すWHERE句とパラメータを返す。
+    いずれも指定しない場合は空文字（全件）になる。
+    """
+    where_clauses = []
+    params = []
+    if ipc_prefixes:
+        where_clauses.append("EXISTS (SELECT 1 FROM UNNEST(ipc) AS i, UNNEST(@ipc_prefixes) AS prefix WHERE STARTS_WITH(i.code, prefix))")
+        params.append(ArrayQueryParameter("ipc_prefixes", "STRING", ipc_prefixes))
+    if countries:
+        where_clauses.append("SUBSTR(publication_number, 1, 2) IN UNNEST(@countries)")
+        params.append(ArrayQueryParameter("countries", "STRING", countries))
+    if start_date:
+        where_clauses.append("publication_date >= @start_date")
+        params.append(ScalarQueryParameter("start_date", "INT64", int(start_date.strftime("%Y%m%d"))))
+    if end_date:
+        where_clauses.append("publication_date <= @end_date")
+        params.append(ScalarQueryParameter("end_date", "INT64", int(end_date.strftime("%Y%m%d"))))
+    where_sql = "WHERE\n  " + "\n  AND ".join(where_clauses) if where_clauses else ""
+    return where_sql, params
+
 class SubjectPredicateStrategy(BaseStrategy):
     """
     「主語固定・述語緩和」戦略に、高度な検索条件を追加した戦略。
     CTEとシンプルなWHERE句を用いることで、堅牢性と可読性を高めた。
+    条件は core.query_compiler で最適化（重複・包含の除去、キーワードの正規表現への融合、評価順の調整）してからSQLにする。
+
+    dialect="duckdb" を指定すると、ローカルミラー（フラットスキーマ）向けの同等なSQLを生成する。
+    search_table を指定すると、公開特許テーブルの代わりに、事前に作成したフラットスキーマの
+    検索用テーブル（core.search_table、常に全件を含む）を対象にする。
+    パラメータはいずれの場合もBigQueryのクエリパラメータとして返す。
     """
-    def generate_sql(self, conditions: SearchConditions) -> Tuple[str, list]:
-        query_params = []
-        param_counter = 0
-        where_clauses = []
+    def __init__(self, dialect: str = "bigquery", search_table: str = None):
+        if dialect not in SUPPORTED_DIALECTS:
+            raise ValueError(f"未対応のSQL方言です: {dialect}")
+        self.dialect = dialect
+        self.search_table = search_table if dialect == "bigquery" else None
+        # フラットスキーマ (IPCはコードの配列、search_textは小文字化済み、country列あり) を対象にするか
+        self.flat = dialect == "duckdb" or bool(self.search_table)
+        self.plan = None  # 直前に生成したSQLの中間表現 (query_compiler.QueryPlan)
 
-        # --- 共通条件 ---
-        if conditions.start_date and conditions.end_date:
-            where_clauses.append("p.publication_date BETWEEN @start_date AND @end_date")
-            query_params.extend([
-                ScalarQueryParameter("start_date", "INT64", int(conditions.start_date.strftime("%Y%m%d"))),
-                ScalarQueryParameter("end_date", "INT64", int(conditions.end_date.strftime("%Y%m%d")))
-            ])
-        if conditions.countries:
-            where_clauses.append("SUBSTR(p.publication_number, 1, 2) IN UNNEST(@countries)")
-            query_params.append(ArrayQueryParameter("countries", "STRING", conditions.countries))
-
-        # --- 主語 (ANDで結合) ---
-        subject_parts = []
-        if conditions.subject_keywords:
-            kw_conds = []
-            for kw in set(conditions.subject_keywords): # 重複除去
-                param_name = f"s_kw_{param_counter}"
-                kw_conds.append(f"LOWER(p.search_text) LIKE @{param_name}")
-                query_params.append(ScalarQueryParameter(param_name, "STRING", f"%{kw.lower()}%"))
-                param_counter += 1
-            subject_parts.append(f"({' OR '.join(kw_conds)})")
-        
-        if conditions.subject_ipc:
-            ipc_conds = []
-            for code in set(conditions.subject_ipc):
-                param_name = f"s_ipc_{param_counter}"
-                ipc_conds.append(f"EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS ipc WHERE ipc.code LIKE @{param_name})")
-                query_params.append(ScalarQueryParameter(param_name, "STRING", f"{code}%"))
-                param_counter += 1
-            subject_parts.append(f"({' OR '.join(ipc_conds)})")
-        
-        if subject_parts:
-            where_clauses.append(f"({' AND '.join(subject_parts)})")
-
-        # --- 述語 (ORで結合) ---
-        predicate_parts = []
-        if conditions.predicate_keywords:
-            kw_conds = []
-            for kw in set(conditions.predicate_keywords):
-                param_name = f"p_kw_{param_counter}"
-                kw_conds.append(f"LOWER(p.search_text) LIKE @{param_name}")
-                query_params.append(ScalarQueryParameter(param_name, "STRING", f"%{kw.lower()}%"))
-                param_counter += 1
-            predicate_parts.append(f"({' OR '.join(kw_conds)})")
-
-        if conditions.predicate_ipc:
-            ipc_conds = []
-            for code in set(conditions.predicate_ipc):
-                param_name = f"p_ipc_{param_counter}"
-                ipc_conds.append(f"EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS ipc WHERE ipc.code LIKE @{param_name})")
-                query_params.append(ScalarQueryParameter(param_name, "STRING", f"{code}%"))
-                param_counter += 1
-            predicate_parts.append(f"({' OR '.join(ipc_conds)})")
-            
-        if predicate_parts:
-            where_clauses.append(f"({' OR '.join(predicate_parts)})")
+    def _param(self, name: str) -> str:
+        return f"${name}" if self.dialect == "duckdb" else f"@{name}"
 
-        where_sql = "WHERE\n  " + "\n  AND ".join(where_clauses) if where_clauses else ""
+    def _keyword_condition(self, param_name: str) -> str:
+        if self.flat:
+            # フラットスキーマのsearch_textは小文字化済み
+            return f"p.search_text LIKE {self._param(param_name)}"
+        return f"LOWER(p.search_text) LIKE {self._param(param_name)}"
+
+    def _ipc_condition(self, param_name: str) -> str:
+        """
+        IPCコードのいずれかが、配列パラメータのプレフィックスのいずれかで始まるかの条件。
+        コードごとにUNNESTするのではなく、1回のUNNESTで全プレフィックスと照合する。
+        """
+        prefixes = self._param(param_name)
+        if self.dialect == "duckdb":
+            return f"EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS ipc(code), UNNEST({prefixes}) AS pre(prefix) WHERE starts_with(ipc.code, pre.prefix))"
+        if self.flat:
+            return f"EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS code, UNNEST({prefixes}) AS prefix WHERE STARTS_WITH(code, prefix))"
+        return f"EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS ipc, UNNEST({prefixes}) AS prefix WHERE STARTS_WITH(ipc.code, prefix))"
+
+    def _country_condition(self, param_name: str = "countries") -> str:
+        countries = self._param(param_name)
+        if self.dialect == "duckdb":
+            return f"list_contains({countries}, p.country)"
+        if self.flat:
+            return f"p.country IN UNNEST({countries})"
+        return f"SUBSTR(p.publication_number, 1, 2) IN UNNEST({countries})"
 
-        sql = f"""
+    def _patent_data_cte(self) -> str:
+        if self.flat:
+            source = MIRROR_VIEW if self.dialect == "duckdb" else f"`{self.search_table}`"
+            return f"""
+        WITH PatentData AS (
+            SELECT * FROM {source}
+        )"""
+        return f"""
         WITH PatentData AS (
             SELECT
                 publication_number,
-                (SELECT text FROM UNNEST(title_localized) WHERE language IN ('en', 'ja') LIMIT 1) as title,
-                (SELECT text FROM UNNEST(abstract_localized) WHERE language IN ('en', 'ja') LIMIT 1) as abstract,
-                (SELECT STRING_AGG(name) FROM UNNEST(assignee_harmonized)) as assignee,
+                {TITLE_SQL} as title,
+                {ABSTRACT_SQL} as abstract,
+                {ASSIGNEE_SQL} as assignee,
                 publication_date,
                 ipc, -- IPCをそのまま渡す
-                (SELECT STRING_AGG(code) FROM UNNEST(ipc)) as ipc_codes,
+                {IPC_CODES_SQL} as ipc_codes,
                 CONCAT(
-                    (SELECT text FROM UNNEST(title_localized) WHERE language IN ('en', 'ja') LIMIT 1), ' ',
-                    (SELECT text FROM UNNEST(abstract_localized) WHERE language IN ('en', 'ja') LIMIT 1)
+                    {TITLE_SQL}, ' ',
+                    {ABSTRACT_SQL}
                 ) as search_text
             FROM
-                `patents-public-data.patents.publications`
-        )
+                `{PUBLICATIONS_TABLE}`
+        )"""
+
+    def _common_conditions(self, conditions: SearchConditions, param_prefix: str = "") -> Tuple[list, list]:
+        """公開日・国の条件を (WHERE句のリスト, パラメータのリスト) として返す"""
+        where_clauses = []
+        query_params = []
+        if conditions.start_date and conditions.end_date:
+            start, end = f"{param_prefix}start_date", f"{param_prefix}end_date"
+            where_clauses.append(f"p.publication_date BETWEEN {self._param(start)} AND {self._param(end)}")
+            query_params.extend([
+                ScalarQueryParameter(start, "INT64", int(conditions.start_date.strftime("%Y%m%d"))),
+                ScalarQueryParameter(end, "INT64", int(conditions.end_date.strftime("%Y%m%d")))
+            ])
+        if conditions.countries:
+            where_clauses.append(self._country_condition(f"{param_prefix}countries"))
+            query_params.append(ArrayQueryParameter(f"{param_prefix}countries", "STRING", conditions.countries))
+        return where_clauses, query_params
+
+    def _regex_condition(self, param_name: str) -> str:
+        if self.dialect == "duckdb":
+            return f"regexp_matches(p.search_text, {self._param(param_name)})"
+        if self.flat:
+            return f"REGEXP_CONTAINS(p.search_text, {self._param(param_name)})"
+        return f"REGEXP_CONTAINS(LOWER(p.search_text), {self._param(param_name)})"
+
+    def explain(self) -> str:
+        """直前の generate_sql で適用した最適化の説明"""
+        return query_compiler.explain(self.plan) if self.plan else ""
+
+    def build_conditions(self, conditions: SearchConditions, param_prefix: str = "") -> Tuple[list, list]:
+        """
+        検索条件を (WHERE句のリスト, パラメータのリスト) にする。各要素はANDで結合する。
+        param_prefix はパラメータ名の先頭に付ける文字列で、複数の検索条件を1つのクエリにまとめる場合（core.fanout）に用いる。
+        """
+        # 検索条件を中間表現にして最適化してから、SQLを組み立てる
+        self.plan = query_compiler.compile_conditions(conditions)
+        param_counter = 0
+
+        # --- 共通条件 ---
+        where_clauses, query_params = self._common_conditions(conditions, param_prefix)
+
+        # --- 主語 (ANDで結合)・述語 (ORで結合) ---
+        for group, preds, joiner in (("s", self.plan.subject, " AND "), ("p", self.plan.predicate, " OR ")):
+            prefix = f"{param_prefix}{group}"
+            parts = []
+            for pred in preds:
+                if pred.kind == query_compiler.IPC:
+                    parts.append(self._ipc_condition(f"{prefix}_ipc"))
+                    query_params.append(ArrayQueryParameter(f"{prefix}_ipc", "STRING", pred.values))
+                elif pred.fused:
+                    param_name = f"{prefix}_kw_{param_counter}"
+                    parts.append(self._regex_condition(param_name))
+                    query_params.append(ScalarQueryParameter(param_name, "STRING", query_compiler.keyword_pattern(pred.values)))
+                    param_counter += 1
+                else:
+                    kw_conds = []
+                    for kw in pred.values:
+                        param_name = f"{prefix}_kw_{param_counter}"
+                        kw_conds.append(self._keyword_condition(param_name))
+                        query_params.append(ScalarQueryParameter(param_name, "STRING", f"%{kw}%"))
+                        param_counter += 1
+                    parts.append(f"({' OR '.join(kw_conds)})")
+            if parts:
+                where_clauses.append(f"({joiner.join(parts)})")
+        return where_clauses, query_params
+
+    def generate_sql(self, conditions: SearchConditions) -> Tuple[str, list]:
+        where_clauses, query_params = self.build_conditions(conditions)
+
+        where_sql = "WHERE\n  " + "\n  AND ".join(where_clauses) if where_clauses else ""
+
+        sql = f"""{self._patent_data_cte()}
         SELECT
             p.publication_number,
             p.title,
@@ -100,8 +220,8 @@ class SubjectPredicateStrategy(BaseStrategy):
         FROM
             PatentData p
         {where_sql}
-        LIMIT @limit
+        LIMIT {self._param('limit')}
         """
         query_params.append(ScalarQueryParameter("limit", "INT64", conditions.limit))
-        
+
         return textwrap.dedent(sql.strip()), query_params
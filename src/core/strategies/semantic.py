@@ -0,0 +1,66 @@
+from typing import List, Tuple
+from google.cloud.bigquery import ScalarQueryParameter, ArrayQueryParameter
+import textwrap
+from .default import SubjectPredicateStrategy
+from ..ann_index import AnnIndex, DEFAULT_N_PROBE
+from ..state import SearchConditions
+
+# 国・公開日の条件で除外される分を見込んで、LIMITの何倍の候補をインデックスから取り出すか
+CANDIDATE_FACTOR = 3
+
+class SemanticStrategy(SubjectPredicateStrategy):
+    """
+    調査方針のEmbeddingに近い特許を近似最近傍インデックス（core.ann_index）から取り出し、
+    その公開番号で特許データを取得する戦略。
+    キーワードやIPCに一致しない特許も候補にできる。キーワード・IPCの条件は用いず、国・公開日の条件のみを適用し、
+    インデックス上の類似度が高い順に返す。
+
+    dialect・search_table の扱いは SubjectPredicateStrategy と同じ。
+    """
+    def __init__(self, index: AnnIndex, query_vector, dialect: str = "bigquery", search_table: str = None,
+                 n_probe: int = DEFAULT_N_PROBE):
+        super().__init__(dialect=dialect, search_table=search_table)
+        self.index = index
+        self.query_vector = query_vector
+        self.n_probe = n_probe
+        self.candidate_ids: List[str] = []
+
+    def _candidate_conditions(self) -> Tuple[str, str]:
+        """候補の公開番号に含まれるかの条件と、候補内の順位を表す式を返す"""
+        ids = self._param('candidate_ids')
+        if self.dialect == "duckdb":
+            return f"list_contains({ids}, p.publication_number)", f"list_position({ids}, p.publication_number)"
+        return (
+            f"p.publication_number IN UNNEST({ids})",
+            f"(SELECT pos FROM UNNEST({ids}) AS id WITH OFFSET AS pos WHERE id = p.publication_number)"
+        )
+
+    def generate_sql(self, conditions: SearchConditions) -> Tuple[str, list]:
+        self.candidate_ids, _ = self.index.search(
+            self.query_vector, k=conditions.limit * CANDIDATE_FACTOR, n_probe=self.n_probe
+        )
+
+        where_clauses, query_params = self._common_conditions(conditions)
+        candidate_condition, rank_sql = self._candidate_conditions()
+        where_clauses.append(candidate_condition)
+        query_params.append(ArrayQueryParameter("candidate_ids", "STRING", self.candidate_ids))
+
+        where_sql = "WHERE\n  " + "\n  AND ".join(where_clauses)
+
+        sql = f"""{self._patent_data_cte()}
+        SELECT
+            p.publication_number,
+            p.title,
+            p.abstract,
+            p.assignee,
+            p.publication_date,
+            p.ipc_codes
+        FROM
+            PatentData p
+        {where_sql}
+        ORDER BY {rank_sql}
+        LIMIT {self._param('limit')}
+        """
+        query_params.append(ScalarQueryParameter("limit", "INT64", conditions.limit))
+
+        return textwrap.dedent(sql.strip()), query_params
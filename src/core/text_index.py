@@ -0,0 +1,307 @@
+"""
+ローカルミラーのタイトル・要約に対する転置インデックス。
+
+検索テキストを、日本語・中国語・韓国語の文字列は文字バイグラム（1文字だけの場合はその文字）に、
+英数字は単語に分割して索引付けする。ポスティングリスト（文献番号の昇順リスト）は差分をvarintで圧縮して保存し、
+メモリマップで読み込む。
+
+キーワードは、SQLの LIKE '%キーワード%' と同じ部分一致の意味で評価する。
+キーワードを同じ規則で分割し、各断片を含むトークンのポスティングの積集合で候補を絞り込んだうえで、
+候補の検索テキストだけを部分一致で検証する。断片を含むトークンは、語彙の全ての接尾辞を辞書順に並べた配列
+（接尾辞配列）を二分探索して求める（語彙を1語ずつ走査しない）。IPCのプレフィックス条件は core.ipc_index で評価する。
+主語はAND、述語はOR（SubjectPredicateStrategyと同じ）で結合する。
+
+インデックスの作成（既存のミラーに対して）:
+    cd src
+    python -m core.text_index --mirror membranes
+"""
+import argparse
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from . import bq_client, query_compiler
+from .ipc_index import IpcIndex, build_ipc_index
+from .state import SearchConditions
+
+TEXT_INDEX_DIR = "text_index"
+DOCS_FILE = "docs.arrow"
+TERMS_FILE = "terms.arrow"
+POSTINGS_FILE = "postings.bin"
+SUFFIXES_FILE = "term_suffixes.i32"
+
+RESULT_COLUMNS = ["publication_number", "title", "abstract", "assignee", "publication_date", "ipc_codes"]
+
+# ひらがな・カタカナ・CJK統合漢字・互換漢字・半角カナ・ハングル
+_CJK_CHARS = "぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ가-힯"
+_TOKEN_PATTERN = re.compile(f"([{_CJK_CHARS}]+)|([0-9a-z]+)")
+
+def _runs(text: str) -> List[tuple]:
+    """小文字化済みのテキストを、(CJKの文字列かどうか, 文字列) の並びに分割する"""
+    return [(bool(cjk), cjk or word) for cjk, word in _TOKEN_PATTERN.findall(text)]
+
+def tokenize(text: str) -> List[str]:
+    """小文字化済みのテキストを索引用のトークンに分割する"""
+    tokens = []
+    for is_cjk, run in _runs(text):
+        if not is_cjk or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def encode_postings(term_ids: np.ndarray, doc_ids: np.ndarray, n_terms: int):
+    """
+    (トークン番号, 文献番号) の組を、トークンごとに差分varintで圧縮したバイト列にする。
+    組はトークン番号順・同一トークン内では文献番号の昇順に並んでいること。
+
+    :return: (圧縮したバイト列, 各トークンの開始位置 (n_terms+1件), 各トークンの文献数)
+    """
+    term_ids = term_ids.astype(np.int64)
+    doc_ids = doc_ids.astype(np.int64)
+    first = np.ones(len(doc_ids), dtype=bool)
+    first[1:] = term_ids[1:] != term_ids[:-1]
+    deltas = np.where(first, doc_ids, doc_ids - np.roll(doc_ids, 1))
+
+    n_bytes = 1 + sum((deltas >= (1 << (7 * k))).astype(np.int64) for k in range(1, 5))
+    value_index = np.repeat(np.arange(len(deltas)), n_bytes)
+    value_start = np.cumsum(n_bytes) - n_bytes
+    byte_pos = np.arange(len(value_index)) - value_start[value_index]
+    more = byte_pos < n_bytes[value_index] - 1
+    data = ((deltas[value_index] >> (7 * byte_pos)) & 0x7F) | (more.astype(np.int64) << 7)
+
+    doc_freq = np.bincount(term_ids, minlength=n_terms)
+    byte_counts = np.bincount(term_ids, weights=n_bytes, minlength=n_terms).astype(np.int64)
+    offsets = np.concatenate(([0], np.cumsum(byte_counts)))
+    return data.astype(np.uint8), offsets, doc_freq
+
+def decode_postings(data: np.ndarray) -> np.ndarray:
+    """差分varintで圧縮した1トークン分のポスティングを、文献番号の配列に戻す"""
+    if not len(data):
+        return np.empty(0, dtype=np.int64)
+    b = data.astype(np.int64)
+    is_last = (b & 0x80) == 0
+    value_index = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    byte_pos = np.arange(len(b)) - starts[value_index]
+    deltas = np.zeros(value_index[-1] + 1, dtype=np.int64)
+    np.add.at(deltas, value_index, (b & 0x7F) << (7 * byte_pos))
+    return np.cumsum(deltas)
+
+def build_suffix_array(terms: List[str]) -> np.ndarray:
+    """
+    語彙の全ての接尾辞を辞書順に並べた (トークン番号, 開始位置) の配列 (接尾辞の数 x 2, int32) を作る。
+    ある断片を含むトークンは、その断片で始まる接尾辞が並ぶ連続した範囲として二分探索で求まる。
+    """
+    pairs = [(term_id, start) for term_id, term in enumerate(terms) for start in range(len(term))]
+    pairs.sort(key=lambda p: terms[p[0]][p[1]:])
+    return np.array(pairs, dtype=np.int32).reshape(-1, 2)
+
+def build_text_index(table: pa.Table, path: Path) -> "TextIndex":
+    """
+    フラットスキーマの特許データ（search_text列を含む）から転置インデックスを作成して保存する。
+    文献番号は table の行番号になる。
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    vocabulary: Dict[str, int] = {}
+    term_chunks, doc_chunks = [], []
+    for doc_id, text in enumerate(table["search_text"].to_pylist()):
+        ids = {vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text or "")}
+        term_chunks.append(np.fromiter(ids, dtype=np.int32, count=len(ids)))
+        doc_chunks.append(np.full(len(ids), doc_id, dtype=np.int32))
+
+    # 語彙を文字列順に並べ替え、トークン番号を振り直す
+    terms = sorted(vocabulary, key=vocabulary.get)
+    order = np.argsort(np.array(terms, dtype=object)) if terms else np.empty(0, dtype=np.int64)
+    new_id = np.empty(len(terms), dtype=np.int32)
+    new_id[order] = np.arange(len(terms), dtype=np.int32)
+
+    term_ids = new_id[np.concatenate(term_chunks)] if term_chunks else np.empty(0, dtype=np.int32)
+    doc_ids = np.concatenate(doc_chunks) if doc_chunks else np.empty(0, dtype=np.int32)
+    pair_order = np.argsort(term_ids, kind="stable")  # 同一トークン内では文献番号の昇順が保たれる
+    data, offsets, doc_freq = encode_postings(term_ids[pair_order], doc_ids[pair_order], len(terms))
+
+    sorted_terms = [terms[i] for i in order]
+    data.tofile(path / POSTINGS_FILE)
+    build_suffix_array(sorted_terms).tofile(path / SUFFIXES_FILE)
+    terms_table = pa.table({
+        "term": pa.array(sorted_terms, type=pa.string()),
+        "offset": pa.array(offsets[:-1], type=pa.int64()),
+        "length": pa.array(np.diff(offsets), type=pa.int64()),
+        "doc_freq": pa.array(doc_freq, type=pa.int32()),
+    })
+    for name, t in ((TERMS_FILE, terms_table), (DOCS_FILE, table)):
+        with ipc.new_file(path / name, t.schema) as writer:
+            writer.write_table(t)
+    build_ipc_index(table["ipc"], path)
+    return TextIndex(path)
+
+class TextIndex:
+    """保存済みの転置インデックス。特許データとポスティングはメモリマップで読み込む。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.docs = ipc.open_file(pa.memory_map(str(self.path / DOCS_FILE))).read_all()
+        terms = ipc.open_file(pa.memory_map(str(self.path / TERMS_FILE))).read_all()
+        self.terms: List[str] = terms["term"].to_pylist()
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+        self._offsets = terms["offset"].to_numpy()
+        self._lengths = terms["length"].to_numpy()
+        self._postings = np.memmap(self.path / POSTINGS_FILE, dtype=np.uint8, mode='r') \
+            if (self.path / POSTINGS_FILE).stat().st_size else np.empty(0, dtype=np.uint8)
+        self._suffixes = self._load_suffixes()
+        self._search_text = self.docs["search_text"].combine_chunks()
+        self.ipc_index = IpcIndex(self.path)
+        self._fragment_cache: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.docs.num_rows
+
+    def _load_suffixes(self) -> np.ndarray:
+        """語彙の接尾辞配列を読み込む。接尾辞配列のない（以前に作成した）インデックスでは、語彙から作成する。"""
+        path = self.path / SUFFIXES_FILE
+        if not path.exists():
+            return build_suffix_array(self.terms)
+        if not path.stat().st_size:
+            return np.empty((0, 2), dtype=np.int32)
+        return np.memmap(path, dtype=np.int32, mode='r').reshape(-1, 2)
+
+    def _suffix_range(self, fragment: str) -> Tuple[int, int]:
+        """fragment で始まる接尾辞が並ぶ範囲 [start, end) を二分探索で求める"""
+        def head(row: int) -> str:
+            term_id, start = self._suffixes[row]
+            return self.terms[term_id][start:start + len(fragment)]
+
+        lo, hi = 0, len(self._suffixes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if head(mid) < fragment:
+                lo = mid + 1
+            else:
+                hi = mid
+        start, hi = lo, len(self._suffixes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if head(mid) <= fragment:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    def postings(self, term_id: int) -> np.ndarray:
+        start = self._offsets[term_id]
+        return decode_postings(self._postings[start:start + self._lengths[term_id]])
+
+    def _union(self, term_ids) -> np.ndarray:
+        lists = [self.postings(i) for i in term_ids]
+        return np.unique(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+
+    def _fragment_docs(self, fragment: str) -> np.ndarray:
+        """fragment を含むトークンを接尾辞配列から探し、いずれかを含む文献番号を返す"""
+        with self._lock:
+            if fragment not in self._fragment_cache:
+                start, end = self._suffix_range(fragment)
+                self._fragment_cache[fragment] = self._union(np.unique(self._suffixes[start:end, 0]))
+            return self._fragment_cache[fragment]
+
+    def keyword_docs(self, keyword: str) -> Optional[np.ndarray]:
+        """
+        検索テキストにキーワードを部分文字列として含む文献番号を昇順で返す。
+        インデックスで絞り込めない（英数字・CJKの文字を含まない）キーワードの場合はNone。
+        """
+        keyword = keyword.lower()
+        if "%" in keyword or "_" in keyword:
+            # LIKEのワイルドカードを含むキーワードは部分一致と意味が異なる
+            return None
+        runs = _runs(keyword)
+        candidates = None
+        for is_cjk, run in runs:
+            if is_cjk and len(run) >= 2:
+                # 連続するCJK文字列のバイグラムは、一致する文献に必ずそのまま含まれる
+                for i in range(len(run) - 1):
+                    term_id = self._term_ids.get(run[i:i + 2])
+                    docs = self.postings(term_id) if term_id is not None else np.empty(0, dtype=np.int64)
+                    candidates = docs if candidates is None else np.intersect1d(candidates, docs, assume_unique=True)
+            else:
+                # 英単語やCJKの1文字は、文献側のより長いトークンの一部でありうる
+                docs = self._fragment_docs(run)
+                candidates = docs if candidates is None else np.intersect1d(candidates, docs, assume_unique=True)
+            if not len(candidates):
+                return candidates
+        if candidates is None:
+            return None
+        if len(runs) == 1 and runs[0][1] == keyword and (not runs[0][0] or len(keyword) <= 2):
+            # キーワードが1つのトークン（またはその一部）そのものなら、候補はすべて一致している
+            return candidates
+        matched = pc.fill_null(pc.match_substring(self._search_text.take(pa.array(candidates)), keyword), False)
+        return candidates[matched.to_numpy(zero_copy_only=False)]
+
+    def _keywords_mask(self, keywords: List[str]) -> Optional[np.ndarray]:
+        """いずれかのキーワードを含む文献のマスク（OR）"""
+        mask = np.zeros(len(self), dtype=bool)
+        for kw in dict.fromkeys(keywords):
+            docs = self.keyword_docs(kw)
+            if docs is None:
+                return None
+            mask[docs] = True
+        return mask
+
+    def _ipc_mask(self, codes: List[str]) -> np.ndarray:
+        """いずれかのIPCコードで始まる分類を持つ文献のマスク（OR）"""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.ipc_index.prefix_docs(codes)] = True
+        return mask
+
+    def search(self, conditions: SearchConditions) -> Optional[pd.DataFrame]:
+        """
+        SubjectPredicateStrategy と同じ条件で検索し、同じ列のDataFrameを返す。
+        インデックスで評価できないキーワードが含まれる場合はNoneを返す（SQLで検索すること）。
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if conditions.start_date and conditions.end_date:
+            dates = pc.fill_null(self.docs["publication_date"], 0).to_numpy()
+            mask &= (dates >= int(conditions.start_date.strftime("%Y%m%d"))) & (dates <= int(conditions.end_date.strftime("%Y%m%d")))
+        if conditions.countries:
+            in_countries = pc.fill_null(pc.is_in(self.docs["country"], pa.array(conditions.countries)), False)
+            mask &= in_countries.to_numpy(zero_copy_only=False)
+
+        # 主語 (ANDで結合)・述語 (ORで結合) は、SQLと同じく最適化後の中間表現で評価する
+        plan = query_compiler.compile_conditions(conditions)
+        for preds, is_and in ((plan.subject, True), (plan.predicate, False)):
+            if not preds:
+                continue
+            group_mask = np.ones(len(self), dtype=bool) if is_and else np.zeros(len(self), dtype=bool)
+            for pred in preds:
+                pred_mask = self._keywords_mask(pred.values) if pred.kind == query_compiler.KEYWORD else self._ipc_mask(pred.values)
+                if pred_mask is None:
+                    return None
+                group_mask = group_mask & pred_mask if is_and else group_mask | pred_mask
+            mask &= group_mask
+
+        rows = np.flatnonzero(mask)[:conditions.limit]
+        return bq_client.arrow_to_frame(self.docs.select(RESULT_COLUMNS).take(pa.array(rows)))
+
+def main():
+    from .mirror import MIRROR_ROOT, LocalMirror
+
+    parser = argparse.ArgumentParser(description="ローカルミラーの全文検索用インデックスを作成する")
+    parser.add_argument("--mirror", required=True, help="ミラー名")
+    parser.add_argument("--root", type=Path, default=MIRROR_ROOT, help="ミラーの保存先")
+    args = parser.parse_args()
+
+    local_mirror = LocalMirror(args.root / args.mirror)
+    index = local_mirror.build_text_index()
+    print(f"ミラー「{local_mirror.name}」の全文検索用インデックスを作成しました: {len(index)}件, 語彙 {len(index.terms)}語")
+
+if __name__ == "__main__":
+    main()
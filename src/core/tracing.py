@@ -0,0 +1,161 @@
+"""
+検索ワークフローの処理区間（スパン）を記録するトレーシング。
+
+`with tracing.span("名前", 属性=値):` で囲んだ処理の所要時間と属性（課金バイト数・トークン数・行数など）を記録する。
+スパンの親子関係は contextvars で引き継ぐため、asyncio のタスクや asyncio.to_thread で実行した処理も
+呼び出し元のスパンの子になる（ThreadPoolExecutor に直接渡した処理は引き継がない）。
+
+最上位のスパンが終了すると、そのトレースを OpenTelemetry の OTLP/JSON 形式（Collectorのファイルエクスポーターと同じ形式）で
+outputs/traces/traces-YYYYMMDD.jsonl に1行として追記する。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = Path(__file__).resolve().parents[2] / "outputs" / "traces"
+SERVICE_NAME = "patentfinder"
+SCOPE_NAME = "core.tracing"
+
+STATUS_OK = "STATUS_CODE_OK"
+STATUS_ERROR = "STATUS_CODE_ERROR"
+
+@dataclass
+class Span:
+    """1つの処理区間"""
+    name: str
+    trace: "Trace"
+    span_id: str
+    parent_id: str = ""
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = STATUS_OK
+    status_message: str = ""
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        otlp = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        if self.status_message:
+            otlp["status"]["message"] = self.status_message
+        return otlp
+
+@dataclass
+class Trace:
+    """最上位のスパンと、その配下のスパンの集まり"""
+    trace_id: str
+    spans: List[Span] = field(default_factory=list)  # 終了した順
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def root(self) -> Optional[Span]:
+        return next((s for s in self.spans if not s.parent_id), None)
+
+    def to_otlp(self) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [s.to_otlp() for s in self.spans]}],
+        }]}
+
+    def to_frame(self) -> pd.DataFrame:
+        """スパンを開始順に並べた表（開始はトレース開始からの経過ms、名前は階層を表す記号付き）"""
+        root = self.root
+        if root is None:
+            return pd.DataFrame()
+        depth = {root.span_id: 0}
+        rows = []
+        for s in sorted(self.spans, key=lambda s: s.start_ns):
+            depth[s.span_id] = depth.get(s.parent_id, 0) + 1 if s.parent_id else 0
+            rows.append({
+                "スパン": ("　" * (depth[s.span_id] - 1) + "└ " if depth[s.span_id] else "") + s.name,
+                "開始 (ms)": round((s.start_ns - root.start_ns) / 1e6, 1),
+                "所要時間 (ms)": round(s.duration_ms, 1),
+                "属性": ", ".join(f"{k}={v}" for k, v in s.attributes.items()),
+                "エラー": s.status_message,
+            })
+        return pd.DataFrame(rows)
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}  # OTLP/JSON では64bit整数は文字列で表す
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def set_attributes(**attributes) -> None:
+    """実行中のスパンに属性を追加する（スパンの外では何もしない）"""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attributes(**attributes)
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    処理区間を記録する。例外が発生した場合はスパンをエラーとして記録し、例外はそのまま送出する。
+    最上位のスパンが終了すると、トレースをファイルに書き出す。
+    """
+    parent = _current_span.get()
+    trace = parent.trace if parent else Trace(os.urandom(16).hex())
+    current = Span(name, trace, os.urandom(8).hex(), parent.span_id if parent else "", attributes=dict(attributes))
+    token = _current_span.set(current)
+    current.start_ns = time.time_ns()
+    try:
+        yield current
+    except BaseException as e:
+        current.status, current.status_message = STATUS_ERROR, f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        with trace._lock:
+            trace.spans.append(current)
+        if parent is None:
+            export(trace)
+
+def export(trace: Trace, trace_dir: Path = None) -> None:
+    """トレースをOTLP/JSONの1行として追記する。書き出しに失敗しても処理は止めない。"""
+    trace_dir = Path(trace_dir or TRACE_DIR)
+    try:
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(trace.to_otlp(), ensure_ascii=False)
+        path = trace_dir / f"traces-{datetime.now().strftime('%Y%m%d')}.jsonl"
+        with _export_lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning("トレースの書き出しに失敗しました: %s", e)
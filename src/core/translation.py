@@ -0,0 +1,206 @@
+"""
+日本語キーワードを英語に翻訳する、用語集付きの翻訳レイヤー。
+
+特許の本文は英語のみの文献が多いため、日本語キーワードに英語の訳語を加えてから検索する。
+訳語はまずローカルの用語集（日本語 → 英語の訳語リスト）から引き、用語集にない語だけをまとめて1回のLLM呼び出しで翻訳する。
+LLMの訳語は用語集に書き戻すため、一度翻訳した語や、初期の用語集に含まれる一般的な語（逆浸透膜など）は通信なしで翻訳できる。
+
+用語集は、初期の用語集 (SEED_GLOSSARY) に outputs/glossary/ja_en.json の内容を重ねたもの。
+JSONファイルは手で編集してもよい（同じ語があればJSONの訳語が優先される）。
+"""
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .state import SearchConditions
+
+logger = logging.getLogger(__name__)
+
+GLOSSARY_PATH = Path(__file__).resolve().parents[2] / "outputs" / "glossary" / "ja_en.json"
+
+MAX_TRANSLATIONS = 3  # 1語あたりに加える訳語の数
+
+# 水処理・膜分離の調査でよく使う語の初期の用語集
+SEED_GLOSSARY: Dict[str, List[str]] = {
+    "逆浸透膜": ["reverse osmosis membrane", "RO membrane"],
+    "逆浸透": ["reverse osmosis"],
+    "RO膜": ["RO membrane", "reverse osmosis membrane"],
+    "正浸透": ["forward osmosis"],
+    "ナノろ過膜": ["nanofiltration membrane"],
+    "限外ろ過膜": ["ultrafiltration membrane"],
+    "精密ろ過膜": ["microfiltration membrane"],
+    "分離膜": ["separation membrane"],
+    "中空糸膜": ["hollow fiber membrane"],
+    "膜モジュール": ["membrane module"],
+    "膜ファウリング": ["membrane fouling"],
+    "ファウリング": ["fouling"],
+    "スケール": ["scale", "scaling"],
+    "ファウリング抑制": ["fouling prevention", "antifouling"],
+    "海水淡水化": ["seawater desalination", "desalination"],
+    "淡水化": ["desalination"],
+    "水処理": ["water treatment"],
+    "排水処理": ["wastewater treatment"],
+    "浄水": ["water purification"],
+    "純水": ["pure water"],
+    "超純水": ["ultrapure water"],
+    "透過水": ["permeate"],
+    "濃縮水": ["concentrate", "brine"],
+    "供給水": ["feed water"],
+    "洗浄": ["cleaning", "washing"],
+    "薬品洗浄": ["chemical cleaning"],
+    "逆洗": ["backwash"],
+    "前処理": ["pretreatment"],
+    "阻止率": ["rejection rate"],
+    "透過流束": ["permeate flux", "flux"],
+    "回収率": ["recovery rate"],
+    "運転条件": ["operating condition"],
+    "運転最適化": ["operation optimization"],
+    "最適化": ["optimization"],
+    "機械学習": ["machine learning"],
+    "深層学習": ["deep learning"],
+    "ニューラルネットワーク": ["neural network"],
+    "人工知能": ["artificial intelligence"],
+    "予測": ["prediction", "forecast"],
+    "異常検知": ["anomaly detection"],
+    "センサ": ["sensor"],
+    "制御": ["control"],
+    "監視": ["monitoring"],
+    "シミュレーション": ["simulation"],
+}
+
+# ひらがな・カタカナ・漢字（CJK統合漢字）を含む語を翻訳の対象とする
+_JAPANESE_CHARS = re.compile(r"[぀-ヿ㐀-䶿一-鿿]")
+
+def normalize_term(term: str) -> str:
+    """用語集のキーにする形へ正規化する（全角英数字を半角に揃え、前後の空白を除く）"""
+    return unicodedata.normalize("NFKC", term).strip()
+
+def needs_translation(term: str) -> bool:
+    return bool(_JAPANESE_CHARS.search(term))
+
+class Glossary:
+    """日本語 → 英語の訳語リストの用語集。追加した訳語はJSONファイルに保存する。"""
+
+    def __init__(self, path: Path = None, seed: Dict[str, List[str]] = None):
+        self.path = Path(path or GLOSSARY_PATH)
+        self._lock = threading.Lock()
+        self._terms = {normalize_term(k): list(v) for k, v in (SEED_GLOSSARY if seed is None else seed).items()}
+        self._learned = self._load()
+        self._terms.update(self._learned)
+
+    def _load(self) -> Dict[str, List[str]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("用語集の読み込みに失敗しました: %s", e)
+            return {}
+        return {normalize_term(k): [str(t) for t in v] for k, v in data.items() if isinstance(v, list)}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def lookup(self, term: str):
+        """訳語のリストを返す。用語集にない語はNone。"""
+        with self._lock:
+            return self._terms.get(normalize_term(term))
+
+    def add(self, translations: Dict[str, List[str]]) -> None:
+        """訳語を用語集に追加し、ファイルに保存する。保存に失敗しても、このプロセスの用語集には残る。"""
+        translations = {normalize_term(k): list(v) for k, v in translations.items() if v}
+        if not translations:
+            return
+        with self._lock:
+            self._terms.update(translations)
+            self._learned.update(translations)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix(".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._learned, f, ensure_ascii=False, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning("用語集の保存に失敗しました: %s", e)
+
+_glossary = None
+_glossary_lock = threading.Lock()
+
+def get_glossary() -> Glossary:
+    """プロセス内で共有する用語集を返す"""
+    global _glossary
+    with _glossary_lock:
+        if _glossary is None:
+            _glossary = Glossary()
+        return _glossary
+
+@dataclass
+class TranslationResult:
+    """翻訳の結果と、用語集・LLMのどちらで翻訳したかの内訳"""
+    translations: Dict[str, List[str]] = field(default_factory=dict)
+    glossary_hits: int = 0
+    requested: List[str] = field(default_factory=list)  # LLMに翻訳を依頼した語
+    failed: List[str] = field(default_factory=list)     # 訳語が得られなかった語
+
+def translate_keywords(keywords: List[str], request: Callable[[List[str]], Dict[str, List[str]]],
+                       glossary: Glossary = None, refresh: bool = False) -> TranslationResult:
+    """
+    日本語キーワードの訳語を求める。英語など日本語を含まない語は翻訳しない。
+
+    :param request: 用語集にない語のリストを受け取り、{日本語: [英語, ...]} を返す関数。1回の翻訳につき最大1回だけ呼ぶ。
+    :param refresh: True なら用語集を使わずに全ての語を翻訳し直し、用語集の訳語を上書きする
+    """
+    glossary = glossary or get_glossary()
+    result = TranslationResult()
+    unknown = []
+    for keyword in dict.fromkeys(normalize_term(k) for k in keywords):
+        if not keyword or not needs_translation(keyword):
+            continue
+        known = None if refresh else glossary.lookup(keyword)
+        if known is None:
+            unknown.append(keyword)
+        else:
+            result.translations[keyword] = known
+            result.glossary_hits += 1
+
+    if unknown:
+        result.requested = unknown
+        answered = {normalize_term(k): [str(t).strip() for t in v if str(t).strip()][:MAX_TRANSLATIONS]
+                    for k, v in (request(unknown) or {}).items() if isinstance(v, list)}
+        learned = {k: answered[k] for k in unknown if answered.get(k)}
+        glossary.add(learned)
+        result.translations.update(learned)
+        result.failed = [k for k in unknown if k not in learned]
+    return result
+
+def _with_translations(keywords: List[str], translations: Dict[str, List[str]]) -> List[str]:
+    """元のキーワードの後ろに訳語を加える（重複は除く）"""
+    expanded = list(keywords)
+    seen = {k.lower() for k in expanded}
+    for keyword in keywords:
+        for term in translations.get(normalize_term(keyword), [])[:MAX_TRANSLATIONS]:
+            if term.lower() not in seen:
+                seen.add(term.lower())
+                expanded.append(term)
+    return expanded
+
+def translate_conditions(conditions: SearchConditions, request: Callable[[List[str]], Dict[str, List[str]]],
+                         glossary: Glossary = None, refresh: bool = False):
+    """
+    主語・述語のキーワードに英語の訳語を加えた検索条件のコピーと、TranslationResult を返す。
+    元の検索条件は変更しない。
+    """
+    result = translate_keywords(conditions.subject_keywords + conditions.predicate_keywords, request, glossary, refresh)
+    translated = replace(
+        conditions,
+        subject_keywords=_with_translations(conditions.subject_keywords, result.translations),
+        predicate_keywords=_with_translations(conditions.predicate_keywords, result.translations),
+    )
+    return translated, result
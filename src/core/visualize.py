@@ -9,16 +9,16 @@ def plot_publication_trend(df: pd.DataFrame) -> go.Figure:
     if df.empty or 'publication_date' not in df.columns:
         return go.Figure().update_layout(title="データがありません")
 
-    # 日付をdatetime型に変換し、年を抽出
-    df['year'] = pd.to_datetime(df['publication_date'], format='%Y%m%d').dt.year
+    # publication_dateはYYYYMMDD形式の整数のため、日付型への変換はせず整数演算で年を抽出する
+    # (元のDataFrameに列を追加しないよう、Seriesのまま集計する)
+    years = df['publication_date'].dropna().astype('int64') // 10000
     
     # 年ごとの件数を集計
-    trend_data = df['year'].value_counts().sort_index()
+    trend_data = years.value_counts().sort_index()
     
     fig = px.bar(
-        trend_data,
-        x=trend_data.index,
-        y=trend_data.values,
+        x=trend_data.index.to_numpy(),
+        y=trend_data.to_numpy(),
         labels={'x': '公開年', 'y': '出願件数'},
         title='出願年次推移'
     )
@@ -41,9 +41,8 @@ def plot_assignee_ranking(df: pd.DataFrame, top_n: int = 10) -> go.Figure:
     assignee_counts = df['assignee'].dropna().value_counts().nlargest(top_n)
     
     fig = px.bar(
-        assignee_counts,
-        x=assignee_counts.values,
-        y=assignee_counts.index,
+        x=assignee_counts.to_numpy(),
+        y=assignee_counts.index.to_numpy(),
         orientation='h',
         labels={'x': '出願件数', 'y': '出願人'},
         title=f'出願人ランキング TOP {top_n}'
@@ -0,0 +1,80 @@
+import math
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pandas as pd
+import streamlit as st
+
+from core import result_store
+
+# 一覧に表示する列（要約などの長い本文は、行を選択したときにだけ読み込む）
+GRID_COLUMNS = ["publication_number", "title", "assignee", "publication_date", "similarity", "sim_title", "sim_abstract"]
+DETAIL_COLUMNS = ["title", "abstract", "assignee", "publication_date", "ipc_codes"]
+PAGE_SIZES = [20, 50, 100]
+
+COLUMN_CONFIG = {
+    "rank": st.column_config.NumberColumn("順位", width="small"),
+    "publication_number": st.column_config.TextColumn("公開番号"),
+    "title": st.column_config.TextColumn("タイトル", width="large"),
+    "assignee": st.column_config.TextColumn("出願人"),
+    "publication_date": st.column_config.DateColumn("公開日", format="YYYY-MM-DD"),
+    "similarity": st.column_config.NumberColumn("類似度", format="percent"),
+    "sim_title": st.column_config.NumberColumn("類似度 (タイトル)", format="percent"),
+    "sim_abstract": st.column_config.NumberColumn("類似度 (要約)", format="percent"),
+}
+
+def format_page(table: pa.Table, offset: int) -> pd.DataFrame:
+    """
+    1ページ分のテーブルを表示用のDataFrameにする。
+    変換は列単位のArrowの演算で行い、数値の表示形式は列設定でブラウザ側に任せる（行ごとの文字列変換はしない）。
+    """
+    if "publication_date" in table.column_names:
+        # YYYYMMDD形式の整数を日付型にする
+        dates = pc.cast(pc.cast(table["publication_date"], pa.int64()), pa.string())
+        dates = pc.cast(pc.strptime(dates, format="%Y%m%d", unit="s", error_is_null=True), pa.date32())
+        table = table.set_column(table.column_names.index("publication_date"), "publication_date", dates)
+    table = table.add_column(0, "rank", pa.array(range(offset + 1, offset + table.num_rows + 1), pa.int32()))
+    return table.to_pandas()
+
+def _show_detail(store: result_store.ResultStore, handle: result_store.ResultHandle, row: int) -> None:
+    """選択した1行の本文を読み込んで表示する"""
+    detail = store.read(handle, [c for c in DETAIL_COLUMNS if c in handle.columns], offset=row, length=1).iloc[0]
+    with st.container(border=True):
+        st.markdown(f"**{detail.get('title', '')}**")
+        if "abstract" in detail:
+            st.write(detail["abstract"])
+        if "ipc_codes" in detail and detail["ipc_codes"] is not None:
+            codes = detail["ipc_codes"]
+            st.caption("IPC: " + (codes if isinstance(codes, str) else ", ".join(codes)))
+
+def show(handle: result_store.ResultHandle, key: str = "results_grid") -> None:
+    """
+    保存済みの検索結果をページ単位で表示する。
+    読み込むのは表示中のページの行と一覧の列だけのため、描画時間とブラウザへの送信量は結果の件数によらない。
+    """
+    store = result_store.get_result_store()
+    size_col, page_col, info_col = st.columns([1, 1, 2])
+    page_size = size_col.selectbox("表示件数", PAGE_SIZES, key=f"{key}_page_size")
+    n_pages = max(1, math.ceil(len(handle) / page_size))
+    # 件数や表示件数が変わってページ数が減った場合は、範囲内に収める
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        st.session_state[f"{key}_page"] = n_pages
+    page = page_col.number_input(f"ページ (全{n_pages})", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+
+    offset = (page - 1) * page_size
+    table = store.read_table(handle, [c for c in GRID_COLUMNS if c in handle.columns]).slice(offset, page_size)
+    info_col.caption(f"{len(handle)}件中 {offset + 1}〜{offset + table.num_rows}件目")
+
+    event = st.dataframe(
+        format_page(table, offset),
+        hide_index=True,
+        column_config=COLUMN_CONFIG,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"{key}_table_{page}_{page_size}",  # ページを移動したら選択を解除する
+    )
+    selected = event.selection.rows
+    if selected:
+        _show_detail(store, handle, offset + selected[0])
+    else:
+        st.caption("行を選択すると要約を表示します。")
@@ -1,9 +1,12 @@
 import streamlit as st
 from core.state import AppState
-from core import agent, visualize
-from datetime import date, timedelta
+from core import agent, visualize, bq_client, ranking, result_store
+from ui.components import results_grid
+from datetime import date, datetime, timedelta
 import pandas as pd
 
+GB = 1024 ** 3
+
 def show(app_state: AppState):
     """メイン画面の3カラムレイアウトを表示する"""
 
@@ -27,6 +30,13 @@ def show(app_state: AppState):
             st.session_state.app_state = agent.run_initial_interaction(app_state)
             st.rerun()
 
+        stats = app_state.llm_cache_stats
+        if stats.get("hits"):
+            st.caption(
+                f"AI応答キャッシュ: {stats['hits']}/{stats['hits'] + stats.get('misses', 0)}回ヒット "
+                f"(待ち時間を約{stats['saved_seconds']:.0f}秒短縮)"
+            )
+
     # --- 中央カラム: 検索条件 ---
     with col2:
         st.header("2. 検索条件")
@@ -36,10 +46,14 @@ def show(app_state: AppState):
                 st.markdown("**調査テーマの絞り込み**")
                 st.write("ご関心に最も近い調査テーマを選択してください。")
                 selected_plan = st.radio("調査テーマ候補:", options=app_state.proposed_plans, label_visibility="collapsed")
-                if st.button("このテーマで進める", type="primary"):
+                select_col, refresh_col = st.columns(2)
+                if select_col.button("このテーマで進める", type="primary"):
                     app_state.plan_text = selected_plan
                     st.session_state.app_state = agent.suggest_search_terms(app_state)
                     st.rerun()
+                if refresh_col.button("候補を作り直す", help="保存済みの応答を使わずに、AIにテーマ候補を再生成させます。"):
+                    st.session_state.app_state = agent.run_initial_interaction(app_state, force_refresh=True)
+                    st.rerun()
 
         if app_state.terms_suggested:
             st.info(f"""**確定した調査テーマ:**
@@ -47,6 +61,14 @@ def show(app_state: AppState):
 {app_state.plan_text}""")
             
             with st.expander("詳細検索条件", expanded=True):
+                app_state.search_strategy = st.radio(
+                    "検索方式",
+                    options=list(agent.SEARCH_STRATEGIES),
+                    index=list(agent.SEARCH_STRATEGIES).index(app_state.search_strategy),
+                    format_func=agent.SEARCH_STRATEGIES.get,
+                    horizontal=True,
+                    help="意味検索は、これまでの検索で計算したEmbeddingのインデックスから、調査テーマに近い特許をキーワードやIPCによらずに探します。"
+                )
                 today = date.today()
                 five_years_ago = today - timedelta(days=5*365)
                 app_state.search_conditions.start_date = st.date_input("From", value=five_years_ago)
@@ -54,6 +76,11 @@ def show(app_state: AppState):
                 app_state.search_conditions.countries = st.multiselect("対象国", options=['US', 'JP', 'EP', 'WO', 'CN'], default=['US', 'JP', 'EP', 'WO', 'CN'])
                 app_state.search_conditions.limit = st.number_input("取得件数", min_value=10, max_value=500, value=100, step=10)
 
+            with st.expander("BigQueryのコスト上限"):
+                app_state.query_budget_bytes = int(st.number_input("1回あたりのスキャン上限 (GB)", min_value=1, value=app_state.query_budget_bytes // GB, step=100) * GB)
+                app_state.session_budget_bytes = int(st.number_input("セッション全体の課金上限 (GB)", min_value=1, value=app_state.session_budget_bytes // GB, step=100) * GB)
+                st.caption(f"このセッションの課金済みスキャン量: {bq_client.format_bytes(app_state.session_bytes_billed)}")
+
             tab1, tab2 = st.tabs(["検索ターム", "生成されたSQL"])
             with tab1:
                 st.subheader("主語")
@@ -62,15 +89,37 @@ def show(app_state: AppState):
                 st.subheader("述語")
                 app_state.search_conditions.predicate_keywords = st.multiselect("キーワード（述語）", options=list(set(app_state.search_conditions.predicate_keywords)), default=app_state.search_conditions.predicate_keywords)
                 app_state.search_conditions.predicate_ipc = st.multiselect("IPC（述語）", options=list(set(app_state.search_conditions.predicate_ipc)), default=app_state.search_conditions.predicate_ipc)
+                if st.button("検索タームを作り直す", help="保存済みの応答を使わずに、AIに検索タームを再提案させます。"):
+                    st.session_state.app_state = agent.suggest_search_terms(app_state, force_refresh=True)
+                    st.rerun()
+                app_state.refresh_translations = st.checkbox(
+                    "次の検索で英語の訳語を作り直す",
+                    value=app_state.refresh_translations,
+                    help="用語集と保存済みの応答を使わずに、日本語キーワードをAIに翻訳し直させます（用語集の訳語も更新されます）。"
+                )
             with tab2:
                 with st.expander("生成されたSQLクエリを見る"):
                     st.code(app_state.generated_sql or "検索実行時に生成されます。", language="sql")
+                if app_state.sql_explanation:
+                    with st.expander("検索条件の最適化"):
+                        st.text(app_state.sql_explanation)
         
         if app_state.terms_suggested:
             if st.button("検索実行", type="primary", use_container_width=True):
                 st.session_state.app_state = agent.run_search(app_state)
                 st.rerun()
 
+            if app_state.cost_confirmation_message:
+                st.warning(app_state.cost_confirmation_message)
+                confirm_col, cancel_col = st.columns(2)
+                if confirm_col.button("上限を超えて実行する", use_container_width=True):
+                    app_state.confirmed_bytes = app_state.estimated_bytes
+                    st.session_state.app_state = agent.run_search(app_state)
+                    st.rerun()
+                if cancel_col.button("キャンセル", use_container_width=True):
+                    app_state.cost_confirmation_message = ""
+                    st.rerun()
+
     # --- 右カラム: 結果と分析 ---
     with col3:
         st.header("3. 結果と分析")
@@ -78,23 +127,49 @@ def show(app_state: AppState):
         if app_state.error_message:
             st.error(app_state.error_message)
 
+        # 検索結果はディスクに保存されており、表示のたびに必要な列だけをメモリマップで読み込む
+        store = result_store.get_result_store()
+        handle = app_state.result_handle
+        if handle is not None and not store.exists(handle):
+            st.warning("検索結果の保存期間が過ぎました。もう一度検索を実行してください。")
+            app_state.result_handle = handle = None
+
         tab1, tab2, tab3 = st.tabs(["検索結果", "分析", "レポート"])
         with tab1:
-            if not app_state.search_results.empty:
-                display_df = app_state.search_results.copy()
-                if 'similarity' in display_df.columns:
-                    display_df['similarity'] = display_df['similarity'].map(lambda x: f"{x:.1%}")
-                st.dataframe(display_df)
+            if handle is not None and len(handle):
+                if all(ranking.section_column(section) in handle.columns for section in agent.SIMILARITY_SECTIONS):
+                    with st.expander("類似度の重み"):
+                        weight_cols = st.columns(len(agent.SIMILARITY_SECTIONS))
+                        weights = {
+                            section: col.slider(label, 0.0, 1.0, float(app_state.similarity_weights.get(section, 0.0)), 0.05, key=f"weight_{section}")
+                            for (section, label), col in zip(agent.SIMILARITY_SECTIONS.items(), weight_cols)
+                        }
+                        st.caption("重みを変えると、保存済みのセクション別類似度から並べ替えます（再検索やEmbeddingの再計算はしません）。")
+                    if weights != app_state.similarity_weights:
+                        app_state.similarity_weights = weights
+                        st.session_state.app_state = agent.rescore_results(app_state)
+                        handle = app_state.result_handle
+                        st.session_state["results_grid_page"] = 1
+                results_grid.show(handle)
             else:
                 st.info("まだ検索は実行されていません。")
         with tab2:
-            if not app_state.search_results.empty:
-                st.plotly_chart(visualize.plot_publication_trend(app_state.search_results), use_container_width=True)
-                st.plotly_chart(visualize.plot_assignee_ranking(app_state.search_results), use_container_width=True)
+            if handle is not None and len(handle):
+                chart_df = store.read(handle, columns=[c for c in ("publication_date", "assignee") if c in handle.columns])
+                st.plotly_chart(visualize.plot_publication_trend(chart_df), use_container_width=True)
+                st.plotly_chart(visualize.plot_assignee_ranking(chart_df), use_container_width=True)
             else:
                 st.info("グラフを表示するには、まず検索を実行してください。")
         with tab3:
             st.text_area("生成されたレポート", "ここにAIによるサマリーが表示されます。", height=300)
             st.download_button("レポートをダウンロード", "dummy text", "report.md")
 
+        if app_state.recent_traces:
+            with st.expander(f"処理時間の内訳 (直近{len(app_state.recent_traces)}回の検索)"):
+                for trace in reversed(app_state.recent_traces):
+                    root = trace.root
+                    started = datetime.fromtimestamp(root.start_ns / 1e9).strftime("%H:%M:%S")
+                    st.markdown(f"**{started}** 全体 {root.duration_ms / 1000:.1f}秒" + (" (エラー)" if root.status_message else ""))
+                    st.dataframe(trace.to_frame(), hide_index=True)
+
 
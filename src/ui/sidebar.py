@@ -41,5 +41,14 @@ def show():
                 else:
                     st.error("両方のキーを入力してください。")
 
+        st.header("検索テーブル設定")
+        with st.expander("検索用テーブルを指定"):
+            st.session_state["search_table"] = st.text_input(
+                "検索用テーブルID",
+                value=st.session_state.get("search_table", ""),
+                placeholder="project.dataset.publications_search",
+                help="`python -m core.search_table` で作成した検索用テーブルを指定すると、公開特許テーブルの代わりに検索対象とします。空欄なら公開特許テーブルを検索します。"
+            ).strip()
+
 
 
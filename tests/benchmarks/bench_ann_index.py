@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+近似最近傍インデックス（src.core.ann_index）のベンチマーク。
+
+クラスタ構造を持つ合成ベクトルを一時ディレクトリのインデックスへ登録し、
+追加・学習の所要時間と、上位k件検索のレイテンシ・全件厳密検索に対する再現率を計測する。
+
+    python tests/benchmarks/bench_ann_index.py --vectors 100000 1000000 --dim 256
+"""
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import project_root, summarize  # noqa: F401  (src をインポート可能にする)
+
+import numpy as np
+
+from src.core import ann_index
+from src.core.ranking import normalize_rows, top_k_indices
+
+INSERT_BATCH = 100_000
+
+def make_vectors(rng: np.random.Generator, centers: np.ndarray, n: int) -> np.ndarray:
+    """いずれかの中心の近くに分布するベクトルを作成する"""
+    return centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, centers.shape[1]), dtype=np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, nargs="+", default=[100_000], help="登録するベクトル数")
+    parser.add_argument("--dim", type=int, default=1536, help="ベクトルの次元数")
+    parser.add_argument("--queries", type=int, default=50, help="検索するクエリ数")
+    parser.add_argument("--top-k", type=int, default=100, help="検索する上位件数")
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[8, 16, 32], help="走査するリスト数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((1000, args.dim), dtype=np.float32)
+    for n in args.vectors:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = ann_index.AnnIndex(Path(tmp) / "bench")
+            vectors = make_vectors(rng, centers, n)
+
+            start = time.perf_counter()
+            for s in range(0, n, INSERT_BATCH):
+                index.insert([f"US-{i:010d}-A" for i in range(s, min(s + INSERT_BATCH, n))], vectors[s:s + INSERT_BATCH])
+            insert_s = time.perf_counter() - start
+            index.wait_for_reorganization()
+            start = time.perf_counter()
+            index.train()
+            train_s = time.perf_counter() - start
+            print(f"\n{n}件 (次元 {args.dim}): 追加 {insert_s:.1f}秒, 学習・整列 {train_s:.1f}秒, リスト数 {index.meta.n_lists}")
+
+            normalized = normalize_rows(vectors)
+            queries = make_vectors(rng, centers, args.queries)
+            for n_probe in args.n_probe:
+                timings, recalls = [], []
+                for q in queries:
+                    start = time.perf_counter()
+                    ids, _ = index.search(q, args.top_k, n_probe=n_probe)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    exact = top_k_indices(normalized @ normalize_rows(q)[0], args.top_k)
+                    recalls.append(len(set(ids) & {f"US-{i:010d}-A" for i in exact}) / args.top_k)
+                summarize(f"n_probe={n_probe:<3} recall@{args.top_k}={np.mean(recalls):.3f}", timings)
+
+if __name__ == "__main__":
+    main()
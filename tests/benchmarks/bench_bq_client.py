@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+BigQueryクライアント再利用のベンチマーク。
+
+クエリごとにCredentialsとClientを作り直す従来の方式と、
+bq_client.get_client によるレジストリ経由の方式とで、1クエリあたりの所要時間を比較する。
+tests/config.json に記載したサービスアカウントで、実際のBigQueryに `SELECT 1` を発行する。
+
+    python tests/benchmarks/bench_bq_client.py --runs 20
+"""
+import time
+import argparse
+import statistics
+
+from common import load_credentials, summarize
+
+from google.cloud import bigquery
+from google.oauth2 import service_account
+from src.core import bq_client
+
+BENCH_SQL = "SELECT 1 AS x"
+
+def run_fresh_client(credentials_info: dict) -> None:
+    """変更前の方式: 毎回CredentialsとClientを生成する"""
+    credentials = service_account.Credentials.from_service_account_info(credentials_info)
+    client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+    client.query(BENCH_SQL).result()
+    client.close()
+
+def run_registry_client(credentials_info: dict) -> None:
+    """変更後の方式: レジストリからClientを取得する"""
+    client = bq_client.get_client(credentials_info)
+    client.query(BENCH_SQL).result()
+
+def measure(func, credentials_info: dict, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(credentials_info)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="各方式で実行するクエリ数")
+    args = parser.parse_args()
+
+    credentials_info = load_credentials()
+
+    # ウォームアップ（DNS解決などの一度きりのコストを除外する）
+    run_fresh_client(credentials_info)
+
+    fresh = measure(run_fresh_client, credentials_info, args.runs)
+    pooled = measure(run_registry_client, credentials_info, args.runs)
+    bq_client.close_all_clients()
+
+    print(f"--- {args.runs}クエリあたりの所要時間 ({BENCH_SQL}) ---")
+    summarize("before", fresh)
+    summarize("after", pooled)
+    saved = statistics.median(fresh) - statistics.median(pooled)
+    print(f"1クエリあたりのオーバーヘッド削減 (median): {saved:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+IPC条件の評価コストのベンチマーク。
+
+指定するIPCコードの数を増やしながら、1行あたりの評価コストを次の4通りで比較する。
+  - legacy SQL : コードごとに EXISTS (SELECT 1 FROM UNNEST(ipc) ... LIKE) を並べる従来のSQL（DuckDB）
+  - single SQL : 配列パラメータと1回のUNNESTで全プレフィックスと照合するSQL（DuckDB）
+  - arrow scan : 全コードに対するArrowの starts_with
+  - ipc index  : ソート済み配列の二分探索（src.core.ipc_index）
+BigQueryには接続せず、合成データを用いる。
+
+    python tests/benchmarks/bench_ipc_index.py --rows 200000 --codes 1 2 5 10 20
+"""
+import time
+import random
+import argparse
+import tempfile
+
+from common import project_root  # noqa: F401  (src をインポート可能にする)
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.core.ipc_index import build_ipc_index
+
+SECTIONS = ["A61K", "B01D", "B32B", "C08L", "G01N", "G05B", "G06F", "H01L", "H01M", "H04N"]
+
+def make_ipc_column(rows: int, seed: int = 0) -> pa.Array:
+    """1文献あたり1〜6個のIPCコードを持つリスト列を作成する"""
+    rng = random.Random(seed)
+    return pa.array([
+        [f"{rng.choice(SECTIONS)}{rng.randrange(1, 100)}/{rng.randrange(0, 100):02d}" for _ in range(rng.randint(1, 6))]
+        for _ in range(rows)
+    ], type=pa.list_(pa.string()))
+
+def make_prefixes(n: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [f"{rng.choice(SECTIONS)}{rng.randrange(1, 100)}" for _ in range(n)]
+
+def legacy_sql(n: int) -> str:
+    conds = [f"EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS ipc(code) WHERE ipc.code LIKE $c{i})" for i in range(n)]
+    return f"SELECT count(*) FROM patents p WHERE ({' OR '.join(conds)})"
+
+SINGLE_SQL = ("SELECT count(*) FROM patents p WHERE EXISTS (SELECT 1 FROM UNNEST(p.ipc) AS ipc(code), "
+              "UNNEST($prefixes) AS pre(prefix) WHERE starts_with(ipc.code, pre.prefix))")
+
+def best_ms(func, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="文献数")
+    parser.add_argument("--codes", type=int, nargs="+", default=[1, 2, 5, 10, 20], help="指定するIPCコードの数")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数")
+    args = parser.parse_args()
+
+    ipc_column = make_ipc_column(args.rows)
+    con = duckdb.connect()
+    con.register("ipc_source", pa.table({"ipc": ipc_column}))
+    con.execute("CREATE TABLE patents AS SELECT * FROM ipc_source")
+    flat = pc.list_flatten(ipc_column)
+    parents = pc.list_parent_indices(ipc_column).to_numpy()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = build_ipc_index(ipc_column, tmp)
+        print(f"{args.rows}件 / IPCコード {len(index)}件 (1行あたりのコスト, ns/row)")
+        print(f"{'codes':>6} {'legacy SQL':>11} {'single SQL':>11} {'arrow scan':>11} {'ipc index':>10} {'matched':>9}")
+        for n in args.codes:
+            prefixes = make_prefixes(n)
+            legacy_ms, legacy_count = best_ms(
+                lambda: con.execute(legacy_sql(n), {f"c{i}": f"{p}%" for i, p in enumerate(prefixes)}).fetchone()[0], args.repeat)
+            single_ms, single_count = best_ms(
+                lambda: con.execute(SINGLE_SQL, {"prefixes": prefixes}).fetchone()[0], args.repeat)
+
+            def arrow_scan():
+                matched = np.zeros(len(flat), dtype=bool)
+                for p in prefixes:
+                    matched |= pc.starts_with(flat, p).to_numpy(zero_copy_only=False)
+                return len(np.unique(parents[matched]))
+            scan_ms, scan_count = best_ms(arrow_scan, args.repeat)
+            index_ms, index_docs = best_ms(lambda: index.prefix_docs(prefixes), args.repeat)
+
+            assert legacy_count == single_count == scan_count == len(index_docs)
+            per_row = [ms * 1e6 / args.rows for ms in (legacy_ms, single_ms, scan_ms, index_ms)]
+            print(f"{n:>6} " + " ".join(f"{v:>11.1f}" for v in per_row[:3]) + f" {per_row[3]:>10.2f} {len(index_docs):>9}")
+
+if __name__ == "__main__":
+    main()
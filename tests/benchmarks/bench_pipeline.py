@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+検索パイプラインのベンチマーク。
+
+従来の逐次処理（ページを受け取るたびに調査テーマ・文献のEmbeddingを待ってから次のページを取得）と、
+取得・Embeddingを重ねて実行する非同期パイプライン（src.core.pipeline）とを比較する。
+BigQuery・OpenAIには接続せず、ページの取得とEmbeddingの待ち時間を sleep で模擬する。
+
+    python tests/benchmarks/bench_pipeline.py --pages 1 4 10 --fetch-ms 300 --embed-ms 200
+"""
+import time
+import argparse
+
+from common import project_root, summarize  # noqa: F401  (src をインポート可能にする)
+
+import numpy as np
+import pandas as pd
+
+from src.core import pipeline, ranking
+from src.core.embeddings import build_section_texts
+
+DIM = 256
+PAGE_ROWS = 100
+
+def make_pages(n_pages: int, fetch_ms: float):
+    for i in range(n_pages):
+        time.sleep(fetch_ms / 1000)
+        yield pd.DataFrame({
+            "title": [f"title {i}-{j}" for j in range(PAGE_ROWS)],
+            "abstract": ["abstract"] * PAGE_ROWS,
+        })
+
+def make_embed(embed_ms: float):
+    rng = np.random.default_rng(0)
+    def embed(texts):
+        time.sleep(embed_ms / 1000)
+        return list(rng.standard_normal((len(texts), DIM), dtype=np.float32))
+    return embed
+
+def sequential(n_pages: int, fetch_ms: float, embed_ms: float) -> None:
+    """変更前の処理: ページの取得・調査テーマのEmbedding・文献のEmbeddingを順に待つ"""
+    embed = make_embed(embed_ms)
+    query_vectors = None
+    for page_df in make_pages(n_pages, fetch_ms):
+        if query_vectors is None:
+            query_vectors = embed(["plan"])
+        texts = (page_df['title'] + ' ' + page_df['abstract']).tolist()
+        page_df['similarity'] = ranking.cosine_scores(query_vectors, ranking.normalize_rows(embed(texts)))
+
+def pipelined(n_pages: int, fetch_ms: float, embed_ms: float) -> pipeline.PipelineResult:
+    """変更後の処理: 検索と同じく、タイトル・要約をセクション別にEmbeddingして重み付きで類似度を計算する"""
+    return pipeline.run(make_pages(n_pages, fetch_ms), "plan", make_embed(embed_ms), build_section_texts,
+                        weights=ranking.DEFAULT_SECTION_WEIGHTS)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--fetch-ms", type=float, default=300)
+    parser.add_argument("--embed-ms", type=float, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for n_pages in args.pages:
+        print(f"--- {n_pages}ページ (取得 {args.fetch_ms:.0f}ms/ページ, Embedding {args.embed_ms:.0f}ms/回) ---")
+        seq_times, pipe_times = [], []
+        result = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            sequential(n_pages, args.fetch_ms, args.embed_ms)
+            seq_times.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            result = pipelined(n_pages, args.fetch_ms, args.embed_ms)
+            pipe_times.append((time.perf_counter() - start) * 1000)
+        summarize("sequential", seq_times)
+        summarize("pipeline", pipe_times)
+        critical = (result.timings["fetch_end"] + result.timings["last_embedding"]) * 1000
+        print(f"クリティカルパス (取得完了 + 最後のEmbedding): {critical:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+類似度ランキングのベンチマーク。
+
+従来の処理（Pythonのリストのベクトルからfloat64の配列を作り、コサイン類似度を計算してDataFrame全体をソート）と、
+検索で使う src.core.ranking の処理（セクション別の正規化済みfloat32行列に対する score_sections と、
+argpartitionによる上位k件抽出 top_k_indices）とを比較する。
+OpenAIのAPIには接続せず、乱数のベクトルを用いる。
+
+    python tests/benchmarks/bench_ranking.py --docs 100 1000 10000 100000
+"""
+import time
+import argparse
+
+from common import project_root  # noqa: F401  (src をインポート可能にする)
+
+import numpy as np
+import pandas as pd
+
+from src.core import ranking
+
+DIM = 1536  # text-embedding-3-small の次元数
+
+SECTIONS = tuple(ranking.DEFAULT_SECTION_WEIGHTS)
+
+def legacy_rank(query_list: list, doc_lists: list, df: pd.DataFrame) -> pd.DataFrame:
+    """変更前の処理: Pythonのリストから配列を作り、全件の類似度を計算してDataFrame全体をソートする"""
+    query = np.asarray(query_list, dtype=np.float64)
+    docs = np.asarray(doc_lists, dtype=np.float64)
+    query /= np.linalg.norm(query)
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    df = df.copy()
+    df['similarity'] = docs @ query
+    return df.sort_values(by='similarity', ascending=False)
+
+def time_ms(func, repeat: int) -> float:
+    """repeat回実行したうちの最短時間(ms)を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="文書数")
+    parser.add_argument("--top-k", type=int, default=100, help="抽出する上位件数")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数")
+    parser.add_argument("--legacy-max-docs", type=int, default=20000,
+                        help="従来処理を計測する文書数の上限（Pythonのリストは1件あたり約50KBのメモリを使う）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query_vectors = rng.standard_normal((1, DIM), dtype=np.float32)
+    print(f"{'docs':>8} {'legacy ms':>10} {'score ms':>10} {'top-k ms':>10} {'full ms':>10}")
+    for n_docs in args.docs:
+        section_matrices = {name: ranking.normalize_rows(rng.standard_normal((n_docs, DIM), dtype=np.float32))
+                            for name in SECTIONS}
+        present = {name: np.ones(n_docs, dtype=bool) for name in SECTIONS}
+        df = pd.DataFrame({"publication_number": [f"JP-{i:07d}-A" for i in range(n_docs)]})
+        legacy = "-"
+        if n_docs <= args.legacy_max_docs:
+            doc_lists = section_matrices[SECTIONS[0]].tolist()
+            query_list = query_vectors[0].tolist()
+            legacy = f"{time_ms(lambda: legacy_rank(query_list, doc_lists, df), args.repeat):.1f}"
+
+        def score():
+            return ranking.score_sections(query_vectors, section_matrices, present, ranking.DEFAULT_SECTION_WEIGHTS)[0]
+
+        score_ms = time_ms(score, args.repeat)
+        top_k_ms = time_ms(lambda: ranking.top_k_indices(score(), args.top_k), args.repeat)
+        scores = score()
+        full_ms = time_ms(lambda: df.take(ranking.top_k_indices(scores, len(scores))), args.repeat)
+        print(f"{n_docs:>8} {legacy:>10} {score_ms:>10.1f} {top_k_ms:>10.1f} {full_ms:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+ページストリーミング取得のベンチマーク。
+
+同じ検索クエリについて、全件をDataFrameで受け取る execute_query と、
+ページ単位で受け取る iter_query_pages とで、最初の結果が得られるまでの時間（time-to-first-result）
+と全件取得までの時間を比較する。ローカルの結果キャッシュは使わないが、BigQuery側のキャッシュは
+無効化しないため、2回目以降はダウンロード時間の比較になる。
+
+    python tests/benchmarks/bench_streaming.py --limit 500 --max-gb 1500
+"""
+import time
+import argparse
+from datetime import date
+
+from common import load_credentials
+
+from src.core import bq_client
+from src.core.state import SearchConditions
+from src.core.strategies.default import SubjectPredicateStrategy
+
+GB = 1024 ** 3
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=500, help="取得件数")
+    parser.add_argument("--page-size", type=int, default=bq_client.DEFAULT_PAGE_SIZE, help="1ページあたりの行数")
+    parser.add_argument("--max-gb", type=float, default=1500, help="1クエリあたりの課金上限 (GB)")
+    args = parser.parse_args()
+
+    credentials_info = load_credentials()
+    conditions = SearchConditions(
+        subject_keywords=["membrane"],
+        predicate_keywords=["filtration", "desalination"],
+        start_date=date(2018, 1, 1),
+        end_date=date(2023, 12, 31),
+        limit=args.limit,
+    )
+    sql, params = SubjectPredicateStrategy().generate_sql(conditions)
+    estimated = bq_client.estimate_query_bytes(sql, params, credentials_info=credentials_info)
+    print(f"推定スキャン量: {bq_client.format_bytes(estimated)}")
+    maximum_bytes_billed = int(args.max_gb * GB)
+
+    # 変更前: 全件を1つのDataFrameとして受け取る
+    start = time.perf_counter()
+    df = bq_client.execute_query(sql, params, credentials_info=credentials_info, maximum_bytes_billed=maximum_bytes_billed, use_cache=False)
+    blocking_total = time.perf_counter() - start
+    print(f"execute_query    : first={blocking_total:6.2f}s  total={blocking_total:6.2f}s  rows={len(df)}")
+
+    # 変更後: ページ単位で受け取る
+    start = time.perf_counter()
+    first = None
+    rows = 0
+    for page_df in bq_client.iter_query_pages(sql, params, credentials_info=credentials_info,
+                                              maximum_bytes_billed=maximum_bytes_billed, page_size=args.page_size, use_cache=False):
+        if first is None and not page_df.empty:
+            first = time.perf_counter() - start
+        rows += len(page_df)
+    streaming_total = time.perf_counter() - start
+    print(f"iter_query_pages : first={first or 0:6.2f}s  total={streaming_total:6.2f}s  rows={rows}")
+
+    bq_client.close_all_clients()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+ローカルミラーのキーワード検索のベンチマーク。
+
+同じ検索条件を、DuckDBによるSQL（LIKE '%キーワード%' の全件走査）と、
+全文検索用の転置インデックス（src.core.text_index）とで実行し、所要時間と結果の一致を確認する。
+BigQueryには接続せず、日英のキーワードを含む合成データの一時ミラーを用いる。
+
+    python tests/benchmarks/bench_text_index.py --rows 10000 100000
+"""
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import project_root, summarize  # noqa: F401  (src をインポート可能にする)
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.core.mirror import LocalMirror, DATA_FILE, MANIFEST_FILE
+from src.core.state import SearchConditions
+from src.core.strategies.default import SubjectPredicateStrategy
+
+WORDS = ["逆浸透膜", "半導体", "製造装置", "水処理", "分離膜", "センサ", "制御方法", "基板",
+         "membrane", "reverse osmosis", "semiconductor", "wafer", "filtration", "sensor", "substrate", "pvdf"]
+FILLER = "本発明は装置およびその方法に関するものであり、従来の課題を解決する。"
+
+CONDITIONS = {
+    "ja_subject": SearchConditions(subject_keywords=["逆浸透膜"], predicate_keywords=["水処理", "filtration"], countries=[]),
+    "en_subject": SearchConditions(subject_keywords=["membrane"], predicate_keywords=["osmosis"], countries=[]),
+    "ipc_mixed": SearchConditions(subject_keywords=["半導体", "wafer"], subject_ipc=["H01L"], countries=["JP", "US"]),
+}
+
+def make_mirror(root: Path, rows: int, seed: int = 0) -> LocalMirror:
+    """フラットスキーマの合成データで一時ミラーを作成する"""
+    rng = random.Random(seed)
+    abstracts = [FILLER + " ".join(rng.choices(WORDS, k=5)) + FILLER for _ in range(rows)]
+    numbers = [f"{rng.choice(['JP', 'US', 'CN'])}-{i:08d}-A" for i in range(rows)]
+    table = pa.table({
+        "publication_number": numbers,
+        "country": [n[:2] for n in numbers],
+        "title": [a[len(FILLER):len(FILLER) + 20] for a in abstracts],
+        "abstract": abstracts,
+        "assignee": [f"Assignee {rng.randrange(200)}" for _ in range(rows)],
+        "publication_date": [rng.randrange(2015, 2025) * 10000 + 101 for _ in range(rows)],
+        "ipc": [rng.sample(["B01D61/02", "B01D69/12", "H01L21/02", "G01N27/00"], 2) for _ in range(rows)],
+        "ipc_codes": [""] * rows,
+        "search_text": [a.lower() for a in abstracts],
+    })
+    path = root / f"bench_{rows}"
+    path.mkdir(parents=True)
+    pq.write_table(table, path / DATA_FILE)
+    with open(path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"name": path.name, "row_count": rows}, f)
+    return LocalMirror(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="ミラーの行数")
+    parser.add_argument("--repeat", type=int, default=5, help="各条件の繰り返し回数")
+    args = parser.parse_args()
+
+    strategy = SubjectPredicateStrategy(dialect="duckdb")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            mirror = make_mirror(Path(tmp), rows)
+            start = time.perf_counter()
+            mirror.build_text_index()
+            print(f"\n{rows}件: インデックス作成 {time.perf_counter() - start:.1f}秒")
+
+            for label, conditions in CONDITIONS.items():
+                conditions.limit = rows
+                sql, params = strategy.generate_sql(conditions)
+                sql_timings, index_timings = [], []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    expected = mirror.execute_query(sql, params)
+                    sql_timings.append((time.perf_counter() - start) * 1000)
+                    start = time.perf_counter()
+                    actual = mirror.keyword_search(conditions)
+                    index_timings.append((time.perf_counter() - start) * 1000)
+                same = set(expected["publication_number"]) == set(actual["publication_number"])
+                print(f"[{label}] {len(actual)}件 (SQLと一致: {same})")
+                summarize("  duckdb", sql_timings)
+                summarize("  index", index_timings)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""ベンチマークスクリプトで共通して用いる補助関数"""
+import sys
+import json
+import statistics
+from pathlib import Path
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+CONFIG_PATH = project_root / "tests" / "config.json"
+
+def load_credentials(config_path: Path = CONFIG_PATH) -> dict:
+    """tests/config.json に記載されたGCPサービスアカウント情報を読み込む"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    gcp_sa_path = Path(config["gcp_service_account_path"])
+    if not gcp_sa_path.is_absolute():
+        gcp_sa_path = project_root / gcp_sa_path
+    with open(gcp_sa_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def summarize(label: str, timings: list) -> None:
+    """計測値（ミリ秒）の平均・中央値・p95を表示する"""
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"{label:<10} mean={statistics.mean(timings):8.1f}ms  median={statistics.median(timings):8.1f}ms  p95={p95:8.1f}ms")
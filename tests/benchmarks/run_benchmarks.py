@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+SQL生成・類似度ランキング・グラフ作成のマイクロベンチマーク。
+
+合成した検索条件（1〜500語）と検索結果（100〜100,000行）を用いて、次の処理の所要時間を計測する。
+BigQuery・OpenAIには接続しない。
+  - SubjectPredicateStrategy.generate_sql
+  - 類似度ランキング（セクション別の正規化・コサイン類似度・重み付き和・上位k件の抽出）
+  - visualize.plot_publication_trend / plot_assignee_ranking
+  - 保存済みの検索結果からの1ページ分の読み込み（結果の件数によらず一定であること）
+  - 類似度の重みを変更したときの再スコアリング（セクション別類似度の重み付き和・並べ替え・保存）
+
+計測結果（repeat回の中央値）は tests/benchmarks/baselines/ のJSONと比較し、しきい値を超えて遅くなった項目があれば終了コード1で終了する。
+しきい値は「ベースラインの threshold 倍」と「今回・ベースラインの計測のばらつき (MAD) の SPREAD_FACTOR 倍」の大きい方で、
+ばらつきの大きい項目ほど許容幅が広がる。ばらつきを推定できるよう、repeat は MIN_REPEAT 回以上とする。
+ホットパスを変更した場合は、変更前後の数値をこのスクリプトで確認し、必要に応じてベースラインを更新すること。
+
+    python tests/benchmarks/run_benchmarks.py                     # ベースラインと比較
+    python tests/benchmarks/run_benchmarks.py --update-baseline   # ベースラインを保存・更新
+    python tests/benchmarks/run_benchmarks.py --filter ranking --threshold 0.5
+"""
+import gc
+import sys
+import statistics
+import json
+import time
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from common import project_root
+
+import numpy as np
+import pandas as pd
+
+from src.core import pipeline, ranking, result_store, visualize
+from src.core.state import SearchConditions
+from src.core.strategies.default import SubjectPredicateStrategy
+
+BASELINE_DIR = project_root / "tests" / "benchmarks" / "baselines"
+
+TERM_COUNTS = [1, 10, 50, 100, 500]
+ROW_COUNTS = [100, 1_000, 10_000, 100_000]
+DIM = 256  # 100,000行でもメモリに収まるよう、実際の次元数 (1536) より小さくする
+TOP_K = 100
+PAGE_SIZE = 20
+GRID_COLUMNS = ["publication_number", "title", "assignee", "publication_date", "similarity"]  # ui.components.results_grid と同じ
+
+DEFAULT_THRESHOLD = 0.5    # ベースラインより50%以上遅ければ回帰とみなす（共有環境での計測のばらつきを見込む）
+NOISE_FLOOR_MS = 0.05      # これ未満の差は計測誤差として無視する
+MIN_REPEAT = 5             # 中央値とばらつきを推定するための最小の繰り返し回数
+SPREAD_FACTOR = 4.0        # 許容する遅延を、計測のばらつき (MAD) の何倍まで広げるか
+
+def make_conditions(n_terms: int, seed: int = 0) -> SearchConditions:
+    """n_terms 個の語（キーワードとIPC）を、主語・述語に振り分けた検索条件を作る"""
+    rng = np.random.default_rng(seed)
+    keywords = [f"kw{i:04d}{''.join(rng.choice(list('abcdefgh'), 3))}" for i in range(n_terms)]
+    codes = [f"{'ABCDEFGH'[i % 8]}{i % 99 + 1:02d}{'ABCDEFGHJKLMNP'[i % 14]}{i}/00" for i in range(n_terms)]
+    # キーワード : IPC = 3 : 1、主語 : 述語 = 1 : 1
+    n_ipc = n_terms // 4
+    n_kw = n_terms - n_ipc
+    return SearchConditions(
+        subject_keywords=keywords[:(n_kw + 1) // 2],
+        predicate_keywords=keywords[(n_kw + 1) // 2:n_kw],
+        subject_ipc=codes[:n_ipc // 2],
+        predicate_ipc=codes[n_ipc // 2:n_ipc],
+    )
+
+def make_results(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """検索結果と同じ列を持つ、合成したDataFrameを作る"""
+    rng = np.random.default_rng(seed)
+    years = rng.integers(2000, 2025, n_rows)
+    dates = years * 10000 + rng.integers(1, 13, n_rows) * 100 + rng.integers(1, 29, n_rows)
+    assignees = np.array([f"Company {i}" for i in range(500)], dtype=object)[rng.zipf(1.5, n_rows) % 500]
+    assignees[rng.random(n_rows) < 0.05] = None
+    return pd.DataFrame({
+        "publication_number": [f"JP-{i:08d}-A" for i in range(n_rows)],
+        "title": "title",
+        "abstract": "abstract",
+        "assignee": assignees,
+        "publication_date": dates,
+        "ipc_codes": "B01D61/02",
+    })
+
+def make_section_vectors(n_rows: int, rng: np.random.Generator) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    pipeline.flatten_sections の順に並んだEmbeddingと、セクションごとのテキストの有無を作る。
+    要約のない文献を約5%含める。
+    """
+    present = {name: np.ones(n_rows, dtype=bool) for name in ranking.DEFAULT_SECTION_WEIGHTS}
+    present["abstract"][rng.random(n_rows) < 0.05] = False
+    n_texts = sum(int(mask.sum()) for mask in present.values())
+    return rng.standard_normal((n_texts, DIM), dtype=np.float32), present
+
+def rank_step(query_vectors: np.ndarray, vectors: np.ndarray, present: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    run_search の類似度ランキング（pipeline.run と同じく、セクション別の正規化・類似度計算・重み付き和の後、
+    上位k件を抽出する）
+    """
+    scores, _, _ = ranking.score_sections(
+        query_vectors, pipeline.split_section_vectors(vectors, present), present, ranking.DEFAULT_SECTION_WEIGHTS
+    )
+    return ranking.top_k_indices(scores, TOP_K)
+
+def build_cases() -> List[Tuple[str, Callable[[], Callable[[], None]]]]:
+    """
+    (項目名, 計測する関数を作る関数) のリスト。
+    入力データは計測の直前に作り、計測後に解放されるようにする（大きな配列が他の項目の計測に影響しないように）。
+    """
+    cases = []
+    for n_terms in TERM_COUNTS:
+        for dialect in ("bigquery", "duckdb"):
+            def setup(n_terms=n_terms, dialect=dialect):
+                strategy, conditions = SubjectPredicateStrategy(dialect=dialect), make_conditions(n_terms)
+                return lambda: strategy.generate_sql(conditions)
+            cases.append((f"generate_sql/{dialect}/terms={n_terms}", setup))
+    for n_rows in ROW_COUNTS:
+        def setup(n_rows=n_rows):
+            rng = np.random.default_rng(n_rows)
+            query_vectors = rng.standard_normal((1, DIM), dtype=np.float32)
+            vectors, present = make_section_vectors(n_rows, rng)
+            return lambda: rank_step(query_vectors, vectors, present)
+        cases.append((f"ranking/rows={n_rows}", setup))
+    for n_rows in ROW_COUNTS:
+        for plot in (visualize.plot_publication_trend, visualize.plot_assignee_ranking):
+            def setup(n_rows=n_rows, plot=plot):
+                df = make_results(n_rows)
+                return lambda: plot(df)
+            cases.append((f"{plot.__name__}/rows={n_rows}", setup))
+    for n_rows in ROW_COUNTS:
+        def setup(n_rows=n_rows):
+            tmp_dir = tempfile.TemporaryDirectory()  # 計測する関数が解放されると削除される
+            store = result_store.ResultStore(tmp_dir.name)
+            df = make_results(n_rows).assign(abstract="abstract " * 100, similarity=np.linspace(1, 0, n_rows))
+            handle = store.put(df)
+            offset = n_rows // 2
+            return lambda _tmp_dir=tmp_dir: store.read_table(handle, GRID_COLUMNS).slice(offset, PAGE_SIZE).to_pandas()
+        cases.append((f"results_page/rows={n_rows}", setup))
+    for n_rows in ROW_COUNTS:
+        def setup(n_rows=n_rows):
+            tmp_dir = tempfile.TemporaryDirectory()
+            store = result_store.ResultStore(tmp_dir.name)
+            rng = np.random.default_rng(n_rows)
+            df = make_results(n_rows).assign(
+                abstract="abstract " * 100,
+                sim_title=rng.random(n_rows, dtype=np.float32),
+                sim_abstract=rng.random(n_rows, dtype=np.float32),
+            )
+            handle = store.put(df)
+            weights = {"title": 0.3, "abstract": 0.7}
+            return lambda _tmp_dir=tmp_dir: store.delete(store.put_table(ranking.rescore_table(store.read_table(handle), weights)))
+        cases.append((f"rescore/rows={n_rows}", setup))
+    return cases
+
+def measure(func: Callable[[], None], repeat: int, min_time: float = 0.1) -> List[float]:
+    """
+    1回の呼び出しの所要時間(ms)を repeat 回計測したリスト。
+    短い処理は min_time 秒以上になるよう複数回まとめて計測する。timeit と同様に、計測中はGCを止める。
+    """
+    func()  # ウォームアップ
+    start = time.perf_counter()
+    func()
+    single = time.perf_counter() - start
+    loops = max(1, int(min_time / max(single, 1e-9)))
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            timings.append((time.perf_counter() - start) * 1000 / loops)
+    finally:
+        gc.enable()
+    return timings
+
+def summarize_timings(timings: List[float]) -> Tuple[float, float]:
+    """(中央値, 中央値からの絶対偏差の中央値 (MAD))。MADは外れ値の影響を受けにくいばらつきの指標。"""
+    median = statistics.median(timings)
+    return median, statistics.median(abs(t - median) for t in timings)
+
+def allowed_slowdown(base: float, base_spread: float, spread: float, threshold: float) -> float:
+    """ベースラインからの遅延として許容する時間(ms)"""
+    return max(threshold * base, SPREAD_FACTOR * (base_spread + spread), NOISE_FLOOR_MS)
+
+def load_baseline(name: str) -> Dict:
+    path = BASELINE_DIR / f"{name}.json"
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(baseline_name: str, results: Dict[str, float], spreads: Dict[str, float]) -> None:
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    baseline = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "results_ms": {name: round(ms, 4) for name, ms in sorted(results.items())},
+        "spread_ms": {name: round(ms, 4) for name, ms in sorted(spreads.items())},
+    }
+    with open(BASELINE_DIR / f"{baseline_name}.json", 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default="default", help="ベースライン名 (baselines/<名前>.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果をベースラインとして保存する")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="回帰とみなす遅延の割合")
+    parser.add_argument("--repeat", type=int, default=7, help=f"各項目の計測回数 ({MIN_REPEAT}以上)")
+    parser.add_argument("--filter", default="", help="名前にこの文字列を含む項目だけを計測する")
+    args = parser.parse_args()
+    if args.repeat < MIN_REPEAT:
+        parser.error(f"--repeat は{MIN_REPEAT}以上を指定してください（少ない回数では計測のばらつきを回帰と誤判定する）")
+
+    baseline = load_baseline(args.baseline)
+    baseline_results = baseline.get("results_ms", {})
+    baseline_spreads = baseline.get("spread_ms", {})
+    if baseline and baseline.get("machine") != platform.platform():
+        print(f"注意: ベースラインは別の環境 ({baseline.get('machine')}) で計測されています。")
+
+    results, spreads, regressions = {}, {}, []
+    print(f"{'name':<44} {'current':>11} {'spread':>9} {'baseline':>11} {'change':>8}")
+    for name, setup in build_cases():
+        if args.filter not in name:
+            continue
+        func = setup()
+        timings = measure(func, args.repeat)
+        base, base_spread = baseline_results.get(name), baseline_spreads.get(name, 0.0)
+
+        def is_regression() -> bool:
+            ms, spread = summarize_timings(timings)
+            return bool(base) and ms - base > allowed_slowdown(base, base_spread, spread, args.threshold)
+
+        if is_regression():
+            # 一時的な負荷による誤検出を避けるため、計測回数を倍にして中央値を取り直す
+            timings += measure(func, args.repeat)
+        results[name], spreads[name] = ms, spread = summarize_timings(timings)
+        if base is None:
+            print(f"{name:<44} {ms:9.3f}ms {spread:7.3f}ms {'-':>11} {'-':>8}")
+            continue
+        change = ms / base - 1 if base else 0.0
+        regressed = is_regression()
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<44} {ms:9.3f}ms {spread:7.3f}ms {base:9.3f}ms {change:+7.1%}{'  << 回帰' if regressed else ''}")
+
+    if args.update_baseline:
+        # フィルタで計測しなかった項目は、既存のベースラインの値を残す
+        save_baseline(args.baseline, {**baseline_results, **results}, {**baseline_spreads, **spreads})
+        print(f"ベースラインを保存しました: {BASELINE_DIR / (args.baseline + '.json')}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)}件の項目がベースラインより{args.threshold:.0%}以上（かつ計測のばらつきを超えて）遅くなりました: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""ANNインデックスの追加（重複の除外）と、バックグラウンドでの学習・整列のテスト"""
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import ann_index
+
+DIM = 8
+
+def make_vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+def make_ids(start, n):
+    return [f"JP-{i}-A" for i in range(start, start + n)]
+
+def test_insert_ignores_duplicate_ids(tmp_path):
+    index = ann_index.AnnIndex(tmp_path)
+    assert index.insert(make_ids(0, 5), make_vectors(5)) == 5
+    # 登録済みの番号・入力内の重複・長すぎる番号は追加しない
+    ids = ["JP-3-A", "JP-10-A", "JP-10-A", "JP-11-A", "X" * (ann_index.ID_WIDTH + 1)]
+    assert index.insert(ids, make_vectors(5, seed=1)) == 2
+    assert len(index) == 7
+
+    reopened = ann_index.AnnIndex(tmp_path)
+    assert reopened.insert(make_ids(0, 3) + ["JP-12-A"], make_vectors(4, seed=2)) == 1
+    found, _ = reopened.search(make_vectors(1, seed=3)[0], k=100)
+    assert sorted(found) == sorted(make_ids(0, 5) + ["JP-10-A", "JP-11-A", "JP-12-A"])
+
+def test_training_runs_in_background_and_keeps_rows_added_meanwhile(tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "MIN_TRAIN_SIZE", 200)
+    started, release = threading.Event(), threading.Event()
+    kmeans = ann_index._spherical_kmeans
+
+    def slow_kmeans(sample, n_lists, rng):
+        started.set()
+        assert release.wait(10)
+        return kmeans(sample, n_lists, rng)
+
+    monkeypatch.setattr(ann_index, "_spherical_kmeans", slow_kmeans)
+    index = ann_index.AnnIndex(tmp_path)
+    vectors = make_vectors(300)
+    assert index.insert(make_ids(0, 200), vectors[:200]) == 200
+    assert started.wait(10)
+
+    # 学習中も追加・検索はブロックされない
+    assert index.insert(make_ids(200, 100), vectors[200:]) == 100
+    assert index.search(vectors[250], k=1)[0] == ["JP-250-A"]
+
+    release.set()
+    index.wait_for_reorganization(10)
+    assert index.trained
+    assert index.meta.trained_count == 200 and len(index) == 300
+
+    # 学習中に追加した行も、新しいセントロイドで検索できる
+    for row in (0, 150, 250, 299):
+        found, _ = index.search(vectors[row], k=1, n_probe=index.meta.n_lists)
+        assert found == [f"JP-{row}-A"]
+    assert index.insert(make_ids(0, 300), vectors) == 0
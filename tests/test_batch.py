@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""バッチ検索エンジン（src.core.batch）のテスト"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import batch, fanout
+from src.core.state import SearchConditions
+
+def make_jobs(n):
+    return [batch.BatchJob(f"job-{i}", SearchConditions(subject_keywords=[f"kw{i}"])) for i in range(n)]
+
+def fake_results(conditions_by_name, bytes_billed=900):
+    """条件ごとに1件の結果を返す、まとめたクエリの結果"""
+    results = {}
+    for name, conditions in conditions_by_name.items():
+        df = pd.DataFrame({c: [f"{name}-{c}"] for c in fanout.RESULT_COLUMNS})
+        df.attrs["bq_stats"] = {"total_bytes_billed": bytes_billed, "cache_hit": False}
+        results[name] = df
+    return results
+
+def test_bigquery_jobs_share_one_scan_per_fanout_group(tmp_path, monkeypatch):
+    scans = []
+
+    def run_fanout(conditions_by_name, **kwargs):
+        scans.append(list(conditions_by_name))
+        assert kwargs["use_mirror"] is False and kwargs["maximum_bytes_billed"] == 10 ** 9
+        return fake_results(conditions_by_name)
+
+    monkeypatch.setattr(batch.mirror, "find_mirror", lambda conditions: None)
+    monkeypatch.setattr(batch.fanout, "run_fanout", run_fanout)
+    monkeypatch.setattr(batch.bq_client, "execute_query", lambda *args, **kwargs: pytest.fail("ジョブごとに検索してはならない"))
+
+    report = batch.run_batch(make_jobs(5), tmp_path, max_workers=2, maximum_bytes_billed=10 ** 9, fanout_size=3)
+    assert sorted(len(s) for s in scans) == [2, 3]
+    assert len(report.completed) == 5 and not report.failed
+    # 課金バイト数は、まとめたジョブで等分する
+    assert sum(r.bytes_billed for r in report.completed) == 900 * 2
+    assert pd.read_parquet(tmp_path / batch.RESULTS_DIR / "job-4.parquet")["publication_number"].tolist() == ["job-4-publication_number"]
+
+def test_failed_fanout_scan_fails_every_job_in_the_group(tmp_path, monkeypatch):
+    def run_fanout(conditions_by_name, **kwargs):
+        raise batch.bq_client.BQClientError("quota exceeded")
+
+    monkeypatch.setattr(batch.mirror, "find_mirror", lambda conditions: None)
+    monkeypatch.setattr(batch.fanout, "run_fanout", run_fanout)
+    report = batch.run_batch(make_jobs(3), tmp_path, fanout_size=10)
+    assert len(report.failed) == 3 and all(r.error == "quota exceeded" for r in report.failed)
+
+def test_batch_engine_does_not_import_streamlit():
+    code = "import sys; import src.core.batch; sys.exit('streamlit' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=project_root).returncode == 0
+
+def test_resume_skips_finished_jobs_and_reruns_the_rest(tmp_path, monkeypatch):
+    class Stop(Exception):
+        """処理の途中での停止を模擬する"""
+
+    executed, failing, recorded = [], {"job-1"}, []
+
+    def execute_query(sql, params, **kwargs):
+        job_id = "job-" + next(p.value for p in params if p.name == "s_kw_0").strip("%")[2:]
+        executed.append(job_id)
+        if job_id in failing:
+            raise batch.bq_client.BQClientError("quota exceeded")
+        df = pd.DataFrame({"publication_number": [f"{job_id}-A"]})
+        df.attrs["bq_stats"] = {"total_bytes_billed": 100, "cache_hit": False}
+        return df
+
+    def stop_after_three(record):
+        if len(recorded) == 2:
+            raise Stop()
+        recorded.append(record)
+
+    monkeypatch.setattr(batch.mirror, "find_mirror", lambda conditions: None)
+    monkeypatch.setattr(batch.bq_client, "execute_query", execute_query)
+    jobs = make_jobs(5)
+    with pytest.raises(Stop):
+        batch.run_batch(jobs, tmp_path, max_workers=1, fanout_size=1, on_record=stop_after_three)
+    # 停止までにチェックポイントへ書けたのは job-0（完了）・job-1（失敗）・job-2（完了）。書き込み途中の行も残る
+    checkpoint = batch.Checkpoint(tmp_path / batch.CHECKPOINT_FILE)
+    assert {job_id: r.status for job_id, r in checkpoint.load().items()} == \
+        {"job-0": batch.STATUS_OK, "job-1": batch.STATUS_FAILED, "job-2": batch.STATUS_OK}
+    with open(checkpoint.path, 'a', encoding='utf-8') as f:
+        f.write('{"job_id": "job-3", "sta')
+
+    executed.clear()
+    failing.clear()
+    report = batch.run_batch(jobs, tmp_path, max_workers=1, fanout_size=1)
+    assert sorted(executed) == ["job-1", "job-3", "job-4"]
+    assert (report.total_jobs, report.skipped, len(report.completed), len(report.failed)) == (5, 2, 3, 0)
+    assert sum(r.bytes_billed for r in report.completed) == 300
+    assert set(checkpoint.load()) == {f"job-{i}" for i in range(5)}
+
+    # 結果ファイルが消えた完了済みのジョブは、再開時に実行し直す
+    (tmp_path / batch.RESULTS_DIR / "job-0.parquet").unlink()
+    executed.clear()
+    report = batch.run_batch(jobs, tmp_path, max_workers=1, fanout_size=1)
+    assert executed == ["job-0"] and (report.skipped, len(report.completed)) == (4, 1)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""BigQueryクライアント（src.core.bq_client）のテスト。BigQueryには接続せず、クライアントと認証情報を差し替える。"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pyarrow as pa
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import bq_client, result_cache
+
+def make_info(key_id="key-1", email="sa@project.iam.gserviceaccount.com"):
+    return {"project_id": "project", "client_email": email, "private_key_id": key_id, "private_key": "secret"}
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class FakeCredentials:
+    """service_account.Credentials の代わり。refresh で1時間有効なトークンを得る"""
+    def __init__(self, info, scopes):
+        self.info, self.scopes = info, scopes
+        self.project_id = info["project_id"]
+        self.token, self.expiry = None, None
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token, self.expiry = f"token-{self.refreshes}", utcnow() + timedelta(hours=1)
+
+class FakeClient:
+    SCOPE = ("https://www.googleapis.com/auth/bigquery",)
+
+    def __init__(self, credentials, project):
+        self.credentials, self.project = credentials, project
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def registry(monkeypatch):
+    """空のレジストリと、作成された認証情報のリスト"""
+    created = []
+
+    def from_service_account_info(info, scopes):
+        created.append(FakeCredentials(info, scopes))
+        return created[-1]
+
+    monkeypatch.setattr(bq_client, "_client_registry", {})
+    monkeypatch.setattr(bq_client, "service_account", SimpleNamespace(
+        Credentials=SimpleNamespace(from_service_account_info=from_service_account_info)))
+    monkeypatch.setattr(bq_client, "bigquery", SimpleNamespace(Client=FakeClient))
+    monkeypatch.setattr(bq_client, "bigquery_storage", SimpleNamespace(
+        BigQueryReadClient=lambda credentials: SimpleNamespace(credentials=credentials)))
+    monkeypatch.setattr(bq_client, "Request", lambda: None)
+    return created
+
+def test_entries_are_reused_per_service_account(registry):
+    entry = bq_client._get_entry(make_info())
+    assert bq_client._get_entry(make_info()) is entry
+    assert bq_client.get_client(make_info()) is entry.client
+    # 鍵IDが同じなら、秘密鍵以外の項目が同じ別の辞書でも同じエントリ
+    assert bq_client._get_entry({**make_info(), "private_key": "other"}) is entry
+    assert len(registry) == 1
+    assert entry.client.credentials is entry.credentials and entry.client.project == "project"
+    assert entry.credentials.scopes == FakeClient.SCOPE
+
+    other = bq_client._get_entry(make_info(key_id="key-2"))
+    assert other is not entry and len(registry) == 2
+    assert bq_client._get_entry(make_info(email="other@project.iam.gserviceaccount.com")) not in (entry, other)
+
+def test_storage_client_is_created_once_with_the_shared_credentials(registry):
+    client, storage = bq_client._get_clients(make_info())
+    assert bq_client._get_clients(make_info()) == (client, storage)
+    assert storage.credentials is registry[0]
+
+def test_close_client_removes_the_entry(registry):
+    entry = bq_client._get_entry(make_info())
+    bq_client.close_client(make_info())
+    assert entry.client.closed
+    assert bq_client._get_entry(make_info()) is not entry
+
+def test_token_is_fetched_on_first_use_and_reused_while_valid(registry):
+    entry = bq_client._get_entry(make_info())
+    assert entry.credentials.refreshes == 1
+    bq_client._get_entry(make_info())
+    assert entry.credentials.refreshes == 1
+
+@pytest.mark.parametrize("token, expires_in, refreshed", [
+    (None, timedelta(hours=1), True),       # トークン未取得
+    ("token", None, True),                  # 有効期限が不明
+    ("token", bq_client.TOKEN_REFRESH_MARGIN - timedelta(seconds=30), True),  # 期限切れ間近
+    ("token", -timedelta(minutes=1), True), # 期限切れ
+    ("token", bq_client.TOKEN_REFRESH_MARGIN + timedelta(minutes=1), False),
+])
+def test_refresh_if_needed(registry, token, expires_in, refreshed):
+    entry = bq_client._get_entry(make_info())
+    credentials = entry.credentials
+    credentials.token = token
+    credentials.expiry = None if expires_in is None else utcnow() + expires_in
+    credentials.refreshes = 0
+    bq_client._refresh_if_needed(entry)
+    assert credentials.refreshes == (1 if refreshed else 0)
+
+def test_reused_entry_is_refreshed_when_the_token_is_about_to_expire(registry):
+    entry = bq_client._get_entry(make_info())
+    entry.credentials.expiry = utcnow() + timedelta(minutes=1)
+    assert bq_client._get_entry(make_info()) is entry
+    assert entry.credentials.refreshes == 2 and entry.credentials.token == "token-2"
+
+class FakeQueryJob:
+    """client.query の戻り値の代わり。result(page_size) は batches をページとして返す"""
+    total_bytes_processed = 2048
+    total_bytes_billed = 10 * 1024 ** 2
+    slot_millis = 5
+    cache_hit = False
+
+    def __init__(self, batches, fail_after=None):
+        self.batches, self.fail_after = batches, fail_after
+        self.page_size = None
+
+    def result(self, page_size=None):
+        self.page_size = page_size
+        return self
+
+    def to_arrow_iterable(self, bqstorage_client=None):
+        for i, batch in enumerate(self.batches):
+            if i == self.fail_after:
+                raise RuntimeError("stream reset")
+            yield batch
+
+class FakeQueryClient:
+    def __init__(self, job):
+        self.job = job
+        self.configs = []
+
+    def query(self, sql, job_config=None):
+        self.configs.append(job_config)
+        return self.job
+
+def make_batches(n_pages, rows=3):
+    return [pa.record_batch({"publication_number": [f"JP-{p}-{r}" for r in range(rows)]}) for p in range(n_pages)]
+
+@pytest.fixture
+def query_cache(tmp_path, monkeypatch):
+    cache = result_cache.QueryResultCache(tmp_path)
+    monkeypatch.setattr(result_cache, "get_query_cache", lambda: cache)
+    return cache
+
+def use_job(monkeypatch, job):
+    client = FakeQueryClient(job)
+    monkeypatch.setattr(bq_client, "_get_clients", lambda credentials_info=None: (client, "bqstorage"))
+    return client
+
+def no_query(monkeypatch):
+    monkeypatch.setattr(bq_client, "_get_clients", lambda *args, **kwargs: pytest.fail("BigQueryを呼び出してはならない"))
+
+def test_prefetch_keeps_page_order_and_reraises_errors():
+    assert list(bq_client._prefetch(iter(range(50)), max_queue_size=2)) == list(range(50))
+
+    def failing():
+        yield from range(3)
+        raise ValueError("boom")
+
+    received = []
+    with pytest.raises(ValueError, match="boom"):
+        for page in bq_client._prefetch(failing()):
+            received.append(page)
+    assert received == [0, 1, 2]
+
+def test_pages_are_yielded_in_order_with_job_stats(query_cache, monkeypatch):
+    client = use_job(monkeypatch, FakeQueryJob(make_batches(4)))
+    pages = list(bq_client.iter_query_pages("SELECT 1", [], maximum_bytes_billed=10 ** 9, page_size=3))
+    assert [df["publication_number"].iloc[0] for df in pages] == ["JP-0-0", "JP-1-0", "JP-2-0", "JP-3-0"]
+    assert all(df.attrs["bq_stats"]["total_bytes_billed"] == 10 * 1024 ** 2 for df in pages)
+    assert client.configs[0].maximum_bytes_billed == 10 ** 9 and client.job.page_size == 3
+
+def test_full_read_is_cached_and_replayed_as_a_single_page(query_cache, monkeypatch):
+    use_job(monkeypatch, FakeQueryJob(make_batches(3)))
+    assert len(list(bq_client.iter_query_pages("SELECT 1", []))) == 3
+
+    no_query(monkeypatch)
+    pages = list(bq_client.iter_query_pages("SELECT  1", []))
+    assert len(pages) == 1
+    assert pages[0]["publication_number"].tolist() == [f"JP-{p}-{r}" for p in range(3) for r in range(3)]
+    assert pages[0].attrs["bq_stats"]["result_cache_hit"]
+
+def test_partial_read_is_not_cached(query_cache, monkeypatch):
+    use_job(monkeypatch, FakeQueryJob(make_batches(3)))
+    pages = bq_client.iter_query_pages("SELECT 1", [])
+    next(pages)
+    pages.close()
+    assert not query_cache.contains(result_cache.make_key("SELECT 1", []))
+
+def test_failed_stream_is_not_cached(query_cache, monkeypatch):
+    use_job(monkeypatch, FakeQueryJob(make_batches(3), fail_after=2))
+    received = []
+    with pytest.raises(bq_client.BQClientError, match="stream reset"):
+        for df in bq_client.iter_query_pages("SELECT 1", []):
+            received.append(df)
+    assert len(received) == 2
+    assert not query_cache.contains(result_cache.make_key("SELECT 1", []))
+
+def test_empty_result_yields_one_page_with_stats(query_cache, monkeypatch):
+    use_job(monkeypatch, FakeQueryJob([]))
+    pages = list(bq_client.iter_query_pages("SELECT 1", []))
+    assert len(pages) == 1 and pages[0].empty
+    assert pages[0].attrs["bq_stats"]["total_bytes_billed"] == 10 * 1024 ** 2
+
+def test_use_cache_false_neither_reads_nor_writes_the_cache(query_cache, monkeypatch):
+    query_cache.put(result_cache.make_key("SELECT 1", []), pa.table({"publication_number": ["cached"]}))
+    use_job(monkeypatch, FakeQueryJob(make_batches(2)))
+    pages = list(bq_client.iter_query_pages("SELECT 1", [], use_cache=False))
+    assert [df["publication_number"].iloc[0] for df in pages] == ["JP-0-0", "JP-1-0"]
+    assert query_cache.get(result_cache.make_key("SELECT 1", []))["publication_number"].to_pylist() == ["cached"]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Embedding APIへのリクエストのバッチ分割・再試行・結果の順序（src.core.embedding_executor）のテスト"""
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import embedding_executor
+
+class StubClient:
+    """
+    client.embeddings.create だけを持つOpenAIクライアントの代わり。
+    テキスト "t<番号>" のベクトルは [番号] とし、応答の data は index の逆順で返す。
+    fail_first に含まれるテキストを含むバッチは、最初の呼び出しだけ error を送出する。
+    """
+    def __init__(self, fail_first=(), error=None):
+        self.embeddings = self
+        self.calls = []
+        self._fail_first = set(fail_first)
+        self._error = error
+        self._lock = threading.Lock()
+
+    def create(self, input, model):
+        with self._lock:
+            self.calls.append(list(input))
+            failing = self._fail_first.intersection(input)
+            self._fail_first -= failing
+        if failing:
+            raise self._error
+        data = [SimpleNamespace(index=i, embedding=[float(text[1:])]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])
+
+def make_texts(n):
+    return [f"t{i}" for i in range(n)]
+
+def connection_error():
+    return openai.APIConnectionError(request=None)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """再試行の待ち時間を記録し、実際には待たない"""
+    waited = []
+    monkeypatch.setattr(embedding_executor.time, "sleep", waited.append)
+    return waited
+
+def test_split_batches_respects_input_and_token_limits():
+    assert embedding_executor.split_batches(make_texts(7), max_inputs=3) == [[0, 1, 2], [3, 4, 5], [6]]
+    # 日本語10文字は11トークンと見積もる。上限を超える1件は単独のバッチにする
+    texts = ["あ" * 10, "あ" * 10, "あ" * 10, "あ" * 40, "あ" * 10]
+    assert embedding_executor.split_batches(texts, max_tokens=25) == [[0, 1], [2], [3], [4]]
+    assert embedding_executor.split_batches([]) == []
+
+def test_embed_texts_splits_at_the_batch_limit_and_keeps_input_order(sleeps):
+    limit = embedding_executor.MAX_INPUTS_PER_BATCH
+    texts = make_texts(2 * limit + 1)
+    client = StubClient()
+    vectors = embedding_executor.embed_texts(client, texts, "model")
+    assert sorted(len(call) for call in client.calls) == [1, limit, limit]
+    assert [float(v[0]) for v in vectors] == list(range(len(texts)))
+    assert sleeps == []
+
+def test_single_batch_is_reordered_by_response_index():
+    client = StubClient()
+    vectors = embedding_executor.embed_texts(client, make_texts(5), "model")
+    assert len(client.calls) == 1
+    assert [float(v[0]) for v in vectors] == [0, 1, 2, 3, 4]
+
+def test_only_the_failed_batch_is_retried(sleeps):
+    limit = embedding_executor.MAX_INPUTS_PER_BATCH
+    texts = make_texts(2 * limit)
+    client = StubClient(fail_first={texts[-1]}, error=connection_error())
+    vectors = embedding_executor.embed_texts(client, texts, "model")
+    assert [float(v[0]) for v in vectors] == list(range(len(texts)))
+    # 1つ目のバッチは1回、失敗した2つ目のバッチは2回送信する
+    assert [call[0] for call in client.calls].count(texts[0]) == 1
+    assert [call[0] for call in client.calls].count(texts[limit]) == 2
+    assert len(sleeps) == 1
+
+def test_retries_give_up_after_max_retries(monkeypatch, sleeps):
+    monkeypatch.setattr(embedding_executor, "MAX_RETRIES", 2)
+
+    class AlwaysFailing(StubClient):
+        def create(self, input, model):
+            self.calls.append(list(input))
+            raise connection_error()
+
+    client = AlwaysFailing()
+    with pytest.raises(openai.APIConnectionError):
+        embedding_executor.embed_texts(client, make_texts(3), "model")
+    assert len(client.calls) == 3
+    # 待ち時間は指数的に伸びる（ジッターは最大で2倍）
+    assert 1 <= sleeps[0] < 2 <= sleeps[1] < 4
+
+def test_non_retryable_errors_are_not_retried(sleeps):
+    client = StubClient(fail_first={"t0"}, error=openai.OpenAIError("invalid input"))
+    with pytest.raises(openai.OpenAIError):
+        embedding_executor.embed_texts(client, make_texts(3), "model")
+    assert len(client.calls) == 1
+    assert sleeps == []
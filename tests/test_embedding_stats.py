@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""get_embeddings_with_stats が、呼び出しごとのEmbeddingキャッシュのヒット数・ミス数を返すことのテスト"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import embeddings
+from src.core.disk_cache import DiskCache
+from src.core.embedding_cache import EmbeddingCache
+
+def test_stats_are_per_call_not_cache_totals(tmp_path, monkeypatch):
+    cache = EmbeddingCache(DiskCache(tmp_path / "embeddings.sqlite3", 1024 ** 2))
+    requested = []
+
+    def fake_embed_texts(client, texts, model):
+        requested.append(list(texts))
+        return [np.full(4, len(t), dtype=np.float32) for t in texts]
+
+    monkeypatch.setattr(embeddings.embedding_cache, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(embeddings.openai_client, "get_client", lambda api_key: None)
+    monkeypatch.setattr(embeddings.embedding_executor, "embed_texts", fake_embed_texts)
+
+    vectors, hits, misses = embeddings.get_embeddings_with_stats(["a", "bb", "a"], api_key="test")
+    assert (hits, misses) == (0, 3)
+    assert requested == [["a", "bb"]]
+    assert [v[0] for v in vectors] == [1, 2, 1]
+
+    # 別の検索がキャッシュを使っても、呼び出しごとの値は影響を受けない
+    cache.get_many("text-embedding-3-small", ["a", "zzz"])
+    _, hits, misses = embeddings.get_embeddings_with_stats(["bb", "ccc"], api_key="test")
+    assert (hits, misses) == (1, 1)
+    assert requested[-1] == ["ccc"]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""複数の検索条件を1回のスキャンで評価するファンアウト検索（src.core.fanout）のテスト"""
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import fanout
+from src.core.mirror import DATA_FILE, MANIFEST_FILE, LocalMirror
+from src.core.state import SearchConditions
+from src.core.strategies.default import SubjectPredicateStrategy
+
+def make_result(rows):
+    """まとめたクエリの結果と同じ形のDataFrame（一致フラグ m_0, m_1 付き）"""
+    df = pd.DataFrame(rows, columns=["publication_number", "m_0", "m_1"])
+    for column in fanout.RESULT_COLUMNS[1:]:
+        df[column] = "x"
+    return df
+
+def test_split_results_by_flag_and_dedupes_publications():
+    df = make_result([("JP-1-A", True, False), ("JP-2-A", True, True), ("JP-2-A", True, True), ("JP-3-A", None, True)])
+    df.attrs["bq_stats"] = {"total_bytes_billed": 1}
+    results = fanout.split_results(df, {"base": "m_0", "relaxed": "m_1"})
+    assert results["base"]["publication_number"].tolist() == ["JP-1-A", "JP-2-A"]
+    assert results["relaxed"]["publication_number"].tolist() == ["JP-2-A", "JP-3-A"]
+    assert list(results["base"].columns) == fanout.RESULT_COLUMNS
+    assert all(r.attrs["bq_stats"] == {"total_bytes_billed": 1} for r in results.values())
+
+def test_split_results_of_empty_result_keeps_columns():
+    results = fanout.split_results(make_result([]), {"base": "m_0"})
+    assert results["base"].empty and list(results["base"].columns) == fanout.RESULT_COLUMNS
+
+def test_fanout_query_matches_separate_queries(tmp_path):
+    numbers = [f"JP-{i}-A" for i in range(20)]
+    abstracts = ["逆浸透膜による水処理" if i % 2 else "中空糸膜のろ過" for i in range(20)]
+    table = pa.table({
+        "publication_number": numbers,
+        "country": ["JP"] * 20,
+        "title": ["膜"] * 20,
+        "abstract": abstracts,
+        "assignee": ["Assignee"] * 20,
+        "publication_date": [20200101 + i for i in range(20)],
+        "ipc": [["B01D61/02"] if i % 3 else ["C02F1/44"] for i in range(20)],
+        "ipc_codes": [""] * 20,
+        "search_text": [f"膜 {a}" for a in abstracts],
+    })
+    pq.write_table(table, tmp_path / DATA_FILE)
+    with open(tmp_path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"name": "test", "row_count": 20}, f)
+    local_mirror = LocalMirror(tmp_path)
+
+    conditions = {
+        "base": SearchConditions(subject_keywords=["逆浸透膜"], subject_ipc=["B01D"], countries=[]),
+        "relaxed": SearchConditions(subject_keywords=["膜"], countries=[]),
+        "limited": SearchConditions(subject_keywords=["ろ過"], countries=[], limit=3),
+    }
+    query = fanout.compile_fanout(conditions, dialect="duckdb")
+    results = fanout.split_results(local_mirror.execute_query(query.sql, query.params), query.flags)
+
+    strategy = SubjectPredicateStrategy(dialect="duckdb")
+    for name in ("base", "relaxed"):
+        expected = local_mirror.execute_query(*strategy.generate_sql(conditions[name]))
+        assert sorted(results[name]["publication_number"]) == sorted(expected["publication_number"])
+    # 件数上限は、条件ごとに公開番号順で適用する
+    assert sorted(results["limited"]["publication_number"]) == ["JP-0-A", "JP-10-A", "JP-12-A"]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""IPCのプレフィックス索引（src.core.ipc_index）の範囲検索のテスト"""
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import ipc_index
+
+DOC_CODES = [
+    ["A01B1/00", "G05B13/02"],
+    ["G05B19/418"],
+    None,                     # IPCのない文献
+    ["G05D1/00", None],
+    ["H04L9/32", "A01B1/00"],
+    ["G05B13/02"],
+]
+
+@pytest.fixture
+def index(tmp_path):
+    return ipc_index.build_ipc_index(pa.chunked_array([pa.array(DOC_CODES, pa.list_(pa.string()))]), tmp_path)
+
+def docs(index, *prefixes):
+    return index.prefix_docs(prefixes).tolist()
+
+def test_index_is_sorted_by_code_and_skips_nulls(index):
+    assert len(index) == 7
+    assert [c.decode() for c in index.codes] == sorted(c for codes in DOC_CODES if codes for c in codes if c)
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("G", [0, 1, 3, 5]),             # セクション
+    ("G05", [0, 1, 3, 5]),           # クラス
+    ("G05B", [0, 1, 5]),             # サブクラス
+    ("G05B13/02", [0, 5]),           # グループ
+    ("G05B19/418", [1]),
+    ("G05D", [3]),
+])
+def test_prefixes_at_each_level(index, prefix, expected):
+    assert docs(index, prefix) == expected
+
+@pytest.mark.parametrize("prefix", ["B", "G05C", "G05B13/03", "G05B13/021", "H04L9/321", "ｇ05"])
+def test_prefixes_without_matches(index, prefix):
+    start, end = index.prefix_range(prefix)
+    assert start == end
+    assert docs(index, prefix) == []
+
+def test_prefixes_at_the_edges_of_the_sorted_array(index):
+    # 先頭（最小のコード）と末尾（最大のコード）を含む範囲
+    assert index.prefix_range("A") == (0, 2)
+    assert index.prefix_range("A01B1/00") == (0, 2)
+    assert index.prefix_range("H") == (len(index) - 1, len(index))
+    assert docs(index, "A01B1/00") == [0, 4]
+    assert docs(index, "H04L9/32") == [4]
+    # 全てのコードより前・後ろのプレフィックス
+    assert index.prefix_range("0") == (0, 0)
+    assert index.prefix_range("Z") == (len(index), len(index))
+
+def test_multiple_prefixes_are_merged_without_duplicates(index):
+    assert docs(index, "A01B", "G05B13", "A01B") == [0, 4, 5]
+    assert docs(index) == []
+    assert docs(index, "") == [0, 1, 3, 4, 5]
+
+def test_reopened_and_empty_indexes(index, tmp_path):
+    reopened = ipc_index.IpcIndex(index.path)
+    assert docs(reopened, "G05B") == [0, 1, 5]
+
+    empty = ipc_index.build_ipc_index(pa.array([None, []], pa.list_(pa.string())), tmp_path / "empty")
+    assert len(empty) == 0
+    assert empty.prefix_range("G") == (0, 0)
+    assert docs(empty, "G") == []
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""LLM応答キャッシュ（src.core.llm_cache）と、get_llm_response がキャッシュする応答のテスト"""
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent, llm_cache
+from src.core.disk_cache import DiskCache
+from src.core.state import AppState
+
+TEXT = {"type": "text"}
+JSON = {"type": "json_object"}
+
+def make_cache(tmp_path):
+    return llm_cache.LLMResponseCache(DiskCache(tmp_path / "llm.sqlite3", 1024 ** 2))
+
+def chunk(content=None, finish_reason=None):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=finish_reason, delta=SimpleNamespace(content=content))])
+
+class StubClient:
+    """chat.completions.create の呼び出しごとに、responses の先頭の (本文の断片のリスト, finish_reason) をストリーミングで返す"""
+    def __init__(self, *responses):
+        self.chat = SimpleNamespace(completions=self)
+        self.responses = list(responses)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        parts, finish_reason = self.responses.pop(0)
+        return iter([chunk(p) for p in parts] + [chunk(finish_reason=finish_reason)])
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    monkeypatch.setattr(llm_cache, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(agent.st, "session_state", {"openai_api_key_configured": True, "openai_api_key": "sk-test"})
+    return cache
+
+def use_client(monkeypatch, client):
+    monkeypatch.setattr(agent.openai_client, "get_client", lambda api_key: client)
+
+def test_make_key_depends_on_model_prompt_format_and_version(monkeypatch):
+    key = llm_cache.LLMResponseCache.make_key("gpt", "テーマ", TEXT)
+    assert key == llm_cache.LLMResponseCache.make_key("gpt", "テーマ", {"type": "text"})
+    others = [
+        llm_cache.LLMResponseCache.make_key("gpt-2", "テーマ", TEXT),
+        llm_cache.LLMResponseCache.make_key("gpt", "テーマ ", TEXT),
+        llm_cache.LLMResponseCache.make_key("gpt", "テーマ", JSON),
+    ]
+    monkeypatch.setattr(llm_cache, "KEY_VERSION", llm_cache.KEY_VERSION + 1)
+    others.append(llm_cache.LLMResponseCache.make_key("gpt", "テーマ", TEXT))
+    assert len({key, *others}) == 5
+
+def test_cache_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("gpt", "p", TEXT) is None
+    cache.put("gpt", "p", TEXT, "応答", latency=1.5)
+    assert cache.get("gpt", "p", TEXT)["response"] == "応答"
+    assert cache.get("gpt", "p", TEXT)["latency"] == 1.5
+    assert cache.get("gpt", "p", JSON) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_completed_response_is_served_from_the_cache(cache, monkeypatch):
+    use_client(monkeypatch, StubClient((["応", "答"], "stop")))
+    app_state = AppState()
+    assert agent.get_llm_response("p", app_state=app_state) == "応答"
+
+    use_client(monkeypatch, StubClient())  # 呼び出されれば IndexError で失敗する
+    streamed = []
+    assert agent.get_llm_response("p", app_state=app_state, on_text=streamed.append) == "応答"
+    assert streamed == ["応答"]
+    assert (app_state.llm_cache_stats["hits"], app_state.llm_cache_stats["misses"]) == (1, 1)
+    assert app_state.llm_cache_stats["saved_seconds"] == cache.get(agent.LLM_MODEL, "p", TEXT)["latency"]
+
+@pytest.mark.parametrize("parts, finish_reason, json_mode", [
+    (["途中まで"], "length", False),             # 長さの上限で打ち切られた応答
+    ([], "stop", False),                         # 空の応答
+    (['{"a": '], "stop", True),                  # JSONとして読めない応答
+])
+def test_incomplete_responses_are_not_cached(cache, monkeypatch, parts, finish_reason, json_mode):
+    client = StubClient((parts, finish_reason), (parts, finish_reason))
+    use_client(monkeypatch, client)
+    agent.get_llm_response("p", json_mode=json_mode)
+    agent.get_llm_response("p", json_mode=json_mode)
+    assert client.calls == 2
+    assert cache.get(agent.LLM_MODEL, "p", JSON if json_mode else TEXT) is None
+
+def test_json_and_text_responses_are_cached_separately(cache, monkeypatch):
+    client = StubClient((['{"a": 1}'], "stop"), (["text"], "stop"))
+    use_client(monkeypatch, client)
+    assert json.loads(agent.get_llm_response("p", json_mode=True)) == {"a": 1}
+    assert agent.get_llm_response("p") == "text"
+    assert client.calls == 2
+
+def test_force_refresh_regenerates_and_replaces_the_cached_response(cache, monkeypatch):
+    client = StubClient((["古い応答"], "stop"), (["新しい応答"], "stop"))
+    use_client(monkeypatch, client)
+    agent.get_llm_response("p")
+    assert agent.get_llm_response("p", force_refresh=True) == "新しい応答"
+    assert client.calls == 2
+    assert agent.get_llm_response("p") == "新しい応答"
+    assert client.calls == 2
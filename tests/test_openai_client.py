@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""APIキーごとに共有するOpenAIクライアント（src.core.openai_client）のテスト"""
+import sys
+from pathlib import Path
+
+import openai
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import openai_client
+
+def test_clients_are_shared_per_key():
+    assert openai_client.get_client("sk-test-a") is openai_client.get_client("sk-test-a")
+    assert openai_client.get_client("sk-test-a") is not openai_client.get_client("sk-test-b")
+
+def test_missing_key_falls_back_to_the_environment(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-env")
+    client = openai_client.get_client(None)
+    assert client.api_key == "sk-test-env"
+    assert client is openai_client.get_client("sk-test-env")
+
+def test_missing_key_without_environment_raises_the_sdk_error(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(openai.OpenAIError):
+        openai_client.get_client(None)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""BigQueryのスキャン量の予算チェック（agent.check_query_budget）のテスト"""
+import sys
+from pathlib import Path
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.agent import MIN_BILLED_BYTES, check_query_budget
+from src.core.state import AppState
+
+GB = 1024 ** 3
+
+def make_state(billed=0):
+    return AppState(query_budget_bytes=100 * GB, session_budget_bytes=150 * GB, session_bytes_billed=billed)
+
+def test_within_budget_caps_billing_at_the_smaller_limit():
+    state = make_state()
+    assert check_query_budget(state, 10 * GB) == 100 * GB
+    assert state.estimated_bytes == 10 * GB and state.cost_confirmation_message == ""
+    assert check_query_budget(make_state(billed=120 * GB), 10 * GB) == 30 * GB
+
+def test_cap_is_never_below_the_bigquery_minimum():
+    assert check_query_budget(make_state(billed=150 * GB - 1), 0) == MIN_BILLED_BYTES
+
+def test_over_budget_requires_confirmation():
+    state = make_state(billed=100 * GB)
+    assert check_query_budget(state, 60 * GB) is None
+    assert "セッションの残り予算" in state.cost_confirmation_message
+    assert "1回あたりの上限" not in state.cost_confirmation_message
+
+    state = make_state()
+    assert check_query_budget(state, 200 * GB) is None
+    assert "1回あたりの上限" in state.cost_confirmation_message and "セッションの残り予算" in state.cost_confirmation_message
+
+def test_confirmed_query_is_capped_at_the_confirmed_estimate():
+    assert check_query_budget(make_state(), 200 * GB, confirmed_bytes=200 * GB) == 200 * GB
+    # 見積もりが確認時より減った場合も、課金上限は確認した値にする
+    assert check_query_budget(make_state(), 190 * GB, confirmed_bytes=200 * GB) == 200 * GB
+    assert check_query_budget(make_state(billed=200 * GB), 1, confirmed_bytes=1) == MIN_BILLED_BYTES
+
+def test_estimate_above_the_confirmed_one_asks_again():
+    state = make_state()
+    assert check_query_budget(state, 250 * GB, confirmed_bytes=200 * GB) is None
+    assert "確認時の推定" in state.cost_confirmation_message
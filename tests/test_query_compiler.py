@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""検索条件の中間表現と最適化パス（src.core.query_compiler）のテスト"""
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import query_compiler
+from src.core.query_compiler import IPC, KEYWORD, Predicate, QueryPlan
+from src.core.state import SearchConditions
+
+def values(preds, kind):
+    return next((p.values for p in preds if p.kind == kind), [])
+
+def test_dedupe_normalizes_case_and_drops_blanks():
+    plan = query_compiler.build_plan(SearchConditions(
+        subject_keywords=["Membrane", " membrane ", "", "RO"], subject_ipc=["b01d", "B01D "],
+    ))
+    query_compiler.dedupe(plan)
+    assert values(plan.subject, KEYWORD) == ["membrane", "ro"]
+    assert values(plan.subject, IPC) == ["B01D"]
+    assert [r.pass_name for r in plan.rewrites] == ["dedupe"] * 3
+
+def test_ipc_subsumption_keeps_the_broadest_prefix():
+    plan = query_compiler.build_plan(SearchConditions(subject_ipc=["B01D61/02", "B01D", "C02F1/44", "C02F"]))
+    query_compiler.drop_subsumed_ipc(plan)
+    assert values(plan.subject, IPC) == ["B01D", "C02F"]
+    assert all(r.cost_saved > 0 for r in plan.rewrites)
+
+def test_keyword_subsumption_drops_longer_keywords_but_not_like_wildcards():
+    plan = query_compiler.build_plan(SearchConditions(
+        subject_keywords=["逆浸透膜", "膜", "ファウリング"], predicate_keywords=["100%", "100% pure"],
+    ))
+    query_compiler.drop_subsumed_keywords(plan)
+    assert values(plan.subject, KEYWORD) == ["膜", "ファウリング"]
+    # LIKE のワイルドカードを含むキーワードは部分一致の包含関係が成り立たないため、そのまま残す
+    assert values(plan.predicate, KEYWORD) == ["100%", "100% pure"]
+
+def test_keyword_pattern_escapes_regex_metacharacters():
+    keywords = ["c++", "a.b", "(x|y)", "$5", "back\\slash"]
+    pattern = query_compiler.keyword_pattern(keywords)
+    regex = re.compile(pattern)
+    for kw in keywords:
+        assert regex.search(f"text {kw} text")
+    assert not regex.search("c text")
+    assert not regex.search("axb")
+    assert not regex.search("x")
+
+def test_order_predicates_puts_cheap_selective_predicates_first():
+    keyword = Predicate(KEYWORD, ["a", "b", "c", "d", "e", "f"])  # 安いが選択率が高い（絞り込めない）
+    ipc = Predicate(IPC, ["B01D61"])                             # 選択率が低い
+    plan = QueryPlan(subject=[keyword, ipc], predicate=[Predicate(IPC, ["B01D61"]), Predicate(KEYWORD, ["a"])])
+    before = plan.estimated_cost()
+    query_compiler.order_predicates(plan)
+    assert plan.subject == [ipc, keyword]
+    assert [p.kind for p in plan.predicate] == [KEYWORD, IPC]
+    assert plan.estimated_cost() < before
+    assert sum(r.cost_saved for r in plan.rewrites) == pytest.approx(before - plan.estimated_cost())
+
+def test_compile_conditions_drops_empty_predicates_and_does_not_modify_conditions():
+    conditions = SearchConditions(subject_keywords=["膜", "膜"], predicate_keywords=[" "], predicate_ipc=[])
+    plan = query_compiler.compile_conditions(conditions)
+    assert values(plan.subject, KEYWORD) == ["膜"]
+    assert plan.predicate == []
+    assert conditions.subject_keywords == ["膜", "膜"]
+    assert "推定コスト" in query_compiler.explain(plan)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""検索結果キャッシュのキー（src.core.result_cache）のテスト"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+from google.cloud.bigquery import ArrayQueryParameter, ScalarQueryParameter
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import result_cache
+
+def test_canonicalize_sql_collapses_whitespace_outside_quotes():
+    sql = "SELECT  a,\n\tb\nFROM `my  table`\nWHERE c = 'x  y' AND d = \"p\\\"  q\"  "
+    assert result_cache.canonicalize_sql(sql) == "SELECT a, b FROM `my  table` WHERE c = 'x  y' AND d = \"p\\\"  q\""
+
+def test_make_key_ignores_formatting_and_parameter_order():
+    params = [ScalarQueryParameter("limit", "INT64", 100), ArrayQueryParameter("kw", "STRING", ["膜", "RO"])]
+    key = result_cache.make_key("SELECT *\nFROM t  LIMIT @limit", params)
+    assert key == result_cache.make_key("SELECT * FROM t LIMIT @limit", list(reversed(params)))
+
+def test_make_key_distinguishes_values_types_literals_and_namespace():
+    sql = "SELECT * FROM t WHERE x = 'a' AND y IN UNNEST(@kw)"
+    base = result_cache.make_key(sql, [ArrayQueryParameter("kw", "STRING", ["a", "b"])])
+    others = [
+        result_cache.make_key(sql, [ArrayQueryParameter("kw", "STRING", ["b", "a"])]),
+        result_cache.make_key(sql, [ScalarQueryParameter("kw", "STRING", "a,b")]),
+        result_cache.make_key(sql.replace("'a'", "'a '"), [ArrayQueryParameter("kw", "STRING", ["a", "b"])]),
+        result_cache.make_key(sql, [ArrayQueryParameter("kw", "STRING", ["a", "b"])], namespace="duckdb"),
+    ]
+    assert len({base, *others}) == 5
+
+def test_cache_round_trip_and_expiry(tmp_path):
+    cache = result_cache.QueryResultCache(tmp_path, ttl_seconds=60)
+    key = result_cache.make_key("SELECT 1", [])
+    assert cache.get(key) is None
+    cache.put(key, pa.table({"x": [1, 2]}))
+    assert cache.get(key).to_pydict() == {"x": [1, 2]}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    old = time.time() - 120
+    os.utime(cache._path(key), (old, old))
+    assert not cache.contains(key)
+    assert cache.purge_expired() == 1
+
+def test_read_cached_result_never_queries_bigquery(tmp_path, monkeypatch):
+    from src.core import bq_client
+    cache = result_cache.QueryResultCache(tmp_path)
+    monkeypatch.setattr(result_cache, "get_query_cache", lambda: cache)
+    monkeypatch.setattr(bq_client, "_get_clients", lambda *args, **kwargs: pytest.fail("BigQueryを呼び出してはならない"))
+
+    assert bq_client.read_cached_result("SELECT 1", []) is None
+    cache.put(result_cache.make_key("SELECT 1", []), pa.table({"x": [1]}))
+    df = bq_client.read_cached_result("SELECT  1", [])
+    assert df["x"].tolist() == [1]
+    assert df.attrs["bq_stats"]["result_cache_hit"]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""検索結果ストア（src.core.result_store）の保存・読み込みと有効期限のテスト"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import result_store
+
+TTL = 60
+
+class FakeClock:
+    """result_store の time.time() の代わり。advance で時刻を進める"""
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_store, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return result_store.ResultStore(tmp_path, ttl_seconds=TTL)
+
+def make_df(n=5):
+    return pd.DataFrame({
+        "publication_number": [f"JP-{i}-A" for i in range(n)],
+        "title": [f"タイトル{i}" for i in range(n)],
+        "similarity": [1.0 - i / n for i in range(n)],
+    })
+
+def test_put_and_read_round_trip(store):
+    df = make_df()
+    handle = store.put(df)
+    assert len(handle) == 5 and handle.columns == list(df.columns)
+    assert store.exists(handle)
+    pd.testing.assert_frame_equal(store.read(handle), df)
+    page = store.read(handle, columns=["title"], offset=3, length=10)
+    assert page["title"].tolist() == ["タイトル3", "タイトル4"]
+    assert store.read_table(handle, ["similarity"]).column_names == ["similarity"]
+
+def test_results_expire_after_the_ttl(store, clock):
+    handle = store.put(make_df())
+    clock.advance(TTL - 1)
+    assert store.purge_expired() == 0
+    clock.advance(2)
+    assert store.purge_expired() == 1
+    assert not store.exists(handle)
+    with pytest.raises(result_store.ResultExpiredError):
+        store.read(handle)
+
+def test_reading_extends_the_ttl(store, clock):
+    handle = store.put(make_df())
+    clock.advance(TTL - 10)
+    store.read(handle, length=1)
+    clock.advance(TTL - 10)
+    assert store.purge_expired() == 0 and store.exists(handle)
+    clock.advance(11)
+    assert store.purge_expired() == 1
+
+def test_put_cleans_up_expired_results_but_keeps_fresh_ones(store, clock, tmp_path):
+    old = store.put(make_df())
+    clock.advance(TTL / 2)
+    recent = store.put(make_df())
+    clock.advance(TTL / 2 + 1)
+    new = store.put(make_df())
+    assert not store.exists(old)
+    assert store.exists(recent) and store.exists(new)
+    assert sorted(p.stem for p in tmp_path.glob("*.arrow")) == sorted([recent.result_id, new.result_id])
+    assert not list(tmp_path.glob(".*.tmp"))
+
+def test_delete_ignores_missing_results(store):
+    handle = store.put(make_df())
+    store.delete(handle)
+    store.delete(handle)
+    store.delete(None)
+    assert not store.exists(handle)
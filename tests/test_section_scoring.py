@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""セクション別類似度（タイトル・要約）の計算と、重みの変更による再スコアリングのテスト"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import pipeline, ranking
+from src.core.embeddings import build_section_texts
+
+DIM = 8
+WEIGHTS = {"title": 0.5, "abstract": 0.5}
+
+def fake_embed(texts):
+    """EmbeddingのAPIと同様に、空文字列を含む入力は拒否する"""
+    if any(not t.strip() for t in texts):
+        raise ValueError("400: input must not be empty")
+    return [np.random.default_rng(abs(hash(t)) % 2 ** 32).standard_normal(DIM) for t in texts]
+
+def make_page():
+    return pd.DataFrame({
+        "publication_number": ["JP-1-A", "JP-2-A", "JP-3-A"],
+        "title": ["逆浸透膜の洗浄方法", "膜モジュール", None],
+        "abstract": ["ファウリングを抑制する洗浄方法", None, None],
+    })
+
+def test_null_abstract_is_not_sent_and_scores_from_title_only():
+    result = pipeline.run(iter([make_page()]), "逆浸透膜の洗浄", fake_embed, build_section_texts, weights=WEIGHTS)
+    page = result.pages[0]
+    query = ranking.normalize_rows(fake_embed(["逆浸透膜の洗浄"]))
+
+    # 要約のない文献は、sim_abstract を欠損とし、タイトルだけでスコアを計算する
+    assert np.isnan(page.loc[1, "sim_abstract"])
+    expected_title = ranking.cosine_scores(query, ranking.normalize_rows(fake_embed(["膜モジュール"])))[0]
+    assert page.loc[1, "sim_title"] == pytest.approx(expected_title, abs=1e-5)
+    assert page.loc[1, "similarity"] == pytest.approx(expected_title, abs=1e-5)
+
+    # どのセクションもない文献のスコアは0で、文書ベクトルはゼロベクトル
+    assert page.loc[2, "similarity"] == 0.0
+    assert not result.matrices[0][2].any()
+
+    # 両方ある文献は、等しい重みで平均する
+    assert page.loc[0, "similarity"] == pytest.approx((page.loc[0, "sim_title"] + page.loc[0, "sim_abstract"]) / 2, abs=1e-5)
+
+def test_page_without_any_text_does_not_call_embed():
+    page = pd.DataFrame({"publication_number": ["JP-1-A"], "title": [""], "abstract": [None]})
+    calls = []
+    def embed(texts):
+        calls.append(texts)
+        return fake_embed(texts)
+    result = pipeline.run(iter([page]), "テーマ", embed, build_section_texts, weights=WEIGHTS)
+    assert calls == [["テーマ"]]  # 調査テーマのみ
+    assert result.pages[0].loc[0, "similarity"] == 0.0
+
+def test_weighted_scores_renormalize_over_present_sections():
+    scores = ranking.weighted_scores(
+        {"title": np.array([0.2, 0.4, np.nan]), "abstract": np.array([0.6, np.nan, np.nan])},
+        {"title": 0.25, "abstract": 0.75},
+    )
+    np.testing.assert_allclose(scores, [0.25 * 0.2 + 0.75 * 0.6, 0.4, 0.0], rtol=1e-6)
+
+def test_weighted_scores_with_all_zero_weights_are_equal_weights():
+    scores = ranking.weighted_scores({"title": np.array([0.2]), "abstract": np.array([0.6])}, {"title": 0, "abstract": 0})
+    np.testing.assert_allclose(scores, [0.4], rtol=1e-6)
+
+def test_rescore_table_reorders_and_keeps_missing_sections():
+    table = pa.table({
+        "publication_number": ["a", "b", "c"],
+        "sim_title": pa.array([0.9, 0.1, 0.5], pa.float32()),
+        "sim_abstract": pa.array([0.1, 0.8, None], pa.float32()),
+        "similarity": pa.array([0.5, 0.45, 0.5], pa.float32()),
+    })
+    rescored = ranking.rescore_table(table, {"title": 0.0, "abstract": 1.0})
+    assert rescored["publication_number"].to_pylist() == ["b", "a", "c"]
+    np.testing.assert_allclose(rescored["similarity"].to_numpy(), [0.8, 0.1, 0.0], rtol=1e-6)
+    assert rescored["sim_abstract"].null_count == 1
+
+class _EmptyCache:
+    def get_many(self, model, texts):
+        return [None] * len(texts)
+
+def test_batch_ranking_matches_app_pipeline(monkeypatch):
+    from src.core import batch
+    monkeypatch.setattr(batch, "get_embeddings", lambda texts, model=None, api_key=None: fake_embed(texts))
+    monkeypatch.setattr(batch.embedding_cache, "get_embedding_cache", lambda: _EmptyCache())
+
+    ranked, _ = batch._rank(make_page(), "逆浸透膜の洗浄", api_key="test")
+    result = pipeline.run(iter([make_page()]), "逆浸透膜の洗浄", fake_embed, build_section_texts,
+                          weights=ranking.DEFAULT_SECTION_WEIGHTS)
+    expected = result.pages[0].set_index("publication_number")["similarity"]
+    actual = ranked.set_index("publication_number")["similarity"]
+    np.testing.assert_allclose(actual.loc[expected.index], expected, rtol=1e-6)
+
+def test_ann_index_rejects_other_doc_vector_definition(tmp_path):
+    from src.core import ann_index
+    index = ann_index.AnnIndex(tmp_path, doc_vector="sections-v1")
+    index.insert(["JP-1-A"], np.ones((1, DIM), dtype=np.float32))
+    with pytest.raises(ValueError):
+        ann_index.AnnIndex(tmp_path, doc_vector="combined-v0")
+    assert ann_index.get_index(root=tmp_path).path.name.endswith(ranking.DOC_VECTOR_VERSION)
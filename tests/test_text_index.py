@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""全文検索用の転置インデックス（src.core.text_index）の結果が、DuckDBで実行したSQLと一致することのテスト"""
+import json
+import shutil
+import sys
+from datetime import date
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import text_index
+from src.core.mirror import DATA_FILE, MANIFEST_FILE, LocalMirror
+from src.core.state import SearchConditions
+from src.core.strategies.default import SubjectPredicateStrategy
+
+DOCS = [
+    # (公開番号, タイトル, 要約, 公開日, IPC)
+    ("JP-1-A", "逆浸透膜の洗浄方法", "膜ファウリングを抑制する水処理装置", 20180101, ["B01D61/02", "C02F1/44"]),
+    ("JP-2-A", "分離膜モジュール", "中空糸膜を用いたろ過", 20200315, ["B01D63/02"]),
+    ("US-3-A", "Reverse Osmosis Membrane", "A membrane for water treatment with PVDF.", 20190601, ["B01D69/12"]),
+    ("US-4-A", "Semiconductor wafer", "Wafer cleaning using ultrapure water (UPW).", 20210101, ["H01L21/02"]),
+    ("CN-5-A", "膜", "单层膜", 20220202, ["B01D71/00"]),
+    ("JP-6-A", "センサ", "水質を監視するセンサ。c++で制御する。", 20230707, ["G01N27/00"]),
+    ("US-7-A", "Membranes", None, 20160505, []),
+]
+
+CONDITIONS = {
+    "ja_and_or": SearchConditions(subject_keywords=["逆浸透膜", "膜"], predicate_keywords=["水処理", "ろ過"], countries=[]),
+    "single_cjk_char": SearchConditions(subject_keywords=["膜"], countries=[]),
+    "en_case_and_partial_word": SearchConditions(subject_keywords=["MEMBRANE"], predicate_keywords=["osmo"], countries=[]),
+    "en_phrase": SearchConditions(subject_keywords=["ultrapure water"], countries=[]),
+    "symbols": SearchConditions(subject_keywords=["c++", "(upw)"], countries=[]),
+    "ipc_only": SearchConditions(subject_ipc=["B01D6"], predicate_ipc=["C02F", "B01D69"], countries=[]),
+    "ipc_and_keyword": SearchConditions(subject_keywords=["membrane", "膜"], subject_ipc=["B01D"], countries=["US", "JP"]),
+    "dates": SearchConditions(subject_keywords=["膜"], start_date=date(2019, 1, 1), end_date=date(2021, 12, 31), countries=[]),
+}
+
+@pytest.fixture(scope="module")
+def mirror(tmp_path_factory):
+    path = tmp_path_factory.mktemp("mirror")
+    table = pa.table({
+        "publication_number": [d[0] for d in DOCS],
+        "country": [d[0][:2] for d in DOCS],
+        "title": [d[1] for d in DOCS],
+        "abstract": [d[2] for d in DOCS],
+        "assignee": ["Assignee"] * len(DOCS),
+        "publication_date": [d[3] for d in DOCS],
+        "ipc": [d[4] for d in DOCS],
+        "ipc_codes": [", ".join(d[4]) for d in DOCS],
+        "search_text": [" ".join(filter(None, (d[1], d[2]))).lower() for d in DOCS],
+    })
+    pq.write_table(table, path / DATA_FILE)
+    with open(path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"name": "test", "row_count": len(DOCS)}, f)
+    local_mirror = LocalMirror(path)
+    local_mirror.build_text_index()
+    return local_mirror
+
+@pytest.mark.parametrize("label", list(CONDITIONS))
+def test_text_index_matches_duckdb_sql(mirror, label):
+    conditions = CONDITIONS[label]
+    sql, params = SubjectPredicateStrategy(dialect="duckdb").generate_sql(conditions)
+    expected = mirror.execute_query(sql, params)
+    actual = mirror.keyword_search(conditions)
+    assert actual is not None
+    assert sorted(actual["publication_number"]) == sorted(expected["publication_number"])
+    assert len(expected), "条件に一致する文献がないと、比較の意味がない"
+
+def test_like_wildcards_fall_back_to_sql(mirror):
+    assert mirror.keyword_search(SearchConditions(subject_keywords=["100%"], countries=[])) is None
+
+def linear_fragment_docs(index, fragment):
+    """語彙を1語ずつ走査して、fragment を含むトークンのいずれかを含む文献番号を求める（接尾辞配列の検証用）"""
+    return index._union(i for i, term in enumerate(index.terms) if fragment in term).tolist()
+
+def test_suffix_array_finds_every_token_containing_a_fragment(mirror):
+    index = mirror.text_index
+    fragments = {term[i:j] for term in index.terms for i in range(len(term)) for j in range(i + 1, len(term) + 1)}
+    fragments |= {"zzz", "膜膜", "0", "~"}
+    for fragment in sorted(fragments):
+        assert index._fragment_docs(fragment).tolist() == linear_fragment_docs(index, fragment), fragment
+    # 英単語の途中の断片（例: membrane の embran）も見つかる
+    assert len(index._fragment_docs("embran")) == 2
+
+def test_index_without_suffix_file_builds_it_from_the_vocabulary(mirror, tmp_path):
+    path = tmp_path / "text_index"
+    shutil.copytree(mirror.path / text_index.TEXT_INDEX_DIR, path)
+    (path / text_index.SUFFIXES_FILE).unlink()
+    index = text_index.TextIndex(path)
+    assert index._suffixes.tolist() == mirror.text_index._suffixes.tolist()
+    assert index.keyword_docs("osmo").tolist() == mirror.text_index.keyword_docs("osmo").tolist()
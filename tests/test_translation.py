@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""用語集付きのキーワード翻訳（src.core.translation）のテスト"""
+import copy
+import sys
+from pathlib import Path
+
+# --- プロジェクトルートをPythonパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import translation
+from src.core.state import SearchConditions
+
+class FakeRequest:
+    """LLMの代わりに訳語を返し、依頼された語を記録する"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def __call__(self, keywords):
+        self.calls.append(list(keywords))
+        return {k: self.answers[k] for k in keywords if k in self.answers}
+
+def test_translate_conditions_returns_a_copy_and_keeps_the_original(tmp_path):
+    glossary = translation.Glossary(tmp_path / "ja_en.json")
+    conditions = SearchConditions(subject_keywords=["逆浸透膜", "RO"], predicate_keywords=["新語"], subject_ipc=["B01D"])
+    original = copy.deepcopy(conditions)
+    request = FakeRequest({"新語": ["new term"]})
+
+    translated, result = translation.translate_conditions(conditions, request, glossary)
+
+    assert conditions == original
+    assert translated is not conditions
+    assert translated.subject_keywords == ["逆浸透膜", "RO", "reverse osmosis membrane", "RO membrane"]
+    assert translated.predicate_keywords == ["新語", "new term"]
+    assert translated.subject_ipc == ["B01D"]
+    assert (result.glossary_hits, result.requested, result.failed) == (1, ["新語"], [])
+    assert request.calls == [["新語"]]
+
+def test_llm_translations_are_saved_and_refresh_bypasses_the_glossary(tmp_path):
+    path = tmp_path / "ja_en.json"
+    request = FakeRequest({"新語": ["new term"], "未知": []})
+    result = translation.translate_keywords(["新語", "未知", "english"], request, translation.Glossary(path))
+    assert result.failed == ["未知"]
+
+    reopened = translation.Glossary(path)
+    assert reopened.lookup("新語") == ["new term"]
+    request = FakeRequest({"新語": ["fresh term"]})
+    assert translation.translate_keywords(["新語"], request, reopened).translations == {"新語": ["new term"]}
+    assert request.calls == []
+    refreshed = translation.translate_keywords(["新語"], request, reopened, refresh=True)
+    assert refreshed.translations == {"新語": ["fresh term"]}
+    assert translation.Glossary(path).lookup("新語") == ["fresh term"]
@@ -95,9 +95,10 @@ LIMIT @limit
 
 
 @st.cache_data(show_spinner=False)
-def search_patents_in_bigquery(_query: SearchQuery) -> pd.DataFrame:
+def search_patents_in_bigquery(query: SearchQuery) -> pd.DataFrame:
     """
     build_patent_queryで生成したSQLを使い、BigQueryの公開特許データセットを検索する
+    （引数名が "_" で始まるとst.cache_dataのハッシュ対象から外れ、常に最初の結果が返るため注意）
     """
     print("--- Executing BigQuery Search ---")
     try:
@@ -107,7 +108,7 @@ def search_patents_in_bigquery(_query: SearchQuery) -> pd.DataFrame:
         return pd.DataFrame()
 
     # SQLとパラメータを生成
-    sql, query_params = build_patent_query(_query)
+    sql, query_params = build_patent_query(query)
 
     job_config = QueryJobConfig(query_parameters=query_params)
 